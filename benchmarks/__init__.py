@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the modelling hot paths.
+
+Run ``python -m benchmarks.run --help`` from the repository root.
+"""
@@ -0,0 +1,149 @@
+"""
+Seeded synthetic data shaped like the project's inputs.
+
+Each generator takes a ``scale`` (1, 10, 100) relative to the real data and a
+``seed``, so the same call always returns the same frame and no credentials or
+network access are needed.
+"""
+# Packages
+import numpy as np
+import pandas as pd
+
+# Modules
+
+
+BODY_TYPES = ['Cars', 'Light goods vehicles', 'Motorcycles', 'Other vehicles', 'Buses and coaches', 'Heavy goods vehicles']
+PARC_FUELS = ['Diesel', 'Petrol', 'Pure Electric', 'Hybrid', 'Other']
+DFT_FUELS = ['Petrol', 'Diesel', 'Hybrid electric (petrol)', 'Hybrid electric (diesel)',
+             'Plug-in hybrid electric (petrol)', 'Plug-in hybrid electric (diesel)', 'Battery electric',
+             'Range extended electric', 'Fuel cell electric', 'Gas', 'Other fuel types']
+LISTING_FUELS = ['Petrol', 'Diesel', 'Electric', 'Petrol Hybrid', 'Petrol Plug-in Hybrid', 'Diesel Hybrid',
+                 'Diesel Plug-in Hybrid', 'Bi Fuel', 'Hydrogen']
+
+
+def vehicle_parc(seed: int = 0) -> pd.DataFrame:
+    """
+    One geography of uk_vehicle_parc.csv: quarterly stock by BodyType and Fuel, 2009Q4-2022Q2.
+    Returns:
+        pd.DataFrame: Indexed by quarter start date, columns BodyType, Fuel, value.
+    """
+    rng = np.random.default_rng(seed)
+    quarters = pd.date_range('2009-10-01', '2022-04-01', freq='QS')
+    index = pd.MultiIndex.from_product([quarters, BODY_TYPES, PARC_FUELS], names=['variable', 'BodyType', 'Fuel'])
+    base = rng.uniform(1e4, 2e7, size=len(BODY_TYPES) * len(PARC_FUELS))
+    growth = 1 + rng.normal(0, .01, size=(len(quarters), len(base))).cumsum(axis=0)
+    df = pd.DataFrame({'value': (base * growth).ravel()}, index=index).reset_index(['BodyType', 'Fuel'])
+    return df
+
+
+def fuel_consumption(seed: int = 0) -> pd.DataFrame:
+    """
+    One geography of uk_yearly_fuel.csv (ktoe), 2005-2020.
+    """
+    rng = np.random.default_rng(seed)
+    years = pd.date_range('2005-01-01', '2020-01-01', freq='YS')
+    return pd.DataFrame({
+        'Diesel cars total': rng.uniform(6000, 12000, len(years)),
+        'Petrol cars total': rng.uniform(12000, 19000, len(years)),
+    }, index=years)
+
+
+def car_mileage(seed: int = 0) -> pd.DataFrame:
+    """
+    cars_average_mileage.csv: annual mileage by fuel type and year.
+    """
+    rng = np.random.default_rng(seed)
+    years = np.arange(2005, 2023)
+    fuels = ['Diesel', 'Petrol', 'Electric', 'Hybrid', 'Other']
+    df = pd.DataFrame([(f, y) for f in fuels for y in years], columns=['fuelType', 'year'])
+    df['annual_mileage'] = rng.uniform(2000, 20000, len(df))
+    return df
+
+
+def new_registrations(scale: int = 1, seed: int = 0) -> pd.DataFrame:
+    """
+    new_registrations.csv (VEH1153): monthly/quarterly/annual registrations by geography, body type and
+    fuel. The real file has ~24.5k rows over 6 geographies with 11 fuel columns. clean_new_reg_data keeps
+    only Wales, so scale multiplies the fuel columns ('Petrol', 'Petrol 1', ...) rather than the geographies.
+    """
+    rng = np.random.default_rng(seed)
+    geographies = ['Wales'] + [f'Geography {i}' for i in range(5)]
+    months = pd.date_range('2001-01-01', '2022-12-01', freq='MS')
+    periods = [('Monthly', d.strftime('%B %Y')) for d in months]
+    periods += [('Quarterly', f'{d.year} Q{(d.month - 1) // 3 + 1}') for d in months[::3]]
+    periods += [('Annual', str(y)) for y in range(2001, 2023)]
+    rows = [(g, interval, date, 'Thousands', b) for g in geographies for interval, date in periods for b in BODY_TYPES]
+    df = pd.DataFrame(rows, columns=['Geography', 'Date Interval', 'Date', 'Units', 'BodyType'])
+    fuels = [fuel if i == 0 else f'{fuel} {i}' for i in range(scale) for fuel in DFT_FUELS]
+    values = rng.gamma(.5, 5, size=(len(df), len(fuels)))
+    # Totals over the first copy of the fuels only, so scale 1 is unchanged.
+    base = values[:, :len(DFT_FUELS)]
+    totals = pd.DataFrame({
+        'Total': base.sum(axis=1),
+        'Plug-in': base[:, 4:7].sum(axis=1),
+        'Zero Emission': base[:, 6:9].sum(axis=1),
+    })
+    return pd.concat([df, pd.DataFrame(values, columns=fuels), totals], axis=1)
+
+
+def vrn_aggregates(scale: int = 1, seed: int = 0, n_months: int = 36) -> pd.DataFrame:
+    """
+    The tracker's VRN_UK per-make, per-month aggregates (about 60 makes in reality; scale multiplies them).
+    Returns:
+        pd.DataFrame: make, monthOfFirstRegistration, totalSales, nonzevSales, zevSales, co2Activity.
+    """
+    rng = np.random.default_rng(seed)
+    makes = [f'MAKE {i:04d}' for i in range(60 * scale)]
+    months = pd.date_range('2020-04-01', periods=n_months, freq='MS')
+    df = pd.DataFrame([(m, d) for m in makes for d in months], columns=['make', 'monthOfFirstRegistration'])
+    size = rng.lognormal(7, 1.5, len(makes)).repeat(n_months)
+    df['totalSales'] = rng.poisson(size)
+    zev_share = rng.beta(2, 8, len(makes)).repeat(n_months)
+    df['zevSales'] = rng.binomial(df['totalSales'], zev_share)
+    df['nonzevSales'] = df['totalSales'] - df['zevSales']
+    df['co2Activity'] = df['nonzevSales'] * rng.normal(125, 20, len(df)).clip(60)
+    return df
+
+
+def car_targets(aggregates: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """
+    CO2 targets for the makes of a vrn_aggregates frame.
+    """
+    rng = np.random.default_rng(seed)
+    makes = aggregates['make'].unique()
+    return pd.DataFrame({'make': makes, 'co2Target': rng.normal(125, 15, len(makes))})
+
+
+def autotrader_listings(scale: int = 1, seed: int = 0, n_rows: int = 200000) -> pd.DataFrame:
+    """
+    second_hand.autotrader listings: date of sale, fuel type, price and mileage (n_rows * scale rows).
+    """
+    rng = np.random.default_rng(seed)
+    n = n_rows * scale
+    days = pd.date_range('2022-01-01', '2023-12-31', freq='D')
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'dos': days[rng.integers(0, len(days), n)],
+        'fuelType': np.array(LISTING_FUELS)[rng.choice(len(LISTING_FUELS), n, p=[.4, .3, .1, .08, .04, .03, .02, .02, .01])],
+        'price': rng.lognormal(9.5, .6, n).round(),
+        'mileage': rng.gamma(2, 20000, n).round(),
+    })
+
+
+def scenario_inputs(scale: int = 1, seed: int = 0) -> dict:
+    """
+    Parameters for scenarios.run_scenarios: 100 scenarios at scale 1, varying lifespan, growth and diesel share.
+    """
+    rng = np.random.default_rng(seed)
+    n = 100 * scale
+    return {
+        'mandate': [.15, .22, .28, .33, .38, .52, .66, .80, .84, .88, .92, .96, 1],
+        'lifespan': rng.integers(12, 25, n),
+        'base_sales': 3.5e5,
+        'growth': rng.uniform(.98, 1.03, n),
+        'diesel_share_of_ice': rng.uniform(.05, .95, n),
+        'mileage': [12000, 9000, 10000],
+        'mpg': [35, 30],
+        'parc0': [4.2e6, 2.5e5, 6e4],
+        'hist_registrations': rng.uniform(1e4, 3e5, size=(22, 3)),
+    }
@@ -0,0 +1,102 @@
+"""
+Import-time budget for the connectors.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget 1.5 --repeat 5
+
+Each check imports one connector in a fresh interpreter and fails if it pulls
+in a heavy library that backend does not need (e.g. geopandas for MyBigQuery),
+or if the best of --repeat import times exceeds its budget (seconds, on top of
+the bare interpreter and pandas, which every backend uses). Exits with status 1
+on any failure and prints the slowest imports of the failing checks.
+"""
+# Packages
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ['geopandas', 'shapely', 'slack_sdk', 'psycopg2', 'sqlalchemy', 'google.cloud.storage', 'google.cloud.bigquery']
+
+# statement: modules it is allowed to load.
+CHECKS = {
+    'import modules.connector': [],
+    'from modules.connector import SlackBot': ['slack_sdk'],
+    'from modules.connector import MyBucket': ['google.cloud.storage'],
+    'from modules.connector import MySQL': ['sqlalchemy'],
+    'from modules.connector import MyPostgres': ['psycopg2'],
+    'from modules.connector import MyBigQuery': ['google.cloud.bigquery'],
+}
+
+_PROBE = """
+import json, sys, time
+import pandas
+start = time.perf_counter()
+{statement}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def probe(statement: str) -> dict:
+    """
+    Run statement in a fresh interpreter; return its import time and the modules loaded afterwards.
+    """
+    out = subprocess.run([sys.executable, '-c', _PROBE.format(statement=statement)], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(statement: str, n: int = 10) -> list:
+    """
+    The n imports with the largest cumulative time (python -X importtime) for statement.
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT,
+                         capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def check(statement: str, allowed: list, budget: float, repeat: int = 3) -> dict:
+
+    runs = [probe(statement) for _ in range(repeat)]
+    loaded = set(runs[0]['modules'])
+    unexpected = [m for m in HEAVY if m in loaded and m not in allowed]
+    seconds = min(r['seconds'] for r in runs)
+    return {'statement': statement, 'seconds': seconds, 'unexpected': unexpected,
+            'ok': not unexpected and seconds <= budget}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=2.0, help='Seconds allowed per connector import.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for statement, allowed in CHECKS.items():
+        try:
+            result = check(statement, allowed, args.budget, repeat=args.repeat)
+        except subprocess.CalledProcessError as e:
+            # A backend whose client library is not installed here.
+            print(f'SKIP {statement}: {e.stderr.strip().splitlines()[-1]}')
+            continue
+        status = 'ok' if result['ok'] else 'FAIL'
+        extra = f" loads {', '.join(result['unexpected'])}" if result['unexpected'] else ''
+        print(f"{status:<4} {statement:<45} {result['seconds']:>7.3f}s{extra}")
+        if not result['ok']:
+            failed += 1
+            for seconds, name in slowest_imports(statement):
+                print(f'       {seconds:>7.3f}s {name}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Time the modelling hot paths on seeded synthetic data and compare against a baseline.
+
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --threshold 1.25
+
+Each benchmark is run at every scale (1x, 10x, 100x the real data by default)
+up to its MAX_SCALE: the best of --repeat wall-clock timings, and the peak traced
+Python memory of one further run. --compare runs only the benchmark/scale pairs
+in the baseline and exits with status 1 if any got slower (or used more memory)
+than threshold times its baseline.
+"""
+# Packages
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Modules
+from modules import helpers
+from modules.compliance import compliance_tracker
+from modules.market_stats import HYBRID_FUELS, OTHER_FUELS, first_sales, market_stats
+from modules.scenarios import run_scenarios
+from . import generators as gen
+
+
+# Rows per batch fed to market_stats, as a streamed query result would arrive.
+BATCH_ROWS = 200000
+
+
+def second_hand_monthly(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The 08.03 monthly second-hand aggregation (first sale of each listing, per month and fuel type,
+    with each fuel type's proportion of the month) as the notebook computes it, row loop included.
+    """
+    first = df[df['dos'] == df.groupby('id')['dos'].transform('min')].copy()
+    first['month'] = first['dos'].dt.strftime('%Y-%m')
+    ft = first['fuelType'].astype(str)
+    first['ft'] = np.where(ft.isin(OTHER_FUELS), 'Other', np.where(ft.isin(HYBRID_FUELS), 'Hybrid', ft))
+    df_sh = first.groupby(['month', 'ft']).agg(
+        min_price=('price', 'min'),
+        max_price=('price', 'max'),
+        avg_price=('price', 'mean'),
+        median_price=('price', 'median'),
+        registrations=('ft', 'size')
+    ).reset_index('ft')
+
+    df_sh_prop = df_sh[['ft', 'registrations']].copy()
+    totals = df_sh_prop.groupby(level=0)['registrations'].sum()
+    for index, row in df_sh_prop.iterrows():
+        if index in totals:
+            df_sh_prop.loc[index, 'sum'] = totals[index]
+    df_sh_prop['proportion'] = df_sh_prop.apply(lambda x: (100 * x['registrations']) / x['sum'] if x['sum'] != 0 else 0, axis=1)
+    return df_sh.join(df_sh_prop[['sum', 'proportion']])
+
+
+def _setup_vmt(scale, seed):
+    # One fuel/parc/mileage set per geography.
+    return [(gen.fuel_consumption(seed + i), gen.vehicle_parc(seed + i), gen.car_mileage(seed + i)) for i in range(scale)]
+
+
+def _run_vmt(inputs):
+    return [helpers.prep_df_fc(fc.copy(), pc.copy(), mm.copy()) for fc, pc, mm in inputs]
+
+
+def _setup_tracker(scale, seed):
+    activity = gen.vrn_aggregates(scale, seed)
+    return activity, gen.car_targets(activity, seed)
+
+
+def _run_tracker(inputs):
+    activity, targets = inputs
+    return compliance_tracker(activity, targets, mandate=[.22, .28, .33], borrowing_cap=[.25, .6])
+
+
+def _run_market_stats(df):
+    # Same cut as second_hand_monthly, streamed in batches, from daily sketches rolled up to months.
+    batches = (first_sales(df.iloc[start:start + BATCH_ROWS]) for start in range(0, len(df), BATCH_ROWS))
+    return market_stats(batches, freq='D').resample('M').shares()
+
+
+# name: (setup(scale, seed) -> inputs, run(inputs)). Setup is not timed.
+BENCHMARKS = {
+    'new_registrations': (lambda scale, seed: gen.new_registrations(scale, seed), helpers.clean_new_reg_data),
+    'vmt_economy': (_setup_vmt, _run_vmt),
+    'compliance_tracker': (_setup_tracker, _run_tracker),
+    'scenarios': (lambda scale, seed: gen.scenario_inputs(scale, seed), lambda params: run_scenarios(**params)),
+    'second_hand_monthly': (lambda scale, seed: gen.autotrader_listings(scale, seed), second_hand_monthly),
+    'market_stats': (lambda scale, seed: gen.autotrader_listings(scale, seed), _run_market_stats),
+}
+
+# Largest scale run by default: the notebook's row loop in second_hand_monthly is quadratic in the rows
+# per month and does not finish at 100x.
+MAX_SCALE = {'second_hand_monthly': 10}
+
+
+def measure(name: str, scale: int, repeat: int = 3, seed: int = 0) -> dict:
+    """
+    Best-of-repeat wall time and peak traced memory of one benchmark at one scale.
+    """
+    setup, run = BENCHMARKS[name]
+    inputs = setup(scale, seed)
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(inputs)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    run(inputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'benchmark': name, 'scale': scale, 'seconds': min(times), 'mean_seconds': float(np.mean(times)),
+            'peak_mb': peak / 2 ** 20}
+
+
+def run_all(names=None, scales=(1, 10, 100), repeat: int = 3, seed: int = 0, only_pairs=None) -> list:
+    """
+    Measure every benchmark at every scale, skipping scales above its MAX_SCALE and, with only_pairs,
+    the (benchmark, scale) pairs not in it.
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        for scale in scales:
+            if scale > MAX_SCALE.get(name, scale) or (only_pairs is not None and (name, scale) not in only_pairs):
+                print(f'{name:<22} {scale:>4}x skipped', flush=True)
+                continue
+            result = measure(name, scale, repeat=repeat, seed=seed)
+            print(f"{name:<22} {scale:>4}x {result['seconds']:>10.4f}s {result['peak_mb']:>10.1f} MB", flush=True)
+            results.append(result)
+    return results
+
+
+def compare(results: list, baseline: list, threshold: float = 1.25) -> list:
+    """
+    Benchmarks whose time or peak memory exceed threshold times the baseline.
+    Returns a list of (benchmark, scale, metric, baseline value, new value).
+    """
+    base = {(r['benchmark'], r['scale']): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r['benchmark'], r['scale']))
+        if b is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if b[metric] > 0 and r[metric] > threshold * b[metric]:
+                regressions.append((r['benchmark'], r['scale'], metric, b[metric], r[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run (default all).')
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='Write the results to this JSON file (e.g. a new baseline).')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against.')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Allowed ratio to the baseline.')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    only_pairs = None if baseline is None else {(r['benchmark'], r['scale']) for r in baseline}
+    results = run_all(args.only, args.scales, repeat=args.repeat, seed=args.seed, only_pairs=only_pairs)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'results': results
+            }, f, indent=2)
+        print(f'Saved {len(results)} results to {args.save}.')
+
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        for name, scale, metric, old, new in regressions:
+            print(f'REGRESSION {name} {scale}x {metric}: {old:.4g} -> {new:.4g} ({new / old:.2f}x)')
+        if regressions:
+            return 1
+        print(f'No regressions beyond {args.threshold}x of {args.compare}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Vectorised ZEV mandate / CO2 compliance ledger.
+
+Replaces the row-wise ``DataFrame.apply`` maths of the compliance tracker
+notebooks (``co2ComplianceAdjFunc``, ``co2_to_zev``, ...) with NumPy
+broadcasting so that a whole grid of makes x months x policy variants is
+computed in one call.
+"""
+# Packages
+import numpy as np
+import pandas as pd
+
+# Modules
+
+
+# Defaults used in the tracker notebooks.
+CO2_TO_ZEV_FACTOR = 167
+BORROWING_CAP_CARS = .25
+BORROWING_CAP_VANS = .25
+BORROWING_CAP_CONSULTATION = .6
+
+LEDGER_COLUMNS = [
+    "co2Allowances",
+    "co2Compliance",
+    "co2ComplianceAdj",
+    "ZEVMallowances",
+    "ZEV Surplus",
+    "co2_to_mandate_allowances",
+    "ZEV Surplus after CO2",
+]
+
+
+def policy_grid(mandate=.22, conversion_factor=CO2_TO_ZEV_FACTOR, borrowing_cap=BORROWING_CAP_CARS) -> dict:
+    """
+    Build the cartesian grid of policy variants as broadcastable arrays.
+    Args:
+        mandate: Scalar or 1-d array of ZEV mandate levels (e.g. .22).
+        conversion_factor: Scalar or 1-d array of gCO2 per ZEV credit (167 in the tracker).
+        borrowing_cap: Scalar or 1-d array of the share of the mandate that can be met from CO2 (.25/.6).
+    Returns:
+        dict: Arrays of shape (n_mandate, n_factor, n_cap) keyed by parameter name.
+    """
+    m, f, c = np.meshgrid(
+        np.atleast_1d(np.asarray(mandate, dtype=float)),
+        np.atleast_1d(np.asarray(conversion_factor, dtype=float)),
+        np.atleast_1d(np.asarray(borrowing_cap, dtype=float)),
+        indexing="ij"
+    )
+    return {"mandate": m, "conversion_factor": f, "borrowing_cap": c}
+
+
+def _expand(param, data_ndim: int) -> np.ndarray:
+    """
+    Append singleton axes to a policy array so it broadcasts against the data axes.
+    """
+    param = np.asarray(param, dtype=float)
+    return param.reshape(param.shape + (1,) * data_ndim)
+
+
+def trading_adjustment(co2_compliance: np.ndarray) -> np.ndarray:
+    """
+    Share of the CO2 surplus left after covering demand from non-compliant makes.
+    Args:
+        co2_compliance (np.ndarray): CO2 compliance, makes on the last axis.
+    Returns:
+        np.ndarray: (supply + demand) / supply, one value per leading index (makes axis kept as 1).
+    """
+    supply = np.where(co2_compliance > 0, co2_compliance, 0).sum(axis=-1, keepdims=True)
+    demand = np.where(co2_compliance < 0, co2_compliance, 0).sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (supply + demand) / supply
+
+
+def compliance_ledger(total_sales,
+                      nonzev_sales,
+                      co2_activity,
+                      co2_target,
+                      mandate=.22,
+                      conversion_factor=CO2_TO_ZEV_FACTOR,
+                      borrowing_cap=BORROWING_CAP_CARS,
+                      pooled_trading: bool = True) -> dict:
+    """
+    Compute the full ZEV/CO2 compliance ledger with broadcasting.
+
+    The sales arrays share a shape (..., n_makes), typically (n_months, n_makes),
+    with makes on the last axis since the CO2 trading adjustment is pooled across
+    makes. The policy arguments may be scalars or 1-d arrays; every combination is
+    evaluated and prepended as (n_mandate, n_factor, n_cap) leading axes.
+    Args:
+        total_sales: Total registrations per make.
+        nonzev_sales: Registrations with co2Emissions > 0.
+        co2_activity: Sum of co2Emissions.
+        co2_target: CO2 target per make (NaN where unknown).
+        mandate: ZEV mandate level(s).
+        conversion_factor: gCO2 per ZEV credit.
+        borrowing_cap: Fraction of the mandate that can be met with CO2 transfers.
+        pooled_trading (bool): Scale CO2 surpluses by the market-wide trading adjustment.
+    Returns:
+        dict: Arrays of shape (n_mandate, n_factor, n_cap, ..., n_makes) keyed by the
+        tracker column names in LEDGER_COLUMNS.
+    """
+    total_sales = np.asarray(total_sales, dtype=float)
+    nonzev_sales = np.asarray(nonzev_sales, dtype=float)
+    co2_activity = np.asarray(co2_activity, dtype=float)
+    co2_target = np.asarray(co2_target, dtype=float)
+    ndim = np.broadcast(total_sales, nonzev_sales, co2_activity, co2_target).nd
+
+    grid = policy_grid(mandate, conversion_factor, borrowing_cap)
+    mandate, conversion_factor, borrowing_cap = (_expand(grid[k], ndim) for k in ("mandate", "conversion_factor", "borrowing_cap"))
+
+    # The CO2 side of the ledger does not depend on the policy grid.
+    co2_allowances = co2_target * nonzev_sales
+    co2_compliance = co2_allowances - co2_activity
+    if pooled_trading:
+        co2_compliance_adj = np.where(co2_compliance > 0, co2_compliance * trading_adjustment(co2_compliance), co2_compliance)
+    else:
+        co2_compliance_adj = co2_compliance
+
+    zev_allowances = (1 - mandate) * total_sales
+    zev_surplus = zev_allowances - nonzev_sales
+
+    limit = mandate * borrowing_cap * total_sales
+    new_zev_credits = np.where(co2_compliance > 0, co2_compliance_adj / conversion_factor, 0)
+    new_zev_credits = np.minimum(new_zev_credits, limit)
+    co2_to_zev = np.where(new_zev_credits > 0, new_zev_credits, 0)
+
+    out_shape = np.broadcast(co2_allowances, zev_allowances, co2_to_zev).shape
+    ledger = {
+        "co2Allowances": co2_allowances,
+        "co2Compliance": co2_compliance,
+        "co2ComplianceAdj": co2_compliance_adj,
+        "ZEVMallowances": zev_allowances,
+        "ZEV Surplus": zev_surplus,
+        "co2_to_mandate_allowances": co2_to_zev,
+        "ZEV Surplus after CO2": zev_surplus + co2_to_zev,
+    }
+    return {key: np.broadcast_to(value, out_shape) for key, value in ledger.items()}
+
+
+def compliance_tracker(df_activity: pd.DataFrame,
+                       df_targets: pd.DataFrame,
+                       mandate=.22,
+                       conversion_factor=CO2_TO_ZEV_FACTOR,
+                       borrowing_cap=BORROWING_CAP_CARS,
+                       month_col: str = "monthOfFirstRegistration",
+                       pooled_trading: bool = True) -> pd.DataFrame:
+    """
+    Run the compliance ledger on tracker query output for every make, month and policy variant.
+    Args:
+        df_activity (pd.DataFrame): Columns make, totalSales, nonzevSales, co2Activity and optionally month_col.
+        df_targets (pd.DataFrame): Columns make, co2Target (the car_targets query).
+        mandate: ZEV mandate level(s).
+        conversion_factor: gCO2 per ZEV credit.
+        borrowing_cap: Fraction of the mandate that can be met with CO2 transfers.
+        month_col (str): Column holding the month; if missing, all rows are treated as one period.
+        pooled_trading (bool): Scale CO2 surpluses by the market-wide trading adjustment.
+    Returns:
+        pd.DataFrame: One row per policy variant x month x make, with the tracker ledger columns.
+    """
+    df = df_activity.merge(df_targets[["make", "co2Target"]], how="left", on="make")
+    single_period = month_col not in df.columns
+    if single_period:
+        df[month_col] = 0
+
+    values = ["totalSales", "nonzevSales", "co2Activity", "co2Target"]
+    panel = df.pivot_table(index=month_col, columns="make", values=values, aggfunc="first")
+    months = panel.index
+    makes = panel.columns.get_level_values("make").unique()
+    arrays = {value: panel[value].reindex(columns=makes).to_numpy(dtype=float) for value in values}
+
+    ledger = compliance_ledger(
+        total_sales=arrays["totalSales"],
+        nonzev_sales=arrays["nonzevSales"],
+        co2_activity=arrays["co2Activity"],
+        co2_target=arrays["co2Target"],
+        mandate=mandate,
+        conversion_factor=conversion_factor,
+        borrowing_cap=borrowing_cap,
+        pooled_trading=pooled_trading
+    )
+    grid = policy_grid(mandate, conversion_factor, borrowing_cap)
+
+    index = pd.MultiIndex.from_product(
+        [range(n) for n in grid["mandate"].shape] + [months, makes],
+        names=["_m", "_f", "_c", month_col, "make"]
+    )
+    out = pd.DataFrame({key: value.ravel() for key, value in ledger.items()}, index=index).reset_index()
+    for key in ("mandate", "conversion_factor", "borrowing_cap"):
+        out[key] = grid[key][out["_m"], out["_f"], out["_c"]]
+    out = out.drop(columns=["_m", "_f", "_c"])
+
+    # Missing make/month combinations (makes with no sales in a month) are dropped.
+    out = out.merge(df, how="inner", on=[month_col, "make"])
+    if single_period:
+        out = out.drop(columns=month_col)
+    front = [c for c in df.columns if c in out.columns]
+    return out[front + ["mandate", "conversion_factor", "borrowing_cap"] + LEDGER_COLUMNS]
@@ -0,0 +1,254 @@
+"""
+Monte Carlo uncertainty for manufacturer ZEV mandate compliance.
+
+The compliance tracker gives one deterministic 'ZEV Surplus after CO2' per make.
+Here the months left in the compliance year are simulated instead: monthly
+volumes are log-normal around each make's recent level, and the ZEV share
+follows a random walk in logit space from its latest level. Shocks can be
+correlated between makes. Each draw's full-year totals (observed year to date
+plus simulated remainder) go through compliance_ledger, so allowances, the
+pooled CO2 trading adjustment and the borrowing cap are recomputed per draw.
+Batches of draws run in a process pool.
+
+Example (05.01 Compliance tracker, monthly tracker output):
+    sim = simulate_compliance(df_monthly, df_targets, n_draws=20000, correlation='empirical',
+                              mandate=.22, borrowing_cap=[.25, .6], n_workers=4)
+    sim['summary'].query('borrowing_cap == .25').sort_values('p_compliance')
+"""
+# Packages
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules
+from .compliance import BORROWING_CAP_CARS, CO2_TO_ZEV_FACTOR, compliance_ledger, policy_grid
+
+
+SUMMARY_QUANTILES = (.05, .5, .95)
+
+
+def _logit(p):
+    return np.log(p) - np.log1p(-p)
+
+
+def _expit(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _nearest_correlation(c, shrink=.1):
+    # Shrink towards the identity and clip negative eigenvalues so the Cholesky factor exists.
+    c = (1 - shrink) * np.nan_to_num(c) + shrink * np.eye(len(c))
+    w, v = np.linalg.eigh((c + c.T) / 2)
+    c = (v * np.clip(w, 1e-6, None)) @ v.T
+    d = np.sqrt(np.diag(c))
+    return c / np.outer(d, d)
+
+
+def sales_model(df_activity: pd.DataFrame, month_col='monthOfFirstRegistration', year_start=None, window=12,
+                recent=3, drift=False) -> dict:
+    """
+    Year-to-date totals and per-make volume and ZEV-share dynamics from monthly tracker output.
+    Args:
+        df_activity (pd.DataFrame): Columns make, totalSales, nonzevSales, co2Activity and month_col ('YYYY-MM').
+        year_start: First month of the compliance year (default January of the latest month's year).
+        window (int): Months of history used to estimate volume and share variability.
+        recent (int): Months pooled for the starting ZEV share.
+        drift (bool): Continue each make's mean monthly change in logit ZEV share.
+    Returns:
+        dict: makes, months_remaining, ytd totals and the model parameters as (n_makes,) arrays.
+    """
+    panel = df_activity.pivot_table(index=month_col, columns='make',
+                                    values=['totalSales', 'nonzevSales', 'co2Activity'], aggfunc='sum').fillna(0)
+    panel.index = pd.PeriodIndex(pd.to_datetime(panel.index.astype(str)), freq='M')
+    panel = panel.sort_index()
+    makes = panel['totalSales'].columns
+    total, nonzev, co2 = (panel[v].reindex(columns=makes).to_numpy(dtype=float)
+                          for v in ('totalSales', 'nonzevSales', 'co2Activity'))
+
+    start = pd.Period(year_start, freq='M') if year_start is not None else pd.Period(year=panel.index[-1].year, month=1, freq='M')
+    ytd = np.asarray(panel.index >= start)
+    months_remaining = 12 - int(ytd.sum())
+    if months_remaining < 0:
+        raise ValueError(f'{int(ytd.sum())} months of data from {start}: more than one compliance year.')
+
+    hist = slice(-window, None)
+    log_volume = np.log1p(total[hist])
+    sigma_volume = np.nan_to_num(log_volume.std(axis=0, ddof=1))
+    # Log-normal with the recent mean monthly volume as its expectation.
+    mu_volume = np.log(np.maximum(total[hist].mean(axis=0), 1e-9)) - sigma_volume ** 2 / 2
+
+    zev = total - nonzev
+    share = _logit((zev[hist] + .5) / (total[hist] + 1))
+    steps = np.diff(share, axis=0)
+    sigma_share = np.nan_to_num(steps.std(axis=0, ddof=1)) if len(steps) > 1 else np.zeros(len(makes))
+    drift_share = steps.mean(axis=0) if drift and len(steps) else np.zeros(len(makes))
+    share0 = _logit((zev[-recent:].sum(axis=0) + .5) / (total[-recent:].sum(axis=0) + 1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        intensity = np.nan_to_num(co2[hist].sum(axis=0) / nonzev[hist].sum(axis=0))
+        z_volume = (log_volume - log_volume.mean(axis=0)) / np.where(sigma_volume > 0, sigma_volume, 1)
+
+    return {
+        'makes': makes,
+        'months_remaining': months_remaining,
+        'ytd_total': total[ytd].sum(axis=0),
+        'ytd_nonzev': nonzev[ytd].sum(axis=0),
+        'ytd_co2': co2[ytd].sum(axis=0),
+        'mu_volume': mu_volume,
+        'sigma_volume': sigma_volume,
+        'share0': share0,
+        'sigma_share': sigma_share,
+        'drift_share': drift_share,
+        'intensity': intensity,
+        # Standardised volume residuals, for correlation='empirical'.
+        'residuals': z_volume,
+    }
+
+
+def correlation_factor(model: dict, correlation=None) -> np.ndarray:
+    """
+    Cholesky factor of the between-make shock correlation.
+    correlation: None (independent makes), a scalar (same correlation for every pair),
+    'empirical' (from the historical volume residuals), or an (n_makes, n_makes) array/DataFrame.
+    """
+    n = len(model['makes'])
+    if correlation is None:
+        return np.eye(n)
+    if isinstance(correlation, str):
+        if correlation != 'empirical':
+            raise ValueError(f"Unknown correlation {correlation!r}; use None, a number, 'empirical' or a matrix.")
+        c = pd.DataFrame(model['residuals']).corr(min_periods=3).to_numpy()
+    elif np.ndim(correlation) == 0:
+        c = np.full((n, n), float(correlation))
+        np.fill_diagonal(c, 1)
+    else:
+        if isinstance(correlation, pd.DataFrame):
+            correlation = correlation.reindex(index=model['makes'], columns=model['makes'])
+        c = np.asarray(correlation, dtype=float)
+    np.fill_diagonal(c, 1)
+    return np.linalg.cholesky(_nearest_correlation(c, shrink=.1 if isinstance(correlation, str) else 0))
+
+
+def _simulate_chunk(args):
+    model, chol, co2_target, policy, pooled_trading, size, seed = args
+    rng = np.random.default_rng(seed)
+    k, n = model['months_remaining'], len(chol)
+
+    total, nonzev, co2 = model['ytd_total'], model['ytd_nonzev'], model['ytd_co2']
+    if k:
+        z_volume = rng.standard_normal((size, k, n)) @ chol.T
+        z_share = rng.standard_normal((size, k, n)) @ chol.T
+        volume = np.exp(model['mu_volume'] + model['sigma_volume'] * z_volume)
+        share = _expit(model['share0'] + np.cumsum(model['drift_share'] + model['sigma_share'] * z_share, axis=1))
+        future_total = volume.sum(axis=1)
+        future_nonzev = future_total - (volume * share).sum(axis=1)
+        total = total + future_total
+        nonzev = nonzev + future_nonzev
+        co2 = co2 + future_nonzev * model['intensity']
+    else:
+        total, nonzev, co2 = (np.broadcast_to(a, (size, n)) for a in (total, nonzev, co2))
+
+    ledger = compliance_ledger(total, nonzev, co2, co2_target, pooled_trading=pooled_trading, **policy)
+    return {
+        'surplus': ledger['ZEV Surplus after CO2'].astype(np.float32),
+        'co2_credits': ledger['co2_to_mandate_allowances'].astype(np.float32),
+        'total_sales': np.asarray(total, dtype=np.float32),
+    }
+
+
+def simulate_compliance(df_activity: pd.DataFrame,
+                        df_targets: pd.DataFrame,
+                        n_draws=10000,
+                        correlation=None,
+                        mandate=.22,
+                        conversion_factor=CO2_TO_ZEV_FACTOR,
+                        borrowing_cap=BORROWING_CAP_CARS,
+                        pooled_trading=True,
+                        seed=0,
+                        n_workers=None,
+                        chunk_size=1000,
+                        quantiles=SUMMARY_QUANTILES,
+                        **model_kwargs) -> dict:
+    """
+    Simulate the rest of the compliance year n_draws times for every make and policy variant.
+    Args:
+        df_activity (pd.DataFrame): Monthly tracker output (see sales_model).
+        df_targets (pd.DataFrame): Columns make, co2Target.
+        n_draws (int): Number of simulated years.
+        correlation: Between-make correlation of volume and share shocks (see correlation_factor).
+        mandate, conversion_factor, borrowing_cap: Scalars or 1-d arrays, as in compliance_ledger.
+        pooled_trading (bool): Pool CO2 surpluses across makes within each draw.
+        seed (int): Seed; results do not depend on n_workers.
+        n_workers (int): Worker processes (None runs in-process).
+        chunk_size (int): Draws per batch.
+        quantiles: Quantiles of surplus and shortfall reported in the summary.
+        **model_kwargs: Passed to sales_model (month_col, year_start, window, recent, drift).
+    Returns:
+        dict: 'summary' (one row per policy variant x make), 'surplus', 'co2_credits' and 'total_sales'
+        draws as arrays of shape (n_mandate, n_factor, n_cap, n_draws, n_makes) (total_sales: (n_draws, n_makes)),
+        'makes' and the fitted 'model'.
+    """
+    model = sales_model(df_activity, **model_kwargs)
+    makes = model['makes']
+    chol = correlation_factor(model, correlation)
+    co2_target = df_targets.drop_duplicates('make').set_index('make')['co2Target'].reindex(makes).to_numpy(dtype=float)
+    policy = {'mandate': mandate, 'conversion_factor': conversion_factor, 'borrowing_cap': borrowing_cap}
+
+    sizes = [min(chunk_size, n_draws - i) for i in range(0, n_draws, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(model, chol, co2_target, policy, pooled_trading, size, s) for size, s in zip(sizes, seeds)]
+    if n_workers and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_simulate_chunk, chunks))
+    else:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+    surplus = np.concatenate([r['surplus'] for r in results], axis=-2)
+    co2_credits = np.concatenate([r['co2_credits'] for r in results], axis=-2)
+    total_sales = np.concatenate([r['total_sales'] for r in results], axis=0)
+
+    return {
+        'summary': summarise(surplus, makes, policy, quantiles=quantiles),
+        'surplus': surplus,
+        'co2_credits': co2_credits,
+        'total_sales': total_sales,
+        'makes': makes,
+        'model': model,
+    }
+
+
+def summarise(surplus: np.ndarray, makes, policy: dict, quantiles=SUMMARY_QUANTILES) -> pd.DataFrame:
+    """
+    Probability of compliance and surplus/shortfall distribution per policy variant and make.
+    Shortfall is the number of ZEV credits missing (0 in compliant draws).
+    """
+    grid = policy_grid(**policy)
+    surplus = surplus.reshape(-1, *surplus.shape[-2:]).astype(float)
+    shortfall = np.maximum(-surplus, 0)
+    columns = {
+        'p_compliance': (surplus >= 0).mean(axis=1),
+        'surplus_mean': surplus.mean(axis=1),
+        'shortfall_mean': shortfall.mean(axis=1),
+    }
+    for q, s, f in zip(quantiles, np.quantile(surplus, quantiles, axis=1), np.quantile(shortfall, quantiles, axis=1)):
+        columns[f'surplus_p{100 * q:g}'] = s
+        columns[f'shortfall_p{100 * q:g}'] = f
+    n_policy, n_makes = surplus.shape[0], len(makes)
+    out = pd.DataFrame({
+        'mandate': np.repeat(grid['mandate'].ravel(), n_makes),
+        'conversion_factor': np.repeat(grid['conversion_factor'].ravel(), n_makes),
+        'borrowing_cap': np.repeat(grid['borrowing_cap'].ravel(), n_makes),
+        'make': np.tile(np.asarray(makes), n_policy),
+    })
+    for name, value in columns.items():
+        out[name] = value.ravel()
+    return out
+
+
+def shortfall_distribution(sim: dict, make, bins=50, policy_index=(0, 0, 0)) -> pd.Series:
+    """
+    Histogram (share of draws) of one make's credit shortfall for one policy variant.
+    """
+    i = list(sim['makes']).index(make)
+    shortfall = np.maximum(-sim['surplus'][tuple(policy_index)][:, i].astype(float), 0)
+    counts, edges = np.histogram(shortfall, bins=bins)
+    return pd.Series(counts / len(shortfall), index=pd.IntervalIndex.from_breaks(edges), name=make)
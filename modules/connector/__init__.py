@@ -0,0 +1,46 @@
+#Version updated on 16th Feb 2023
+"""
+Connectors to the services we use: Slack, Cloud Storage, MySQL, Postgres and BigQuery.
+
+Each backend lives in its own module and is imported on first access, so
+`from modules.connector import MyBigQuery` loads the BigQuery client library
+only - not geopandas, the database drivers or the Slack SDK. Clients, engines
+and connection pools are likewise built the first time they are used, not when
+the object is constructed.
+
+The aggregation query builder (Query, Sum, Count, ...) lives in query.py.
+"""
+import importlib
+
+_EXPORTS = {
+    'SlackBot': 'slack',
+    'MyLogger': 'slack',
+    'MyBucket': 'bucket',
+    'MySQL': 'mysql',
+    'MyPostgres': 'postgres',
+    'MyBigQuery': 'bigquery',
+    'Query': 'query',
+    'col': 'query',
+    'Sum': 'query',
+    'Count': 'query',
+    'Avg': 'query',
+    'Min': 'query',
+    'Max': 'query',
+    'Ratio': 'query',
+    'Round': 'query',
+    'sqlite_from_frames': 'query',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if(name not in _EXPORTS):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}',__name__),name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
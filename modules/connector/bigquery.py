@@ -0,0 +1,195 @@
+"""
+BigQuery queries (optionally cached locally), paged/streamed results and upserts.
+"""
+import numbers
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from google.cloud import bigquery
+from ..query_cache import QueryCache
+from ..streaming import fold_batches
+from ..instrumentation import instrumented, metrics
+
+class MyBigQuery:
+
+    def __init__(self,
+                 credentials_file = './credentials/New AutoMotive Index-487e031dc242.json',
+                 cache = None
+                ):
+        """
+        cache can be True (default QueryCache in ./query_cache), a folder path or a QueryCache instance.
+        Caching is opt-in: with cache=None every query goes to BigQuery.
+        """
+        self.project_id = 'rugged-baton-283921'
+        self.credentials_file = credentials_file
+        self._bq_client = None
+        if(cache is True):
+            cache = QueryCache()
+        elif(isinstance(cache,str)):
+            cache = QueryCache(cache_dir=cache)
+        self.cache = cache
+
+    @property
+    def bq_client(self):
+        # Created on the first query, so cached-only sessions never authenticate.
+        if(self._bq_client is None):
+            from google.oauth2 import service_account
+            self._bq_client = bigquery.Client(credentials=service_account.Credentials.from_service_account_file(self.credentials_file),
+                                             project=self.project_id
+                                             )
+        return self._bq_client
+
+    @instrumented()
+    def from_bq_to_dataframe(self,query,use_cache=True,params=None):
+
+        if(self.cache and use_cache):
+            df = self.cache.get(query,params=params)
+            if(df is not None):
+                metrics.annotate(local_cache_hit=True)
+                return df
+        job_config = None
+        if(params):
+            job_config = bigquery.QueryJobConfig(query_parameters=[self._query_parameter(k,v) for k,v in params.items()])
+        query_job = self.bq_client.query(query,job_config=job_config)
+        df = query_job.to_dataframe()
+        self._annotate_job(query_job)
+        if(self.cache and use_cache):
+            self.cache.put(query,df,params=params,bytes_processed=query_job.total_bytes_processed)
+        return df 
+
+    @instrumented()
+    def iter_bq_batches(self,query,page_size=100000,output='pandas',params=None,use_storage_api=True):
+        """
+        Run a query and yield its result page by page instead of materialising it as one DataFrame.
+        output='pandas' yields DataFrames, output='arrow' yields pyarrow RecordBatches.
+        Memory stays bounded by page_size rows; use streaming.RunningAggregate to fold pages into
+        group-by aggregates. The BigQuery Storage API is used when available (much faster on large results).
+        """
+        job_config = None
+        if(params):
+            job_config = bigquery.QueryJobConfig(query_parameters=[self._query_parameter(k,v) for k,v in params.items()])
+        query_job = self.bq_client.query(query,job_config=job_config)
+        rows = query_job.result(page_size=page_size)
+        self._annotate_job(query_job)
+        bqstorage_client = None
+        if(use_storage_api):
+            try:
+                from google.cloud import bigquery_storage
+                bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=self.bq_client._credentials)
+            except ImportError:
+                bqstorage_client = None
+        if(output == 'arrow'):
+            for batch in rows.to_arrow_iterable(bqstorage_client=bqstorage_client):
+                yield batch
+        else:
+            for df in rows.to_dataframe_iterable(bqstorage_client=bqstorage_client):
+                yield df
+
+    def fold_bq_batches(self,query,by,aggs,page_size=100000,params=None):
+        """
+        Stream a query and return running group-by aggregates, e.g.
+        fold_bq_batches(sql, by=['make','fuelType'], aggs={'co2Emissions': ['mean','count']}).
+        """
+        return fold_batches(self.iter_bq_batches(query,page_size=page_size,params=params),by=by,aggs=aggs)
+
+    @staticmethod
+    def _annotate_job(job):
+        # BigQuery's own accounting of the call: bytes scanned/billed and whether its result cache was used.
+        metrics.annotate(job_id=job.job_id,
+                         bytes_processed=job.total_bytes_processed,
+                         bytes_billed=job.total_bytes_billed,
+                         cache_hit=job.cache_hit,
+                         slot_millis=job.slot_millis)
+        return
+
+    @staticmethod
+    def _query_parameter(name,value):
+        # Named @parameters, e.g. the start/end dates of a tracker window. numpy scalars are sent as plain
+        # Python values of the matching type (np.int64 is not an int).
+        if(isinstance(value,(bool,np.bool_))):
+            type_,value = 'BOOL',bool(value)
+        elif(isinstance(value,numbers.Integral)):
+            type_,value = 'INT64',int(value)
+        elif(isinstance(value,numbers.Real)):
+            type_,value = 'FLOAT64',float(value)
+        elif(isinstance(value,datetime)):
+            type_ = 'DATETIME'
+        elif(hasattr(value,'isoformat')):
+            type_ = 'DATE'
+        else:
+            type_ = 'STRING'
+        return bigquery.ScalarQueryParameter(name,type_,value)
+
+    def invalidate_cache(self,query=None,pattern=None):
+
+        if(not self.cache):
+            return 0
+        return self.cache.invalidate(sql=query,pattern=pattern)
+        
+    def get_info_schema(self,schema='mots_uk'):
+         
+         return self.from_bq_to_dataframe(query=f"SELECT * FROM {self.project_id}.{schema}.INFORMATION_SCHEMA.TABLES;",use_cache=False)[['table_catalog','table_schema','table_name','creation_time']]
+          
+    def get_info_table(self,schema='mots_uk',table_name='vehicles_old'):
+        
+        return self.from_bq_to_dataframe(query=f"SELECT * FROM {self.project_id}.{schema}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS WHERE table_name='{table_name}';",use_cache=False)[['table_schema','table_name','column_name','data_type']]
+
+    @instrumented()
+    def upsert_from_df(self,
+                    table_name,
+                    df,
+                    dataset_name='mots_uk',
+                    job_config=None,
+                    unique_fields=None,
+                    server_merge=False,
+                    update=False,
+                    batch_size=None,
+                    partition_column=None):
+        """
+        This method allows to create/update in many ways:
+        1. if the table does not exist, it creates a new one using job_config if specified
+        2. if the table already exists, it appends the content. A list of already existing columns can be
+           passed and the method will not append duplicated rows in the fields, i.e. do not appends 
+           new rows having already exixsting values for the columns specified.
+        With server_merge=True and unique_fields, the deduplication is done by BigQuery: df is loaded into
+        a staging table (batch_size rows at a time) and MERGEd on unique_fields, optionally updating
+        matched rows (update=True) and pruning the target on partition_column. See upsert.merge_upsert.
+        """
+        metrics.annotate(rows=len(df),bytes=int(df.memory_usage(index=True).sum()))
+        if(server_merge and unique_fields is not None):
+            from ..upsert import BigQueryBackend, merge_upsert
+            return merge_upsert(BigQueryBackend(self,dataset_name=dataset_name),table_name,df,unique_fields,
+                                update=update,batch_size=batch_size,partition_column=partition_column,job_config=job_config)
+
+        table_ref = self.bq_client.dataset(dataset_name).table(table_name)
+
+        # Check if table already exists
+        table_exists = table_name in self.get_info_schema(schema=dataset_name).table_name.to_list()
+
+        # If table exists and merge=True, update the existing table; otherwise, create a new table
+        if table_exists:
+            print("Table exixsts. Upserting ...")
+            job_config = job_config or bigquery.LoadJobConfig()
+            job_config.write_disposition = 'WRITE_APPEND'
+            job_config.schema_update_options = ['ALLOW_FIELD_ADDITION']
+            if unique_fields is not None:
+                columns = ','.join(unique_fields)
+                query = f'SELECT DISTINCT {columns} FROM `{dataset_name}.{table_name}`'
+                df_query = self.from_bq_to_dataframe(query,use_cache=False)
+                df=pd.merge(df,df_query,on=unique_fields, how='outer', indicator=True).query("_merge == 'left_only'").drop('_merge', axis=1).reset_index(drop=True)
+                print(f"Size updates to insert {len(df)}")
+        else:
+            print("Table does not exist")
+            if job_config:
+                job_config.write_disposition = 'WRITE_TRUNCATE'
+            else:
+                job_config = bigquery.LoadJobConfig(write_disposition='WRITE_TRUNCATE')
+
+        # If an id column is specified, query the table to get the existing ids
+
+
+        # Load the dataframe into BigQuery
+        bigquery_job = self.bq_client.load_table_from_dataframe(df, table_ref, job_config=job_config)
+        bigquery_job.result()
+        metrics.annotate(rows=bigquery_job.output_rows,job_id=bigquery_job.job_id)
+        return
@@ -0,0 +1,121 @@
+"""
+Google Cloud Storage bucket: listing, CSV reads and parallel uploads/downloads.
+"""
+import os
+import pandas as pd
+from ..transfers import download_blob, download_many, read_csv_stream, upload_many
+from ..instrumentation import instrumented, metrics
+
+class MyBucket:
+    
+    def __init__(self,
+                bucket_name='eu_csv',
+                credentials_file = './credentials/New AutoMotive Index-487e031dc242.json',
+                bucket = None,
+                workers = 8
+                ):
+        """
+        bucket can be any object with the google.cloud.storage.Bucket interface, e.g.
+        transfers.LocalBucket('some/folder') to work against a local directory.
+        """
+        self.workers = workers
+        self.credentials_file = credentials_file
+        self._storage_client = None
+        self._bucket = bucket
+        self.bucket_name = bucket.name if bucket is not None else bucket_name
+        return
+
+    @property
+    def storage_client(self):
+
+        if(self._storage_client is None):
+            from google.cloud import storage
+            self._storage_client = storage.Client.from_service_account_json(self.credentials_file)
+        return self._storage_client
+
+    @property
+    def bucket(self):
+        # Looked up (one network call) on first use rather than at construction.
+        if(self._bucket is None):
+            self._bucket = self.storage_client.get_bucket(self.bucket_name)
+            print('Bucket ' + self.bucket_name + ' successfully found')
+        return self._bucket
+
+    def show_files_in_folder(self,remote_folder):
+        file_list = list(self.bucket.list_blobs(prefix=remote_folder))
+        if(not file_list):
+            raise FileNotFoundError(f'Folder {remote_folder} not found in {self.bucket_name}.')
+        return file_list
+
+    @instrumented()
+    def get_pandas_csv(self,
+                       file_name,
+                       download = False,
+                       local_path = './',
+                       sep = ",",
+                       chunksize = None):
+        """
+        With download=True the blob is downloaded once (skipped if the local copy's checksum matches)
+        and read from disk; otherwise it is streamed straight into read_csv.
+        With chunksize, an iterator of DataFrames is returned.
+        """
+        if(download):
+            local_file = os.path.join(local_path,file_name.split('/')[-1])
+            download_blob(self.bucket.get_blob(file_name) or self.bucket.blob(file_name),local_file)
+            metrics.annotate(bytes=os.path.getsize(local_file))
+            return pd.read_csv(local_file,sep=sep,on_bad_lines='skip',chunksize=chunksize)
+        return read_csv_stream(self.bucket.blob(file_name),chunksize=chunksize,sep=sep,on_bad_lines='skip')
+    
+    @instrumented()
+    def upload_file_to_bucket(self,
+                              path_file, 
+                              destination_blob_name
+                              ):
+
+        file_name = path_file.split('/')[-1]
+        destination_path = os.path.join(destination_blob_name,file_name)
+        blob = self.bucket.blob(destination_path)
+        blob.upload_from_filename(path_file)
+        metrics.annotate(bytes=os.path.getsize(path_file))
+        print(f"File {path_file} uploaded to {destination_path}.")
+        return 
+
+    @instrumented()
+    def upload_files(self,
+                     paths,
+                     destination_blob_name,
+                     skip_existing = True
+                     ):
+
+        results = upload_many(self.bucket,paths,destination_blob_name,workers=self.workers,skip_existing=skip_existing)
+        uploaded = sum(status == 'uploaded' for status in results.values())
+        metrics.annotate(bytes=sum(os.path.getsize(path) for path in paths
+                                   if results.get(os.path.join(destination_blob_name,os.path.basename(path))) == 'uploaded'))
+        print(f"{uploaded} files uploaded to {destination_blob_name}, {len(results) - uploaded} already up to date.")
+        return results
+
+    @instrumented()
+    def download_files(self,
+                       prefix_file,
+                       local_path,
+                       format = '.json',
+                       file_target = None,
+                       skip_existing = True
+                       ):
+
+        os.makedirs(local_path,exist_ok=True)
+        blobs = []
+        for blob in self.bucket.list_blobs(prefix=prefix_file):
+            file_name = blob.name.split('/')[-1]
+            if(not file_target):
+                if(file_name.endswith(format)):#downlaod all files with a specific format
+                    blobs.append(blob)
+            else:
+                if(file_name == file_target):#downlaod only a specific file
+                    blobs.append(blob)
+
+        results = download_many(blobs,local_path,workers=self.workers,skip_existing=skip_existing)
+        skipped = sum(status == 'skipped' for status in results.values())
+        metrics.annotate(bytes=sum(blob.size or 0 for blob in blobs if results.get(blob.name) != 'skipped'))
+        print(f'{len(results) - skipped} blobs downloaded to {local_path}, {skipped} already up to date.')
+        return results
@@ -0,0 +1,264 @@
+"""
+MySQL (Cloud SQL) through a pooled SQLAlchemy engine.
+"""
+import json
+import os
+import time
+import pandas as pd
+from ..instrumentation import instrumented, metrics
+
+class MySQL:
+
+    def __init__(self,
+                db,
+                credentials_files='./credentials/local_credentials.json',#read credentials servers mysql from this json file
+                GCR = True,
+                pool_size = 5,
+                max_overflow = 10,
+                pool_recycle = 1800,
+                local_infile = False
+                ):
+
+        with open(credentials_files) as json_file:
+            params = json.load(json_file)
+        self.db_user = params['user']
+        self.db_pass = params['password']
+        self.db_name = db
+        self.db_host = params['host']
+        self.cloud_sql_connection_region = params['cloud_sql_connection_region']
+        self.cloud_sql_connection_name = params['cloud_sql_connection_name']
+
+        self.GCR = GCR
+        self.local_infile = local_infile
+        self.pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_recycle': pool_recycle}
+        self._engine = None
+        return 
+
+    @property
+    def engine(self):
+        # Built, and the connection checked, on first use.
+        if(self._engine is None):
+            self._engine = self.create_engine(**self.pool_options)
+            try:
+                with self._engine.connect():
+                    pass
+                print(f'Connected to {self.db_name} database at {self.db_host}!\nDeployment in GCR: {self.GCR}\n')
+            except Exception as e:
+                print(f"Impossible to connect to to {self.db_name} database at {self.db_host}.\nERROR: {e}")
+        return self._engine
+
+    def create_engine(self,pool_size=5,max_overflow=10,pool_recycle=1800):
+        """
+        Build the SQLAlchemy engine (and its connection pool) used by every method of the instance.
+        """
+        import sqlalchemy
+
+        query = {}
+        if(self.GCR):
+            query["unix_socket"] = "{}/{}".format(
+                            "/cloudsql",  # e.g. "/cloudsql"
+                            f"rugged-baton-283921:{self.cloud_sql_connection_region}:{self.cloud_sql_connection_name}")#in GCR you need to specify the region and the istance name too
+        return sqlalchemy.create_engine(
+                sqlalchemy.engine.url.URL.create(
+                    drivername="mysql+pymysql",
+                    username=self.db_user,  # e.g. "my-database-user"
+                    password=self.db_pass,  # e.g. "my-database-password"
+                    database=self.db_name,  # e.g. "my-database-name"
+                    host=self.db_host,
+                    query=query
+                ),
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=True,
+                connect_args={"local_infile": True} if self.local_infile else {}
+            )
+
+    def db_connection(self):
+
+        return self.engine.connect()
+
+    def dispose(self):
+
+        if(self._engine is not None):
+            self._engine.dispose()
+        return 
+
+    def show_db(self):
+        
+        return self.from_sql_to_pandas(sql_query="""SHOW DATABASES;""")
+    
+    def show_tables(self,db=None):
+        
+        if(not db):
+            db = self.db_name
+        print(db)
+        query_columns = f"""SELECT TABLE_SCHEMA,TABLE_NAME,TABLE_ROWS,CREATE_TIME,UPDATE_TIME FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = '{db}'
+        ORDER BY UPDATE_TIME;
+        """
+        return self.from_sql_to_pandas(sql_query=query_columns)
+
+    def show_columns(self,table):
+
+        query = f'SHOW COLUMNS from {table};'
+        return self.from_sql_to_pandas(query)
+
+    @instrumented()
+    def run_query(self,query):
+        with self.db_connection() as conn:
+            res = conn.execute(query)
+        try:
+            return res.fetchall()
+        except Exception as e:
+            print('Nothing to return!')
+            return 
+    def db_create_table_from_csv(self,table_name = 'mlResults',
+                                file_path=f'../analysis/Wakefield/properties_Wakefield.csv',
+                                columns=False,
+                                rename_columns_dict=False,
+                                chunksize=50000,
+                                method='multi'):
+        print(f'Creating {table_name} from {file_path} ...\n\n')
+        try: 
+            self.db_load_csv(table_name,file_path,columns=columns,rename_columns_dict=rename_columns_dict,
+                             chunksize=chunksize,method=method,if_exists='fail')
+            return True
+        except ValueError:
+            print(f"ERROR: {table_name} already exists! Create a new table or use use the method db_update_table_from_csv(table_name,file_path)")
+            return False
+
+
+    def db_update_table_from_csv(self,
+                                table_name,
+                                file_path,
+                                create_first=True,
+                                columns=False,
+                                rename_columns_dict=False,
+                                chunksize=50000,
+                                method='multi'):
+        
+        if(create_first):
+            if(self.db_create_table_from_csv(table_name=table_name,file_path=file_path,columns=columns,rename_columns_dict=rename_columns_dict,chunksize=chunksize,method=method)):
+                return 
+        print(f"Updating {table_name} importing {file_path} ...\n\n")
+        self.db_load_csv(table_name,file_path,columns=columns,rename_columns_dict=rename_columns_dict,
+                         chunksize=chunksize,method=method,if_exists='append')
+        return 
+
+    @instrumented()
+    def db_load_csv(self,
+                    table_name,
+                    file_path,
+                    columns=False,
+                    rename_columns_dict=False,
+                    chunksize=50000,
+                    method='multi',
+                    if_exists='append',
+                    dtype=None):
+        """
+        Stream a CSV into a table without loading it all in memory.
+        method='multi' reads the file in chunks of chunksize rows and inserts each with multi-row INSERTs.
+        When this creates the table, the column types are inferred from the whole file (one extra pass),
+        not from the first chunk; dtype (column -> SQLAlchemy type) overrides them as in DataFrame.to_sql.
+        method='infile' hands the file to the server with LOAD DATA LOCAL INFILE (the table must exist and the
+        instance must be created with local_infile=True); if_exists='fail' raises if it exists, 'replace'
+        empties it first.
+        Everything runs in one transaction. Returns the number of rows loaded and the rows per second.
+        """
+        start = time.perf_counter()
+        rows = 0
+        exists = self.table_exists(table_name)
+        if(if_exists == 'fail' and exists):
+            raise ValueError(f"Table '{table_name}' already exists.")
+        if(method == 'infile'):
+            if(not exists):
+                raise ValueError(f"Table '{table_name}' must exist to load it with LOAD DATA LOCAL INFILE.")
+            rows = self._load_data_infile(table_name,file_path,columns=columns,rename_columns_dict=rename_columns_dict,
+                                          replace=if_exists == 'replace')
+        else:
+            creating = not exists or if_exists == 'replace'
+            dtypes = self._csv_dtypes(file_path,chunksize,columns,rename_columns_dict) if creating else {}
+            with self.engine.begin() as conn:
+                for i,chunk in enumerate(pd.read_csv(file_path,chunksize=chunksize)):
+                    if(rename_columns_dict):
+                        chunk = chunk.rename(columns=rename_columns_dict)
+                    if(columns):
+                        chunk = chunk[columns]
+                    if(dtypes):
+                        chunk = chunk.astype(dtypes)
+                    chunk.to_sql(table_name, conn, if_exists=if_exists if i == 0 else 'append', index=False, method='multi',
+                                 chunksize=1000, dtype=dtype)
+                    rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        rate = rows/elapsed if elapsed > 0 else float('nan')
+        print(f'Loaded {rows} rows into {table_name} in {elapsed:.1f}s ({rate:,.0f} rows/s)')
+        metrics.annotate(rows=rows,bytes=os.path.getsize(file_path))
+        return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rate}
+
+    def table_exists(self,table_name):
+
+        import sqlalchemy
+        return sqlalchemy.inspect(self.engine).has_table(table_name)
+
+    @staticmethod
+    def _csv_dtypes(file_path,chunksize,columns=False,rename_columns_dict=False):
+        # The pandas dtype of each column that holds every chunk: bool/int columns widen to float when
+        # another chunk has decimals or NaNs, anything mixed with text becomes object.
+        kinds = {}
+        for chunk in pd.read_csv(file_path,chunksize=chunksize):
+            if(rename_columns_dict):
+                chunk = chunk.rename(columns=rename_columns_dict)
+            if(columns):
+                chunk = chunk[columns]
+            for c,kind in chunk.dtypes.map(lambda d: d.kind).items():
+                previous = kinds.get(c,kind)
+                if(previous == kind):
+                    kinds[c] = kind
+                elif({previous,kind} <= {'i','u','f'}):
+                    kinds[c] = 'f'
+                else:
+                    kinds[c] = 'O'
+        names = {'b': 'bool', 'i': 'int64', 'u': 'uint64', 'f': 'float64'}
+        return {c: names.get(kind,'object') for c,kind in kinds.items()}
+
+    def _load_data_infile(self,table_name,file_path,columns=False,rename_columns_dict=False,replace=False):
+
+        header = pd.read_csv(file_path,nrows=0).columns.tolist()
+        rename_columns_dict = rename_columns_dict or {}
+        targets = []
+        for c in header:
+            name = rename_columns_dict.get(c,c)
+            # Columns not selected are read into a user variable and dropped.
+            targets.append(f'`{name}`' if (not columns or name in columns) else '@dummy')
+        path = os.path.abspath(file_path).replace('\\','/').replace("'","\\'")
+        query = f"""LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{table_name}`
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        ({','.join(targets)});"""
+        with self.engine.begin() as conn:
+            if(replace):
+                conn.exec_driver_sql(f'DELETE FROM `{table_name}`')
+            res = conn.exec_driver_sql(query)
+        return res.rowcount
+
+    @instrumented()
+    def from_sql_to_pandas(self,sql_query = f"SELECT * FROM mlResults LIMIT 20;",geometry = False,crs = None,params = None,geometry_format = None):
+        """
+        params binds :name placeholders in sql_query (as compiled by query.Query).
+        geometry names a column holding WKT (ST_AsText), WKB (ST_AsBinary) or a raw MySQL geometry column;
+        it is decoded in one vectorised call and the result returned as a GeoDataFrame. geometry_format
+        ('mysql', 'wkb' or 'wkt') skips the format detection (see geostore.decode_geometry).
+        """
+        if(params):
+            import sqlalchemy
+            sql_query = sqlalchemy.text(sql_query)
+        with self.db_connection() as conn:
+            sql_df = pd.read_sql(sql=sql_query,con=conn,params=params)
+        if(geometry):
+            from ..geostore import decode_geometry
+            import geopandas as gpd
+            decoded = decode_geometry(sql_df[geometry],crs=crs,format=geometry_format)
+            sql_df = gpd.GeoDataFrame(sql_df.drop(columns=geometry),geometry=decoded.rename(geometry),crs=decoded.crs)
+        return sql_df
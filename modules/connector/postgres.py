@@ -0,0 +1,166 @@
+"""
+Postgres/PostGIS through a threaded psycopg2 connection pool.
+"""
+import io
+import json
+import sys
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+from ..instrumentation import instrumented, metrics
+
+class MyPostgres:
+
+    def __init__(self,credentials_file='./credentials/driveways-postgres.json',
+                 min_connections = 1,
+                 max_connections = 5
+                ):
+        with open(credentials_file) as json_file:
+                params = json.load(json_file)
+        self.db_user = params['user']
+        self.db_pass = params['password']
+        self.db_name = params['database']
+        self.db_host = params['host']
+        self.db_port = params.get('port',5432)
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self._pool = None
+        return 
+
+    @property
+    def pool(self):
+        # Opened on first use.
+        if(self._pool is None):
+            self._pool = psycopg2.pool.ThreadedConnectionPool(
+                                    self.min_connections,
+                                    self.max_connections,
+                                    host=self.db_host,
+                                    port=self.db_port,
+                                    database=self.db_name,
+                                    user=self.db_user,
+                                    password=self.db_pass
+                                    )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Check a connection out of the pool; it is committed (or rolled back on error) and returned on exit.
+        """
+        con = self.pool.getconn()
+        try:
+            yield con
+            con.commit()
+        except BaseException:
+            # Includes GeneratorExit when a stream_query consumer stops early.
+            con.rollback()
+            raise
+        finally:
+            self.pool.putconn(con)
+
+    def close(self):
+
+        if(self._pool is not None):
+            self._pool.closeall()
+            self._pool = None
+        return 
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+        return False
+
+    def show_tables(self):
+
+        with self.connection() as con, con.cursor() as cur:
+            cur.execute("select relname from pg_class where relkind='r' and relname !~ '^(pg_|sql_)';")
+            return(pd.DataFrame(cur.fetchall(),columns=['table_name']))
+
+
+    def show_columns(self,table='topographicarea'):
+        
+        with self.connection() as con, con.cursor() as cur:
+            try:
+                cur.execute(f"Select * FROM {table} LIMIT 0")
+                colnames = [desc[0] for desc in cur.description]
+            except psycopg2.Error:
+                print(f'Table {table} does not exist!')
+                con.rollback()
+                return 
+        return pd.DataFrame(colnames,columns=['column_name'])
+
+    @instrumented()
+    def run_query(self,query,params=None):
+        
+        with self.connection() as con, con.cursor() as cur:
+            cur.execute(query=query,vars=params)
+            if(cur.description is None):
+                return 
+            return cur.fetchall()
+
+    @instrumented()
+    def from_postgres_to_geopandas(self,sql,geom_col,crs='epsg:2770'):
+        
+        import geopandas as gpd
+
+        with self.connection() as con:
+            return gpd.read_postgis(sql=sql, con=con, crs=crs, geom_col=geom_col)
+
+    @instrumented()
+    def stream_query(self,sql,chunk_size=50000,params=None,geom_col=None,crs='epsg:2770'):
+        """
+        Yield the result of a query as DataFrames (GeoDataFrames if geom_col is given) of chunk_size rows,
+        using a named server-side cursor so only one chunk is held in memory at a time.
+        The geometry column is decoded in bulk from (hex) WKB, i.e. the raw PostGIS geometry column.
+        """
+        with self.connection() as con:
+            with con.cursor(name=f'stream_{uuid.uuid4().hex}') as cur:
+                cur.itersize = chunk_size
+                cur.execute(sql,params)
+                columns = None
+                while(True):
+                    rows = cur.fetchmany(chunk_size)
+                    if(columns is None and cur.description is not None):
+                        columns = [desc[0] for desc in cur.description]
+                    if(not rows):
+                        break
+                    df = pd.DataFrame(rows,columns=columns)
+                    if(geom_col):
+                        import geopandas as gpd
+                        df[geom_col] = gpd.GeoSeries.from_wkb(df[geom_col],crs=crs)
+                        df = gpd.GeoDataFrame(df,geometry=geom_col,crs=crs)
+                    yield df
+
+    @instrumented()
+    def bulk_insert(self,table,df,method='copy',page_size=10000):
+        """
+        Write a DataFrame into an existing table.
+        method='copy' streams it through COPY FROM STDIN (fastest), method='values' uses
+        execute_values multi-row INSERTs in pages of page_size rows.
+        GeoDataFrame geometries are sent as EWKT.
+        """
+        df = df.copy()
+        # A GeoDataFrame implies geopandas is already imported.
+        if('geopandas' in sys.modules and isinstance(df,sys.modules['geopandas'].GeoDataFrame)):
+            srid = df.crs.to_epsg() if df.crs else None
+            prefix = f'SRID={srid};' if srid else ''
+            df[df.geometry.name] = [prefix + g.wkt if g is not None else None for g in df.geometry]
+            df = pd.DataFrame(df)
+        columns = ','.join(f'"{c}"' for c in df.columns)
+        with self.connection() as con, con.cursor() as cur:
+            if(method == 'copy'):
+                buffer = io.StringIO()
+                df.to_csv(buffer,index=False,header=False,na_rep='\\N')
+                buffer.seek(0)
+                cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",buffer)
+                metrics.annotate(bytes=buffer.tell())
+            else:
+                rows = list(df.astype(object).where(df.notna(),None).itertuples(index=False,name=None))
+                psycopg2.extras.execute_values(cur,f"INSERT INTO {table} ({columns}) VALUES %s",rows,page_size=page_size)
+        metrics.annotate(rows=len(df))
+        return len(df)
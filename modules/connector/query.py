@@ -0,0 +1,345 @@
+"""
+Aggregation queries built once and compiled for MySQL, BigQuery or SQLite, so
+only the aggregated table crosses the wire.
+
+Filters are (column, op, value) tuples, ANDed together; values are sent as bound
+parameters. Aggregates may be conditional (where=...), and derived columns are
+arithmetic over the aggregates, computed in an outer SELECT. Division never
+fails: x / 0 gives NULL.
+
+Example (04 UK Sales Variance from Target):
+    q = (Query('dataOther')
+         .where(('monthOfFirstRegistration', 'between', ('2023-01', '2023-03')), ('make', '!=', 'Other'))
+         .group_by('make')
+         .agg(total_sales=Sum('registrationNumber'),
+              total_evs=Sum('registrationNumber', where=('fuelType', '=', 'Pure electric')))
+         .derive(required_evs=Round(col('total_sales') * MANDATE_VALUE),
+                 pcnt_from_mandate=100 * col('total_evs') / col('total_sales') - 100 * MANDATE_VALUE))
+    df_plot = q.fetch(sql, index=True)      # or bq, or a sqlite3 connection
+    print(q.compile('bigquery')[0])
+"""
+import math
+import numbers
+import sqlite3
+
+_OPERATORS = ['=', '!=', '<', '<=', '>', '>=', 'in', 'not in', 'between', 'like', 'is null', 'not null']
+
+
+class _Dialect:
+
+    def __init__(self,name,quote,split_names,placeholder):
+
+        self.name = name
+        self.quote = quote
+        self.split_names = split_names
+        self.placeholder = placeholder
+        return
+
+    def identifier(self,name):
+        # BigQuery quotes project.dataset.table as one identifier, MySQL/SQLite quote each part.
+        parts = name.split('.') if self.split_names else [name]
+        return '.'.join(f'{self.quote}{p}{self.quote}' for p in parts)
+
+
+DIALECTS = {
+    'mysql': _Dialect('mysql','`',True,':{}'),
+    'bigquery': _Dialect('bigquery','`',False,'@{}'),
+    'sqlite': _Dialect('sqlite','"',True,':{}'),
+}
+
+
+class _Compiler:
+
+    def __init__(self,dialect):
+
+        self.dialect = DIALECTS[dialect] if isinstance(dialect,str) else dialect
+        self.params = {}
+        return
+
+    def param(self,value):
+
+        name = f'p{len(self.params)}'
+        self.params[name] = value
+        return self.dialect.placeholder.format(name)
+
+    def condition(self,condition):
+
+        column,op = condition[0],condition[1].lower()
+        if(op not in _OPERATORS):
+            raise ValueError(f'Unknown operator {op!r}; use one of {_OPERATORS}.')
+        left = _wrap(column,as_column=True).sql(self)
+        if(op == 'is null'):
+            return f'{left} IS NULL'
+        if(op == 'not null'):
+            return f'{left} IS NOT NULL'
+        value = condition[2]
+        if(op in ('in','not in')):
+            values = list(value)
+            if(not values):
+                return '1 = 0' if op == 'in' else '1 = 1'
+            return f"{left} {op.upper()} ({', '.join(self.param(v) for v in values)})"
+        if(op == 'between'):
+            return f'{left} BETWEEN {self.param(value[0])} AND {self.param(value[1])}'
+        return f'{left} {"<>" if op == "!=" else op.upper()} {_wrap(value).sql(self)}'
+
+    def conditions(self,conditions):
+
+        return ' AND '.join(f'({self.condition(c)})' for c in conditions)
+
+
+class Expr:
+    """
+    SQL expression; combine with + - * / and numbers.
+    """
+
+    def sql(self,compiler):
+        raise NotImplementedError
+
+    def __add__(self,other): return BinOp('+',self,other)
+    def __radd__(self,other): return BinOp('+',other,self)
+    def __sub__(self,other): return BinOp('-',self,other)
+    def __rsub__(self,other): return BinOp('-',other,self)
+    def __mul__(self,other): return BinOp('*',self,other)
+    def __rmul__(self,other): return BinOp('*',other,self)
+    def __truediv__(self,other): return BinOp('/',self,other)
+    def __rtruediv__(self,other): return BinOp('/',other,self)
+    def __neg__(self): return BinOp('-',0,self)
+
+
+def _wrap(value,as_column=False):
+
+    if(isinstance(value,Expr)):
+        return value
+    return Column(value) if as_column else Literal(value)
+
+
+class Column(Expr):
+
+    def __init__(self,name):
+        self.name = name
+
+    def sql(self,compiler):
+        return compiler.dialect.identifier(self.name)
+
+
+def col(name):
+    """
+    Reference to a table column, or to an aggregate/derived alias inside derive() and having().
+    """
+    return Column(name)
+
+
+def number_literal(value):
+    """
+    SQL text of a real number (Python or numpy, not bool) as a plain int/float, or None for other values.
+    numpy scalars are converted first, since they repr as np.float64(...); NaN and infinities are rejected.
+    """
+    if(not isinstance(value,numbers.Real) or isinstance(value,bool)):
+        return None
+    number = int(value) if isinstance(value,numbers.Integral) else float(value)
+    if(not math.isfinite(number)):
+        raise ValueError(f'Cannot use {value!r} in a query.')
+    return repr(number)
+
+
+class Literal(Expr):
+
+    def __init__(self,value):
+        self.value = value
+
+    def sql(self,compiler):
+        # Numbers are inlined, anything else is bound.
+        number = number_literal(self.value)
+        if(number is None):
+            return compiler.param(self.value)
+        return f'({number})' if number.startswith('-') else number
+
+
+class BinOp(Expr):
+
+    def __init__(self,op,left,right):
+        self.op = op
+        self.left = _wrap(left)
+        self.right = _wrap(right)
+
+    def sql(self,compiler):
+        left,right = self.left.sql(compiler),self.right.sql(compiler)
+        if(self.op == '/'):
+            # 1.0 * avoids SQLite integer division; NULLIF turns x / 0 into NULL everywhere.
+            return f'(1.0 * {left} / NULLIF({right}, 0))'
+        return f'({left} {self.op} {right})'
+
+
+class Round(Expr):
+
+    def __init__(self,expr,digits=0):
+        self.expr = _wrap(expr)
+        self.digits = digits
+
+    def sql(self,compiler):
+        return f'ROUND({self.expr.sql(compiler)}, {int(self.digits)})'
+
+
+class Agg(Expr):
+    """
+    Aggregate of a column, optionally only over rows matching where (one condition or a list).
+    """
+    function = None
+
+    def __init__(self,column=None,where=None,distinct=False):
+        self.column = column
+        self.where = [where] if isinstance(where,tuple) else list(where or [])
+        self.distinct = distinct
+
+    def sql(self,compiler):
+        value = _wrap(self.column,as_column=True).sql(compiler) if self.column is not None else '1'
+        if(self.where):
+            # A conditional sum over no matching rows is 0, not NULL.
+            otherwise = ' ELSE 0' if self.function == 'SUM' else ''
+            value = f'CASE WHEN {compiler.conditions(self.where)} THEN {value}{otherwise} END'
+        if(self.function == 'COUNT' and self.column is None and not self.where):
+            value = '*'
+        return f"{self.function}({'DISTINCT ' if self.distinct else ''}{value})"
+
+
+class Sum(Agg):
+    function = 'SUM'
+
+
+class Count(Agg):
+    function = 'COUNT'
+
+
+class Avg(Agg):
+    function = 'AVG'
+
+
+class Min(Agg):
+    function = 'MIN'
+
+
+class Max(Agg):
+    function = 'MAX'
+
+
+def Ratio(numerator,denominator,scale=1):
+    """
+    scale * numerator / denominator (NULL where the denominator is 0).
+    """
+    return scale * _wrap(numerator,as_column=True) / _wrap(denominator,as_column=True)
+
+
+class Query:
+    """
+    SELECT group-bys, aggregates FROM table WHERE filters GROUP BY group-bys, with derived columns,
+    filters on the aggregated rows (having), ordering and a limit. Every method returns the query.
+    """
+
+    def __init__(self,table):
+
+        self.table = table
+        self.filters = []
+        self.groups = []
+        self.aggregates = {}
+        self.derived = {}
+        self.post_filters = []
+        self.ordering = []
+        self.row_limit = None
+        return
+
+    def where(self,*conditions):
+
+        self.filters += conditions
+        return self
+
+    def group_by(self,*columns):
+
+        self.groups += columns
+        return self
+
+    def agg(self,**aggregates):
+
+        self.aggregates.update(aggregates)
+        return self
+
+    def derive(self,**expressions):
+
+        self.derived.update(expressions)
+        return self
+
+    def having(self,*conditions):
+
+        self.post_filters += conditions
+        return self
+
+    def order_by(self,*columns):
+        """
+        Column or alias names; prefix with '-' for descending order.
+        """
+        self.ordering += columns
+        return self
+
+    def limit(self,n):
+
+        self.row_limit = n
+        return self
+
+    def compile(self,dialect='mysql'):
+        """
+        Returns (sql, params) for dialect 'mysql', 'bigquery' or 'sqlite'.
+        """
+        if(not self.aggregates):
+            raise ValueError('An aggregation query needs at least one aggregate; call agg().')
+        c = _Compiler(dialect)
+        q = c.dialect.identifier
+        select = [q(g) for g in self.groups] + [f'{e.sql(c)} AS {q(alias)}' for alias,e in self.aggregates.items()]
+        sql = f"SELECT {', '.join(select)} FROM {q(self.table)}"
+        if(self.filters):
+            sql += f' WHERE {c.conditions(self.filters)}'
+        if(self.groups):
+            sql += f" GROUP BY {', '.join(q(g) for g in self.groups)}"
+        if(self.derived or self.post_filters):
+            derived = ''.join(f', {e.sql(c)} AS {q(alias)}' for alias,e in self.derived.items())
+            sql = f'SELECT t.*{derived} FROM ({sql}) AS t'
+            if(self.post_filters):
+                # Derived aliases cannot be referenced in the WHERE of the same SELECT.
+                sql = f'SELECT * FROM ({sql}) AS d WHERE {c.conditions(self.post_filters)}'
+        if(self.ordering):
+            sql += ' ORDER BY ' + ', '.join(f'{q(o[1:])} DESC' if o.startswith('-') else q(o) for o in self.ordering)
+        if(self.row_limit is not None):
+            sql += f' LIMIT {int(self.row_limit)}'
+        return sql,c.params
+
+    def fetch(self,connection,index=False):
+        """
+        Run on a MySQL or MyBigQuery connector, or a sqlite3 connection, and return a DataFrame
+        (indexed by the group-by columns with index=True).
+        """
+        if(isinstance(connection,sqlite3.Connection)):
+            import pandas as pd
+            sql,params = self.compile('sqlite')
+            df = pd.read_sql(sql,connection,params=params)
+        elif(hasattr(connection,'from_bq_to_dataframe')):
+            sql,params = self.compile('bigquery')
+            df = connection.from_bq_to_dataframe(sql,params=params or None)
+        elif(hasattr(connection,'from_sql_to_pandas')):
+            sql,params = self.compile('mysql')
+            df = connection.from_sql_to_pandas(sql,params=params)
+        else:
+            raise TypeError(f'Cannot run a Query on {type(connection).__name__}.')
+        if(index and self.groups):
+            df = df.set_index(self.groups)
+        return df
+
+    def __repr__(self):
+        return self.compile('sqlite')[0]
+
+
+def sqlite_from_frames(**tables):
+    """
+    In-memory SQLite database holding the given DataFrames as tables, to run queries against locally.
+    """
+    connection = sqlite3.connect(':memory:')
+    for name,df in tables.items():
+        df.to_sql(name,connection,index=False)
+    return connection
@@ -0,0 +1,163 @@
+"""
+Slack notifications and the batched file + Slack logger.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+class SlackBot:
+
+    def __init__(self,token_file = './credentials/slack.json',
+                 slack_channel = '#driveways',
+                 client = None
+                 ):
+        """
+        client can be any object with a chat_postMessage(channel=..., text=...) method, e.g. a local stub.
+        """
+        self.channel_name = slack_channel
+        self.token_file = token_file
+        self._client = client
+        return 
+
+    @property
+    def client(self):
+        # The Slack SDK is only imported (and the token read) when the first message is sent.
+        if(self._client is None):
+            import slack_sdk as slack
+            with open(self.token_file) as json_file:
+                    params = json.load(json_file)
+            self.token = params['SLACK_TOKEN']
+            self._client = slack.WebClient(token=self.token)
+        return self._client
+
+    def send_log(self,text):
+
+        self.client.chat_postMessage(channel=self.channel_name, 
+                                     text=text
+                                     )
+        return 
+
+    def send_with_backoff(self,text,max_retries=5,base_delay=1):
+        """
+        Send a message, waiting and retrying when Slack rate limits (HTTP 429, honouring Retry-After).
+        """
+        delay = base_delay
+        for attempt in range(max_retries):
+            try:
+                self.send_log(text)
+                return True
+            except Exception as e:
+                # Duck-typed like SlackApiError, so injected clients work without slack_sdk installed.
+                response = getattr(e,'response',None)
+                if(getattr(response,'status_code',None) != 429):
+                    raise
+                headers = getattr(response,'headers',None) or {}
+                time.sleep(float(headers.get('Retry-After',delay)))
+                delay *= 2
+        return False
+
+_STOP = object()
+_FLUSH = object()
+
+class MyLogger:
+
+    def __init__(self,
+                folder = 'gardens/',
+                file_name = 'general_log.txt',
+                slack_channel = '#aa-scraper',
+                slack_bot = None,
+                flush_interval = 5,
+                max_batch = 20):
+        """
+        write_log only enqueues the line: a background thread appends it to the (persistently open)
+        log file and posts Slack lines in batches, every flush_interval seconds or max_batch lines.
+        Pending lines are flushed at interpreter exit, or explicitly with flush()/close().
+        """
+        self.file_name = os.path.join(folder,file_name)
+        try:
+            os.makedirs(folder)
+        except:
+            pass
+        self.sb = slack_bot or SlackBot(slack_channel = slack_channel)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.file = open(self.file_name, 'a')
+        self.queue = queue.Queue()
+        self.closed = False
+        self.worker = threading.Thread(target=self._work,daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+        return 
+    
+    def write_log(self,text,Slack =True):
+
+        time_log = datetime.now().strftime('[%Y-%m-%d @ %H:%M] - ')
+        text = time_log + text + '\n'
+        self.queue.put((text,Slack))
+        return 
+
+    def _post(self,pending):
+
+        if(not pending):
+            return
+        try:
+            if(not self.sb.send_with_backoff(''.join(pending))):
+                print(f'Slack is still rate limiting, dropped {len(pending)} log lines.')
+        except Exception as e:
+            print(f'Impossible to send {len(pending)} log lines to Slack.\nERROR: {e}')
+        pending.clear()
+
+    def _work(self):
+
+        pending = []
+        last_post = time.monotonic()
+        while(True):
+            timeout = max(0,self.flush_interval - (time.monotonic() - last_post)) if pending else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if(item is _STOP or (isinstance(item,tuple) and item[0] is _FLUSH)):
+                self.file.flush()
+                self._post(pending)
+                last_post = time.monotonic()
+                if(item is _STOP):
+                    self.file.close()
+                    return
+                item[1].set()
+                continue
+            if(item is not None):
+                text,to_slack = item
+                self.file.write(text)
+                if(to_slack):
+                    pending.append(text)
+            if(self.queue.empty()):
+                self.file.flush()
+            if(pending and (len(pending) >= self.max_batch or time.monotonic() - last_post >= self.flush_interval)):
+                self._post(pending)
+                last_post = time.monotonic()
+
+    def flush(self,timeout=None):
+
+        if(self.closed):
+            return 
+        done = threading.Event()
+        self.queue.put((_FLUSH,done))
+        done.wait(timeout)
+        return 
+
+    def close(self,timeout=30):
+
+        if(self.closed):
+            return 
+        self.closed = True
+        self.queue.put(_STOP)
+        self.worker.join(timeout)
+        # A worker still busy after the timeout (e.g. backing off) closes the file itself once it drains.
+        if(not self.worker.is_alive()):
+            self.file.close()
+        return
@@ -0,0 +1,271 @@
+"""
+GeoParquet store of boundary sets (postcode districts, local authorities, ...).
+
+A boundary shapefile is converted once into one GeoParquet file per level of
+detail (full precision plus simplified copies). Rows are sorted along a Hilbert
+curve and carry their bounding box, so Parquet row-group statistics act as a
+coarse spatial index: a bounding box or region query reads only the row groups
+that can intersect it, and geometries are decoded from WKB in bulk. Maps pick the
+coarsest level whose simplification is still below one rendered pixel.
+
+Example (07.01 Regional MOTs):
+    store = GeometryStore()
+    store.ensure('postcode_districts', 'data/GB_Postcodes/PostalDistrict.shp', key='PostDist',
+                 region=postcode_area)
+    ax = store.choropleth('postcode_districts', df, column='zevperc', figsize=(20, 20), dpi=300, vmax=4)
+"""
+# Packages
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+# Modules
+from .workbooks import file_hash
+
+
+STORE_DIR = os.path.join('data', '.geostore')
+# Simplification tolerances in CRS units (metres for British National Grid).
+DEFAULT_TOLERANCES = (0, 50, 250, 1000)
+BBOX_COLUMNS = ['minx', 'miny', 'maxx', 'maxy']
+# Files of a shapefile read along with the .shp: index, attributes, projection and encoding.
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def postcode_area(df: pd.DataFrame, key='PostDist') -> pd.Series:
+    """
+    Postcode area (the leading letters, e.g. 'AB' for 'AB10') of each postcode district.
+    """
+    return df[key].str.extract(r'^([A-Z]+)', expand=False)
+
+
+def source_hash(path: str) -> str:
+    """
+    Content hash of a boundary file; for a shapefile, of the .shp together with its .shx/.dbf/.prj/.cpg,
+    so an attribute or projection edit is picked up as well as a geometry one.
+    """
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != '.shp':
+        return file_hash(path)
+    parts = []
+    for part in SHAPEFILE_PARTS:
+        for candidate in (stem + part, stem + part.upper()):
+            if os.path.isfile(candidate):
+                parts.append(f'{part}:{file_hash(candidate)}')
+                break
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def _is_wkb(raw: bytes) -> bool:
+    # WKB: byte-order flag (0 or 1) then a geometry type code 1-7, possibly with Z/M flags (ISO +1000s or EWKB high bits).
+    if len(raw) < 5 or raw[0] not in (0, 1):
+        return False
+    code = int.from_bytes(raw[1:5], 'little' if raw[0] == 1 else 'big')
+    return 1 <= (code & 0xFFFF) % 1000 <= 7
+
+
+def _is_mysql_geometry(raw: bytes) -> bool:
+    # MySQL's internal format: 4-byte little-endian SRID, then WKB, which MySQL always writes little-endian.
+    # Checked before plain WKB: SRID 0 (00 00 00 00 01 ...) also reads as big-endian WKB of type 1.
+    if len(raw) < 9 or raw[4] != 1 or not _is_wkb(raw[4:]):
+        return False
+    return not (raw[0] == 1 and _is_wkb(raw))
+
+
+def decode_geometry(values, crs=None, format=None) -> gpd.GeoSeries:
+    """
+    Bulk-decode a column of geometries: WKB bytes, MySQL's internal format (a 4-byte SRID followed by WKB),
+    hex WKB, or WKT strings.
+    format ('mysql', 'wkb' or 'wkt') skips detection; pass format='wkb' for big-endian WKB, whose first bytes
+    can look like a MySQL SRID prefix.
+    """
+    if format not in (None, 'mysql', 'wkb', 'wkt'):
+        raise ValueError(f"Unknown geometry format {format!r}; use 'mysql', 'wkb' or 'wkt'.")
+    values = pd.Series(values)
+    sample = values.dropna()
+    if sample.empty:
+        return gpd.GeoSeries([None] * len(values), index=values.index, crs=crs)
+    first = sample.iloc[0]
+    if format == 'wkt':
+        return gpd.GeoSeries.from_wkt(values, index=values.index, crs=crs)
+    if isinstance(first, (bytes, bytearray, memoryview)):
+        raw = values.map(lambda v: None if v is None or (isinstance(v, float) and np.isnan(v)) else bytes(v))
+        first = bytes(first)
+        if format == 'mysql' or (format is None and _is_mysql_geometry(first)):
+            srid = int.from_bytes(first[:4], 'little')
+            raw = raw.map(lambda v: None if v is None else v[4:])
+            crs = crs or (f'EPSG:{srid}' if srid else None)
+        return gpd.GeoSeries.from_wkb(raw, index=values.index, crs=crs)
+    if format == 'wkb' or str(first).lstrip()[:2] in ('00', '01'):
+        return gpd.GeoSeries.from_wkb(values, index=values.index, crs=crs)
+    return gpd.GeoSeries.from_wkt(values, index=values.index, crs=crs)
+
+
+class GeometryStore:
+    """
+    Folder of boundary sets, each stored as GeoParquet levels of detail plus a manifest.json.
+    """
+
+    def __init__(self, root=STORE_DIR, max_cached=16):
+
+        self.root = root
+        self.max_cached = max_cached
+        self._cache = {}
+        return
+
+    def _dir(self, name):
+        return os.path.join(self.root, name)
+
+    def manifest(self, name) -> dict:
+
+        path = os.path.join(self._dir(name), 'manifest.json')
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'Boundary set {name} not built; call build() or ensure() first.')
+        with open(path) as f:
+            return json.load(f)
+
+    def names(self) -> list:
+
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, d, 'manifest.json')))
+
+    def build(self, name, source, key, tolerances=DEFAULT_TOLERANCES, crs=None, region=None, columns=None, row_group_size=128):
+        """
+        Convert a boundary file (anything gpd.read_file reads, or a GeoDataFrame) into the store.
+        Args:
+            name (str): Name of the boundary set.
+            source: Path of the source file, or a GeoDataFrame.
+            key (str): Identifier column used to join data (e.g. 'PostDist').
+            tolerances: Simplification tolerances, one level of detail each (0 = full precision).
+            crs: Reproject to this CRS first (tolerances are in its units).
+            region: Column name, or function of the frame returning a Series, giving the region of each row.
+            columns: Attribute columns to keep (default all).
+            row_group_size (int): Rows per Parquet row group, i.e. the granularity of bbox pruning.
+        """
+        gdf = source if isinstance(source, gpd.GeoDataFrame) else gpd.read_file(source)
+        if crs is not None:
+            gdf = gdf.to_crs(crs)
+        keep = [key] + [c for c in (columns or gdf.columns) if c not in (key, gdf.geometry.name)]
+        out = gdf[keep].copy()
+        if region is not None:
+            out['region'] = gdf[region] if isinstance(region, str) else region(gdf)
+        out = gpd.GeoDataFrame(out, geometry=gdf.geometry.values, crs=gdf.crs)
+        # Hilbert order keeps neighbouring shapes in the same row groups.
+        out = out.iloc[np.argsort(out.hilbert_distance(), kind='stable')].reset_index(drop=True)
+
+        tmp = self._dir(name) + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        levels = []
+        for i, tolerance in enumerate(sorted(tolerances)):
+            lod = out if not tolerance else out.set_geometry(out.geometry.simplify(tolerance, preserve_topology=True))
+            lod = lod.copy()
+            lod[BBOX_COLUMNS] = lod.geometry.bounds.to_numpy()
+            file = f'lod{i}.parquet'
+            lod.to_parquet(os.path.join(tmp, file), index=False, row_group_size=row_group_size)
+            levels.append({'file': file, 'tolerance': tolerance, 'bytes': os.path.getsize(os.path.join(tmp, file))})
+        manifest = {
+            'name': name,
+            'source': source if isinstance(source, str) else None,
+            'source_hash': source_hash(source) if isinstance(source, str) else None,
+            'key': key,
+            'crs': out.crs.to_string() if out.crs else None,
+            'bounds': [float(v) for v in out.total_bounds],
+            'rows': len(out),
+            'regions': sorted(out['region'].dropna().unique().tolist()) if 'region' in out else None,
+            'levels': levels,
+        }
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(self._dir(name), ignore_errors=True)
+        os.replace(tmp, self._dir(name))
+        self._cache = {k: v for k, v in self._cache.items() if k[0] != name}
+        print(f"Built {name}: {len(out)} shapes, levels {[l['tolerance'] for l in levels]}, "
+              f"{sum(l['bytes'] for l in levels) / 2 ** 20:.1f} MiB")
+        return manifest
+
+    def ensure(self, name, source, key, **kwargs):
+        """
+        Build the set unless it exists and was built from the same source file content (for a shapefile,
+        the same .shp and sidecar files).
+        """
+        try:
+            manifest = self.manifest(name)
+            if not isinstance(source, str) or manifest.get('source_hash') == source_hash(source):
+                return manifest
+        except FileNotFoundError:
+            pass
+        return self.build(name, source, key, **kwargs)
+
+    def lod_for(self, name, figsize=(10, 10), dpi=100, bbox=None) -> int:
+        """
+        Coarsest level whose tolerance is within one pixel of a figsize x dpi rendering of bbox.
+        """
+        manifest = self.manifest(name)
+        minx, miny, maxx, maxy = bbox or manifest['bounds']
+        pixel = max((maxx - minx) / (figsize[0] * dpi), (maxy - miny) / (figsize[1] * dpi))
+        best = 0
+        for i, level in enumerate(manifest['levels']):
+            if level['tolerance'] <= pixel:
+                best = i
+        return best
+
+    def load(self, name, bbox=None, region=None, lod=0, columns=None) -> gpd.GeoDataFrame:
+        """
+        Read the shapes intersecting bbox (minx, miny, maxx, maxy) and/or in region(s) at a level of detail.
+        Only row groups whose bounding boxes can match are read.
+        """
+        regions = None if region is None else ([region] if isinstance(region, str) else list(region))
+        cache_key = (name, lod, tuple(bbox) if bbox is not None else None, tuple(regions) if regions else None,
+                     tuple(columns) if columns else None)
+        if cache_key in self._cache:
+            return self._cache[cache_key].copy()
+
+        manifest = self.manifest(name)
+        level = manifest['levels'][lod]
+        filters = []
+        if bbox is not None:
+            minx, miny, maxx, maxy = bbox
+            filters += [('maxx', '>=', minx), ('minx', '<=', maxx), ('maxy', '>=', miny), ('miny', '<=', maxy)]
+        if regions:
+            filters.append(('region', 'in', regions))
+        read_columns = None if columns is None else list(dict.fromkeys([manifest['key']] + list(columns) + ['geometry']))
+        table = pq.read_table(os.path.join(self._dir(name), level['file']), columns=read_columns, filters=filters or None)
+        df = table.to_pandas()
+        geometry = gpd.GeoSeries.from_wkb(df.pop('geometry'), index=df.index, crs=manifest['crs'])
+        gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=manifest['crs'])
+
+        if len(self._cache) >= self.max_cached:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[cache_key] = gdf
+        return gdf.copy()
+
+    def choropleth(self, name, data, column, on=None, ax=None, figsize=(20, 20), dpi=300, bbox=None, region=None,
+                   lod=None, fill_value=0, **plot_kwargs):
+        """
+        Plot data (indexed by the set's key, or joined on column `on`) on the set's shapes, at the level of
+        detail suited to the figure size and dpi.
+        """
+        import matplotlib.pyplot as plt
+
+        manifest = self.manifest(name)
+        if lod is None:
+            lod = self.lod_for(name, figsize=figsize, dpi=dpi, bbox=bbox)
+        gdf = self.load(name, bbox=bbox, region=region, lod=lod)
+        key = manifest['key']
+        values = data.set_index(on)[column] if on else data[column]
+        gdf[column] = gdf[key].map(values)
+        if fill_value is not None:
+            gdf[column] = gdf[column].fillna(fill_value)
+        if ax is None:
+            _, ax = plt.subplots(figsize=figsize, dpi=dpi)
+        gdf.plot(column=column, ax=ax, **plot_kwargs)
+        if bbox is not None:
+            ax.set_xlim(bbox[0], bbox[2])
+            ax.set_ylim(bbox[1], bbox[3])
+        return ax
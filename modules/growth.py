@@ -0,0 +1,279 @@
+"""
+Batched logistic growth fits with bootstrap intervals.
+
+``08.02a) Logistic Growth Model`` fits L / (1 + exp(-k (x - x0))) one column at a
+time with ``scipy.optimize.curve_fit``. Here every series (fuel x region x vehicle
+type columns, EV uptake curves, ...) is fitted at once by a vectorised
+Levenberg-Marquardt solver with the analytic Jacobian. Series that do not
+converge from the default guess are restarted from their neighbours' fits,
+and residual-bootstrap replicates start from the point estimates. The
+replicates are spread over a process pool.
+
+Example:
+    fit = fit_growth_curves(df[['petrol', 'diesel']], n_boot=1000, n_workers=4,
+                            forecast=np.arange(len(df), len(df) + 66))
+    fit['params']   # series, parameter, estimate, stderr, ci_low, ci_high, ...
+    fit['bands']    # series, x, fitted, low, high
+"""
+# Packages
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules
+
+
+PARAMETERS = ['L', 'k', 'x0']
+
+
+def logistic(x, L, k, x0):
+    """
+    Logistic growth curve, as logistic_growth in 08.02a. Parameters broadcast against x.
+    """
+    return L / (1 + np.exp(np.clip(-k * (x - x0), -500, 500)))
+
+
+def logistic_jacobian(x, L, k, x0) -> np.ndarray:
+    """
+    Partial derivatives of logistic() with respect to (L, k, x0), stacked on a trailing axis.
+    """
+    s = 1 / (1 + np.exp(np.clip(-k * (x - x0), -500, 500)))
+    ds = s * (1 - s)
+    return np.stack(np.broadcast_arrays(s, L * ds * (x - x0), -L * ds * k), axis=-1)
+
+
+def _levenberg_marquardt(x, y, mask, p, max_iter=200, tol=1e-10):
+    """
+    Least squares fit of logistic() to every row of y at once.
+    x (T,), y and mask (S, T), p (S, 3) starting points. Returns params, cost, converged, JtJ.
+    """
+    y = np.where(mask, y, 0)
+    lam = np.full(len(p), 1e-3)
+    active = np.ones(len(p), dtype=bool)
+    converged = np.zeros(len(p), dtype=bool)
+
+    r = np.where(mask, logistic(x, p[:, :1], p[:, 1:2], p[:, 2:]) - y, 0)
+    cost = .5 * (r ** 2).sum(axis=1)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        a = np.flatnonzero(active)
+        J = logistic_jacobian(x, p[a, :1], p[a, 1:2], p[a, 2:]) * mask[a, :, None]
+        A = np.einsum('stp,stq->spq', J, J)
+        g = np.einsum('stp,st->sp', J, r[a])
+        diag = np.maximum(np.einsum('spp->sp', A), 1e-12)
+        lhs = A + lam[a, None, None] * np.einsum('sp,pq->spq', diag, np.eye(3))
+        try:
+            step = np.linalg.solve(lhs, -g[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = np.stack([np.linalg.lstsq(m, -v, rcond=None)[0] for m, v in zip(lhs, g)])
+        p_new = p[a] + step
+        r_new = np.where(mask[a], logistic(x, p_new[:, :1], p_new[:, 1:2], p_new[:, 2:]) - y[a], 0)
+        cost_new = .5 * (r_new ** 2).sum(axis=1)
+        better = np.isfinite(cost_new) & (cost_new <= cost[a])
+
+        done = better & ((cost[a] - cost_new <= tol * np.maximum(cost[a], 1e-300))
+                         | (np.abs(step).max(axis=1) <= tol * (np.abs(p[a]).max(axis=1) + tol)))
+        idx = a[better]
+        p[idx] = p_new[better]
+        r[idx] = r_new[better]
+        cost[idx] = cost_new[better]
+        lam[a] = np.clip(np.where(better, lam[a] / 3, lam[a] * 4), 1e-12, 1e12)
+        converged[a[done]] = True
+        # Also stop series whose damping has blown up (no descent direction left).
+        active[a[done | (lam[a] >= 1e12)]] = False
+
+    J = logistic_jacobian(x, p[:, :1], p[:, 1:2], p[:, 2:]) * mask[..., None]
+    return p, cost, converged, np.einsum('stp,stq->spq', J, J)
+
+
+def _initial_guess(x, y, mask):
+    # The notebook's guess in scaled units: L at the series maximum, unit slope, centred in time.
+    peak = np.where(mask, y, -np.inf).max(axis=1)
+    peak = np.where(np.isfinite(peak), peak, 1.)
+    centre = np.array([np.median(x[m]) if m.any() else 0. for m in mask])
+    return np.column_stack([peak, np.ones(len(y)), centre])
+
+
+def _scale(x, y):
+    # Fit in standardised time and per-series peak-scaled values for conditioning.
+    x = np.asarray(x, dtype=float)
+    mu, sd = x.mean(), x.std() or 1.
+    mask = np.isfinite(y)
+    peak = np.abs(np.where(mask, y, 0)).max(axis=1)
+    peak = np.where(peak > 0, peak, 1.)
+    return (x - mu) / sd, np.where(mask, y, 0) / peak[:, None], mask, (mu, sd, peak)
+
+
+def _unscale(p, scale):
+    mu, sd, peak = scale
+    return np.stack([p[..., 0] * peak, p[..., 1] / sd, p[..., 2] * sd + mu], axis=-1)
+
+
+def fit_logistic(y, x=None, p0=None, warm_start=True, neighbours=2, max_iter=200, tol=1e-10) -> dict:
+    """
+    Fit logistic() to every row of y.
+    Args:
+        y: (S, T) values; NaN marks missing observations.
+        x: (T,) times (default 0..T-1, as the notebook).
+        p0: Optional (S, 3) or (3,) starting (L, k, x0) in original units.
+        warm_start (bool): Refit series that did not converge (or fit much worse than the rest) starting
+            from the fits of their neighbours in row order, keeping the better result.
+        neighbours (int): How many rows on each side to take starting points from.
+    Returns:
+        dict: params (S, 3), stderr (S, 3), covariance (S, 3, 3), rmse (S,), n_obs (S,), converged (S,),
+        and the scaled fit state used by bootstrap_logistic.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    x = np.arange(y.shape[1], dtype=float) if x is None else np.asarray(x, dtype=float)
+    xs, ys, mask, scale = _scale(x, y)
+    mu, sd, peak = scale
+    if p0 is None:
+        start = _initial_guess(xs, ys, mask)
+    else:
+        p0 = np.broadcast_to(np.asarray(p0, dtype=float), (len(y), 3))
+        start = np.column_stack([p0[:, 0] / peak, p0[:, 1] * sd, (p0[:, 2] - mu) / sd])
+    p, cost, converged, A = _levenberg_marquardt(xs, ys, mask, start.copy(), max_iter=max_iter, tol=tol)
+
+    n_obs = mask.sum(axis=1)
+    if warm_start and len(y) > 1:
+        rmse = np.sqrt(2 * cost / np.maximum(n_obs, 1))
+        bad = ~converged | (rmse > 3 * np.median(rmse[converged]) if converged.any() else True)
+        good = np.flatnonzero(converged & ~bad)
+        rows = np.flatnonzero(bad)
+        if len(rows) and len(good):
+            # Nearest well-fitted rows on either side of each bad row.
+            order = np.abs(rows[:, None] - good[None, :]).argsort(axis=1)[:, :2 * neighbours]
+            candidates = good[order]
+            s, c = np.repeat(rows, candidates.shape[1]), candidates.ravel()
+            p2, cost2, conv2, A2 = _levenberg_marquardt(xs, ys[s], mask[s], p[c].copy(), max_iter=max_iter, tol=tol)
+            cost2 = np.where(conv2, cost2, np.inf).reshape(len(rows), -1)
+            best = cost2.argmin(axis=1)
+            pick = np.arange(len(rows)) * candidates.shape[1] + best
+            improve = cost2[np.arange(len(rows)), best] < np.where(converged[rows], cost[rows], np.inf)
+            target = rows[improve]
+            p[target], cost[target], converged[target], A[target] = p2[pick[improve]], cost2[improve, best[improve]], True, A2[pick[improve]]
+
+    dof = np.maximum(n_obs - 3, 1)
+    sigma2 = 2 * cost / dof
+    covariance = np.full((len(y), 3, 3), np.nan)
+    ok = np.abs(np.linalg.det(A)) > 1e-300
+    covariance[ok] = np.linalg.inv(A[ok]) * sigma2[ok, None, None]
+    D = np.stack([peak, np.full(len(y), 1 / sd), np.full(len(y), sd)], axis=1)
+    covariance = covariance * D[:, :, None] * D[:, None, :]
+    return {
+        'params': _unscale(p, scale),
+        'stderr': np.sqrt(np.einsum('spp->sp', covariance)),
+        'covariance': covariance,
+        'rmse': np.sqrt(2 * cost / np.maximum(n_obs, 1)) * peak,
+        'n_obs': n_obs,
+        'converged': converged,
+        '_scaled': {'x': xs, 'y': ys, 'mask': mask, 'params': p, 'scale': scale},
+    }
+
+
+def _bootstrap_chunk(args):
+    xs, ys, mask, p, n_boot, seed, max_iter, tol = args
+    rng = np.random.default_rng(seed)
+    fitted = logistic(xs, p[:, :1], p[:, 1:2], p[:, 2:])
+    residuals = np.where(mask, ys - fitted, 0)
+    # Pack each series' observed residuals first so resampling only draws observed ones.
+    order = np.argsort(~mask, axis=1, kind='stable')
+    packed = np.take_along_axis(residuals, order, axis=1)
+    n_obs = mask.sum(axis=1)
+    S, T = ys.shape
+    draws = (rng.random((n_boot, S, T)) * n_obs[None, :, None]).astype(np.int64)
+    y_star = fitted[None] + np.take_along_axis(np.broadcast_to(packed, (n_boot, S, T)), draws, axis=2)
+    y_star = y_star.reshape(n_boot * S, T)
+    m = np.broadcast_to(mask, (n_boot, S, T)).reshape(n_boot * S, T)
+    start = np.broadcast_to(p, (n_boot, S, 3)).reshape(n_boot * S, 3).copy()
+    params, _, converged, _ = _levenberg_marquardt(xs, y_star, m, start, max_iter=max_iter, tol=tol)
+    params[~converged] = np.nan
+    return params.reshape(n_boot, S, 3)
+
+
+def bootstrap_logistic(fit: dict, n_boot=1000, seed=0, n_workers=None, chunk_size=100, max_iter=100, tol=1e-8) -> np.ndarray:
+    """
+    Residual bootstrap of a fit_logistic result: every replicate refits all series, starting from the
+    point estimates. Chunks of chunk_size replicates run in a process pool when n_workers is set.
+    Returns:
+        np.ndarray: (S, n_boot, 3) parameters in original units; NaN for replicates that did not converge.
+    """
+    sc = fit['_scaled']
+    sizes = [min(chunk_size, n_boot - i) for i in range(0, n_boot, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(sc['x'], sc['y'], sc['mask'], sc['params'], size, s, max_iter, tol) for size, s in zip(sizes, seeds)]
+    if n_workers and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_bootstrap_chunk, chunks))
+    else:
+        results = [_bootstrap_chunk(chunk) for chunk in chunks]
+    params = np.concatenate(results, axis=0)  # (B, S, 3), scaled
+    return _unscale(params, sc['scale']).transpose(1, 0, 2)
+
+
+def _series_frame(columns) -> pd.DataFrame:
+    # One row per series with a column per level of the series labels.
+    if isinstance(columns, pd.MultiIndex):
+        names = [name or f'level_{i}' for i, name in enumerate(columns.names)]
+        return pd.DataFrame(list(columns), columns=names)
+    return pd.DataFrame({columns.name or 'series': list(columns)})
+
+
+def fit_growth_curves(df: pd.DataFrame, x=None, n_boot=0, level=.95, forecast=None, seed=0, n_workers=None, **kwargs) -> dict:
+    """
+    Fit a logistic curve to every column of df (index = time) and return tidy tables.
+    Args:
+        df (pd.DataFrame): One series per column; MultiIndex columns (e.g. fuel, region, vehicle type)
+            become identifier columns in the output.
+        x: Times of the rows (default 0..len(df)-1, as the notebook).
+        n_boot (int): Bootstrap replicates for confidence intervals (0 for covariance-based intervals only).
+        level (float): Confidence level.
+        forecast: Extra times to predict at; the bands cover x and forecast.
+        **kwargs: Passed to fit_logistic.
+    Returns:
+        dict: 'params' (one row per series and parameter: estimate, stderr, ci_low, ci_high, converged,
+        rmse, n_obs), 'bands' (one row per series and time: fitted, low, high), and 'bootstrap' (the raw
+        (S, n_boot, 3) replicates, or None).
+    """
+    y = df.to_numpy(dtype=float).T
+    x = np.arange(len(df), dtype=float) if x is None else np.asarray(x, dtype=float)
+    fit = fit_logistic(y, x=x, **kwargs)
+    S = y.shape[0]
+    alpha = (1 - level) / 2
+
+    boot = bootstrap_logistic(fit, n_boot=n_boot, seed=seed, n_workers=n_workers) if n_boot else None
+    if boot is not None:
+        ci = np.nanquantile(boot, [alpha, 1 - alpha], axis=1)  # (2, S, 3)
+    else:
+        # Normal approximation from the covariance.
+        from statistics import NormalDist
+        z = NormalDist().inv_cdf(1 - alpha)
+        ci = np.stack([fit['params'] - z * fit['stderr'], fit['params'] + z * fit['stderr']])
+
+    series = _series_frame(df.columns)
+    params = pd.concat([series] * 3, ignore_index=True)
+    params['parameter'] = np.repeat(PARAMETERS, S)
+    params['estimate'] = fit['params'].T.ravel()
+    params['stderr'] = fit['stderr'].T.ravel()
+    params['ci_low'] = ci[0].T.ravel()
+    params['ci_high'] = ci[1].T.ravel()
+    params['converged'] = np.tile(fit['converged'], 3)
+    params['rmse'] = np.tile(fit['rmse'], 3)
+    params['n_obs'] = np.tile(fit['n_obs'], 3)
+    params = params.sort_values(list(series.columns) + ['parameter'], kind='stable').reset_index(drop=True)
+
+    t = x if forecast is None else np.concatenate([x, np.asarray(forecast, dtype=float)])
+    p = fit['params']
+    fitted = logistic(t, p[:, :1], p[:, 1:2], p[:, 2:])
+    if boot is not None:
+        curves = logistic(t, boot[..., :1], boot[..., 1:2], boot[..., 2:])  # (S, B, T)
+        low, high = np.nanquantile(curves, [alpha, 1 - alpha], axis=1)
+    else:
+        low = high = np.full_like(fitted, np.nan)
+    bands = series.loc[np.repeat(np.arange(S), len(t))].reset_index(drop=True)
+    bands['x'] = np.tile(t, S)
+    bands['fitted'] = fitted.ravel()
+    bands['low'] = low.ravel()
+    bands['high'] = high.ravel()
+    return {'params': params, 'bands': bands, 'bootstrap': boot}
@@ -32,6 +32,36 @@ def ft_cleaner_dft(string: str) -> str:
     return string
 
 
+def ft_cleaner_dft_series(series: pd.Series) -> pd.Series:
+    """
+    Apply ft_cleaner_dft to a column, once per unique fuel type rather than once per row.
+    Args:
+        series (pd.Series): Column of DfT fuel type labels.
+    Returns:
+        pd.Series: Column with the cleaned fuel type labels.
+    """
+    mapping = {fuel_type: ft_cleaner_dft(fuel_type) for fuel_type in series.dropna().unique()}
+    return series.map(mapping)
+
+
+def to_datetime_unique(values: pd.Series, **kwargs) -> pd.Series:
+    """
+    Parse a column of dates once per unique value.
+    Args:
+        values (pd.Series): Column of dates to parse.
+        **kwargs: Passed to pd.to_datetime, e.g. format.
+    Returns:
+        pd.Series: Column of timestamps, identical to parsing each element on its own.
+    """
+    uniques = pd.unique(values)
+    try:
+        parsed = pd.to_datetime(pd.Series(uniques), **kwargs)
+    except (ValueError, TypeError):
+        # Mixed formats/types: fall back to parsing each unique value on its own.
+        parsed = pd.Series([pd.to_datetime(value, **kwargs) for value in uniques])
+    return values.map(pd.Series(parsed.values, index=uniques))
+
+
 def clean_traffic_data(request) -> pd.DataFrame:
     """
     Convert the Traffic Data request into a DataFrame and clean.
@@ -41,7 +71,7 @@ def clean_traffic_data(request) -> pd.DataFrame:
         pd.DataFrame: A DataFrame of the data collected from the request.
     """
     df = pd.DataFrame(request.json()["data"])
-    df["year"] = [pd.to_datetime(year, format="%Y") for year in df["year"]]
+    df["year"] = to_datetime_unique(df["year"], format="%Y")
     df.set_index("year", inplace=True)
     df = df.resample("Y").last()
     return df
@@ -60,16 +90,16 @@ def clean_new_reg_data(df_nrg: pd.DataFrame) -> pd.DataFrame:
         (df_nrg["Date Interval"] == "Monthly") &
         (df_nrg["Units"] == "Thousands") &
         (df_nrg["BodyType"] == "Cars")
-    ]
+    ].copy()
     
-    df["Date"] = [pd.to_datetime(date) for date in df["Date"]]
+    df["Date"] = to_datetime_unique(df["Date"])
     
     df = df.drop(columns=["Total", "Plug-in", "Zero Emission"])
     df = df.melt(id_vars=["Date", "Geography", "Date Interval", "Units", "BodyType"], value_vars=df.columns[5:]).rename(columns={
         "variable": "fuelType"
     })
     
-    df["fuelType"] = df["fuelType"].apply(ft_cleaner_dft)
+    df["fuelType"] = ft_cleaner_dft_series(df["fuelType"])
     df = df.groupby(["Date", "fuelType"]).sum().reset_index(["fuelType"]).pivot(columns="fuelType").resample("Y").sum()
     df.columns = [column[1] for column in df.columns]
     df = 1000 * df
@@ -87,14 +117,14 @@ def get_transport_from_emissions_df(df_em: pd.DataFrame) -> pd.DataFrame:
     df_em["NCFormat"] = df_em["NCFormat"].fillna(method="ffill")
     df_em = df_em.melt(id_vars=["NCFormat", "IPCC_name"])
     df_em = df_em[df_em["variable"] != "BaseYear"]
-    df_em["variable"] = [pd.to_datetime(var) for var in df_em["variable"]]
+    df_em["variable"] = to_datetime_unique(df_em["variable"])
     df_emt = df_em[df_em["NCFormat"] == "Transport"]
     df_emt = df_emt.pivot(index="variable", columns="IPCC_name", values="value")
     return df_emt
 
 
 def prep_mm(df: pd.DataFrame) -> pd.DataFrame:
-    df['year'] = df.year.apply(lambda x: pd.to_datetime(x, format='%Y'))
+    df['year'] = to_datetime_unique(df.year, format='%Y')
     df = df[(df['annual_mileage'] > 0) & (df['year'] > '2010-01-01')]
     df = df.pivot(index='year', columns='fuelType', values='annual_mileage')
     df = df.resample('Y').last()
@@ -115,13 +145,7 @@ def prep_df_pc(df_pc: pd.DataFrame, df_mm: pd.DataFrame) -> pd.DataFrame:
     df_pc.index = pd.to_datetime(df_pc.index)
     cars = df_pc[df_pc.BodyType == 'Cars'].pivot(columns='Fuel', values='value').resample('Y').last()
     
-    df = cars.merge(df_mm, how='left', left_index=True, right_index=True)
-    
-    df['diesel_vmt'] = df.apply(lambda row: row['Diesel'] * row['Diesel_miles'], axis=1)
-    df['petrol_vmt'] = df.apply(lambda row: row['Petrol'] * row['Petrol_miles'], axis=1)
-    df['electric_vmt'] = df.apply(lambda row: row['Pure Electric'] * row['Electric_miles'], axis=1)
-    
-    return df
+    return add_vmt(cars, df_mm)
 
 
 
@@ -151,15 +175,59 @@ def prep_df_fc(df_fc: pd.DataFrame, df_pc: pd.DataFrame, df_mm: pd.DataFrame) ->
         right_index=True
     )
     
-    df_fc['car_diesel_consumption_gallons'] = df_fc.car_diesel_consumption.apply(lambda x: ((1000*x)/.98) * 219.969)
+    df_fc = add_fuel_economy(df_fc)
+    df_fc = add_fuel_emissions(df_fc)
+    
+    return df_fc
+
+
+def add_vmt(cars: pd.DataFrame, df_mm: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the annual mileage to the car parc and compute the vehicle miles travelled per fuel.
+    Args:
+        cars (pd.DataFrame): Yearly car parc with Diesel, Petrol and Pure Electric columns.
+        df_mm (pd.DataFrame): Annual mileage as prepared by prep_mm.
+    Returns:
+        pd.DataFrame: The joined frame with diesel_vmt, petrol_vmt and electric_vmt.
+    """
+    df = cars.merge(df_mm, how='left', left_index=True, right_index=True)
+    
+    df['diesel_vmt'] = df['Diesel'] * df['Diesel_miles']
+    df['petrol_vmt'] = df['Petrol'] * df['Petrol_miles']
+    df['electric_vmt'] = df['Pure Electric'] * df['Electric_miles']
+    
+    return df
+
+
+def add_fuel_economy(df: pd.DataFrame, toe_per_tonne=(.98, .86)) -> pd.DataFrame:
+    """
+    Convert the car fuel consumption (ktoe) to gallons and compute the fuel economy (miles per gallon).
+    Args:
+        df (pd.DataFrame): Frame with the vmt columns and car_diesel_consumption, car_petrol_consumption.
+        toe_per_tonne: Tonnes of oil equivalent per tonne of diesel and of petrol.
+    Returns:
+        pd.DataFrame: df with the gallons and economy columns added.
+    """
+    df['car_diesel_consumption_gallons'] = ((1000*df.car_diesel_consumption)/toe_per_tonne[0]) * 219.969
     # NB that petrol has a different conversion factor. Tonnes of oil equivalent is essentially the energy content of the fuel, and diesel is more energy-dense. 
-    df_fc['car_petrol_consumption_gallons'] = df_fc.car_petrol_consumption.apply(lambda x: ((1000*x)/.86) * 219.969)
+    df['car_petrol_consumption_gallons'] = ((1000*df.car_petrol_consumption)/toe_per_tonne[1]) * 219.969
         
-    df_fc['petrol_economy'] = df_fc.apply(lambda row: row['petrol_vmt'] / row['car_petrol_consumption_gallons'] , axis=1)
-    df_fc['diesel_economy'] = df_fc.apply(lambda row: row['diesel_vmt'] / row['car_diesel_consumption_gallons'], axis=1)
+    df['petrol_economy'] = df['petrol_vmt'] / df['car_petrol_consumption_gallons']
+    df['diesel_economy'] = df['diesel_vmt'] / df['car_diesel_consumption_gallons']
     
-    # From 2022 factors.
-    df_fc['diesel_emissions'] = df_fc.car_diesel_consumption.apply(lambda x: ((1000*x)*11629.9998357937)*.24115)
-    df_fc['petrol_emissions'] = df_fc.car_petrol_consumption.apply(lambda x: ((1000*x)*11629.9998357937)*.22719)
+    return df
+
+
+def add_fuel_emissions(df: pd.DataFrame, emission_factors=(.24115, .22719)) -> pd.DataFrame:
+    """
+    Compute the car emissions (kgCO2e) from the fuel consumption (ktoe).
+    Args:
+        df (pd.DataFrame): Frame with car_diesel_consumption and car_petrol_consumption.
+        emission_factors: kgCO2e per kWh of diesel and of petrol (default the 2022 factors).
+    Returns:
+        pd.DataFrame: df with diesel_emissions and petrol_emissions added.
+    """
+    df['diesel_emissions'] = ((1000*df.car_diesel_consumption)*11629.9998357937)*emission_factors[0]
+    df['petrol_emissions'] = ((1000*df.car_petrol_consumption)*11629.9998357937)*emission_factors[1]
     
-    return df_fc
+    return df
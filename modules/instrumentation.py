@@ -0,0 +1,385 @@
+"""
+Timing and volume metrics for connector I/O.
+
+Every instrumented connector call (query, load, transfer) produces one event
+with its backend, operation, wall time, rows and bytes moved, any error and,
+for BigQuery, the bytes processed/billed and whether BigQuery's result cache
+was hit. Events go to the module-level ``metrics`` collector, which keeps
+running totals, the latest events and calls any registered hooks.
+
+Example (in a notebook):
+    from modules.instrumentation import metrics, span, JsonlExporter
+
+    metrics.add_hook(JsonlExporter('logs/io_metrics.jsonl'))
+    with span('tracker: monthly aggregates'):
+        df = bq.from_bq_to_dataframe(query)
+    metrics.report()
+    metrics.write_prometheus('logs/io_metrics.prom')
+"""
+# Packages
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import warnings
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Modules
+
+
+# Numeric event fields summed into the running totals.
+TOTALS = ['seconds', 'rows', 'bytes', 'bytes_processed', 'bytes_billed']
+
+
+class Instrumentation:
+    """
+    Collector of connector call and span events.
+
+    Args:
+        max_events (int): Number of most recent events kept in memory for summary().
+        enabled (bool): When False, calls are not timed or recorded at all.
+    """
+
+    def __init__(self, max_events=100000, enabled=True):
+
+        self.enabled = enabled
+        self.hooks = []
+        self.events = deque(maxlen=max_events)
+        self.totals = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        return
+
+    def add_hook(self, hook):
+        """
+        Register a callable receiving every event dict (e.g. a JsonlExporter).
+        """
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+
+        self.hooks.remove(hook)
+        return
+
+    def reset(self):
+
+        with self.lock:
+            self.events.clear()
+            self.totals = {}
+        return
+
+    def _stack(self, name):
+        if not hasattr(self._local, name):
+            setattr(self._local, name, [])
+        return getattr(self._local, name)
+
+    def current_span(self):
+        """
+        Path of the open spans in this thread, e.g. 'tracker/monthly aggregates', or None.
+        """
+        spans = self._stack('spans')
+        return '/'.join(spans) if spans else None
+
+    def emit(self, event):
+        """
+        Record an event: update the running totals, keep it, and pass it to the hooks.
+        """
+        key = (event['kind'], event.get('backend'), event.get('operation'), event.get('span'))
+        with self.lock:
+            totals = self.totals.setdefault(key, {'calls': 0, 'errors': 0, 'cache_hits': 0, **{f: 0 for f in TOTALS}})
+            totals['calls'] += 1
+            totals['errors'] += event.get('error') is not None
+            totals['cache_hits'] += bool(event.get('cache_hit') or event.get('local_cache_hit'))
+            for field in TOTALS:
+                totals[field] += event.get(field) or 0
+            self.events.append(event)
+        for hook in list(self.hooks):
+            try:
+                hook(event)
+            except Exception as e:
+                # A broken exporter must not break the query it is reporting on.
+                warnings.warn(f'Instrumentation hook {hook!r} failed: {e}')
+        return event
+
+    @contextmanager
+    def span(self, name, **tags):
+        """
+        Profile a block of notebook code; connector calls inside it are tagged with the span path.
+        """
+        if not self.enabled:
+            yield None
+            return
+        spans = self._stack('spans')
+        spans.append(name)
+        event = {'kind': 'span', 'span': '/'.join(spans), 'started': datetime.now().isoformat(timespec='milliseconds'),
+                 'error': None, **tags}
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException as e:
+            event['error'] = type(e).__name__
+            raise
+        finally:
+            event['seconds'] = time.perf_counter() - start
+            spans.pop()
+            self.emit(event)
+
+    @contextmanager
+    def call(self, backend, operation, **tags):
+        """
+        Time one connector call. Fields set with annotate() inside the block are added to its event.
+        """
+        if not self.enabled:
+            yield {}
+            return
+        event = self.new_call(backend, operation, **tags)
+        start = time.perf_counter()
+        try:
+            with self.attached(event):
+                yield event
+        except BaseException as e:
+            event['error'] = type(e).__name__
+            raise
+        finally:
+            event['seconds'] = time.perf_counter() - start
+            self.emit(event)
+
+    def new_call(self, backend, operation, **tags) -> dict:
+        """
+        A call event, not yet timed or emitted (see call(), and instrumented() for generators).
+        """
+        return {'kind': 'call', 'backend': backend, 'operation': operation, 'span': self.current_span(),
+                'started': datetime.now().isoformat(timespec='milliseconds'), 'rows': None, 'bytes': None,
+                'error': None, **tags}
+
+    @contextmanager
+    def attached(self, event):
+        """
+        Make event the target of annotate() in this thread for the duration of the block.
+        """
+        calls = self._stack('calls')
+        calls.append(event)
+        try:
+            yield event
+        finally:
+            # By identity: another open call may hold an equal dict.
+            del calls[next(i for i, e in enumerate(calls) if e is event)]
+
+    def annotate(self, **fields):
+        """
+        Add fields (rows, bytes, bytes_billed, cache_hit, job_id, ...) to the innermost open call
+        in this thread. Does nothing outside an instrumented call.
+        """
+        calls = self._stack('calls')
+        if calls:
+            calls[-1].update(fields)
+        return
+
+    def summary(self, by=('backend', 'operation')) -> pd.DataFrame:
+        """
+        Per-group call counts, errors, latency (total, mean, p50, p95, max), rows, bytes and
+        BigQuery bytes billed / cache hits, from the events kept in memory.
+        by can include 'span' to see which notebook step the cost comes from.
+        """
+        with self.lock:
+            calls = [e for e in self.events if e['kind'] == 'call']
+        by = list(by)
+        if not calls:
+            return pd.DataFrame(columns=by + ['calls'])
+        df = pd.DataFrame(calls)
+        for col in TOTALS + ['cache_hit', 'local_cache_hit']:
+            if col not in df.columns:
+                df[col] = np.nan
+        df['failed'] = df['error'].notna()
+        df['hit'] = df['cache_hit'].eq(True) | df['local_cache_hit'].eq(True)
+        out = df.groupby([df[b].fillna('') for b in by]).agg(
+            calls=('seconds', 'size'),
+            errors=('failed', 'sum'),
+            total_seconds=('seconds', 'sum'),
+            mean_seconds=('seconds', 'mean'),
+            p50_seconds=('seconds', 'median'),
+            p95_seconds=('seconds', lambda s: s.quantile(.95)),
+            max_seconds=('seconds', 'max'),
+            rows=('rows', 'sum'),
+            bytes=('bytes', 'sum'),
+            bytes_processed=('bytes_processed', 'sum'),
+            bytes_billed=('bytes_billed', 'sum'),
+            cache_hits=('hit', 'sum'),
+        )
+        return out.sort_values('total_seconds', ascending=False).reset_index()
+
+    def report(self, by=('backend', 'operation'), top=20):
+        """
+        Print the summary, slowest groups first, with spans timed separately.
+        """
+        summary = self.summary(by=by)
+        with self.lock:
+            spans = [e for e in self.events if e['kind'] == 'span']
+        if summary.empty and not spans:
+            print('No instrumented calls recorded.')
+            return summary
+        if not summary.empty:
+            print(f"{int(summary.calls.sum())} calls, {summary.total_seconds.sum():.1f}s, "
+                  f"{summary.rows.sum():,.0f} rows, {summary.bytes.sum() / 2 ** 20:,.1f} MiB, "
+                  f"{summary.bytes_billed.sum() / 2 ** 30:,.2f} GiB billed by BigQuery")
+            print(summary.head(top).to_string(index=False))
+        if spans:
+            df = pd.DataFrame(spans).groupby('span')['seconds'].agg(['size', 'sum', 'max'])
+            print('\nSpans:')
+            print(df.rename(columns={'size': 'runs', 'sum': 'total_seconds', 'max': 'max_seconds'})
+                    .sort_values('total_seconds', ascending=False).head(top).to_string())
+        return summary
+
+    def to_prometheus(self, prefix='zev') -> str:
+        """
+        The running totals in the Prometheus text exposition format.
+        """
+        with self.lock:
+            totals = dict(self.totals)
+        metrics = [
+            ('calls', 'Number of instrumented calls.', 'calls', ('call', 'span')),
+            ('errors', 'Calls that raised.', 'errors', ('call', 'span')),
+            ('seconds', 'Wall time spent in calls.', 'seconds', ('call', 'span')),
+            ('rows', 'Rows returned or written.', 'rows', ('call',)),
+            ('bytes', 'Bytes returned, written or transferred.', 'bytes', ('call',)),
+            ('bigquery_bytes_processed', 'BigQuery bytes processed.', 'bytes_processed', ('call',)),
+            ('bigquery_bytes_billed', 'BigQuery bytes billed.', 'bytes_billed', ('call',)),
+            ('cache_hits', 'Calls answered from a cache.', 'cache_hits', ('call',)),
+        ]
+        lines = []
+        for name, help_, field, kinds in metrics:
+            for kind in kinds:
+                full = f'{prefix}_{kind}_{name}_total'
+                lines += [f'# HELP {full} {help_}', f'# TYPE {full} counter']
+                for (k, backend, operation, span), values in totals.items():
+                    if k != kind:
+                        continue
+                    labels = {'backend': backend, 'operation': operation, 'span': span}
+                    label = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items() if value is not None)
+                    lines.append(f'{full}{{{label}}} {values[field]:g}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='zev'):
+        """
+        Write to_prometheus() atomically, e.g. for a node_exporter textfile collector.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus(prefix=prefix))
+        os.replace(tmp, path)
+        return path
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class JsonlExporter:
+    """
+    Hook appending every event as one JSON line to a file.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+        return
+
+
+def read_jsonl(path) -> pd.DataFrame:
+    """
+    Load events written by a JsonlExporter, e.g. to compare runs.
+    """
+    return pd.read_json(path, lines=True)
+
+
+metrics = Instrumentation()
+span = metrics.span
+annotate = metrics.annotate
+
+
+def _volume(result) -> dict:
+    # Rows and in-memory bytes of a returned DataFrame or list of rows.
+    if isinstance(result, pd.DataFrame):
+        return {'rows': len(result), 'bytes': int(result.memory_usage(index=True).sum())}
+    if isinstance(result, list):
+        return {'rows': len(result)}
+    return {}
+
+
+def instrumented(operation=None, collector=None):
+    """
+    Decorator timing a connector method as backend=<class name>, operation=<method name>.
+    Rows and bytes are taken from a returned DataFrame (summed over the batches for generator
+    methods) unless the method annotates them itself.
+    """
+    def decorator(func):
+        op = operation or func.__name__
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(self, *args, **kwargs):
+                m = collector or metrics
+                if not m.enabled:
+                    yield from func(self, *args, **kwargs)
+                    return
+                # Only the time spent producing each batch is counted, and the event is only the annotate()
+                # target while the generator runs, not while the consumer handles a batch.
+                event = m.new_call(type(self).__name__, op)
+                batches = func(self, *args, **kwargs)
+                seconds = 0.
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            with m.attached(event):
+                                item = next(batches)
+                        except StopIteration:
+                            break
+                        finally:
+                            seconds += time.perf_counter() - start
+                        volume = _volume(item) if isinstance(item, pd.DataFrame) else {'rows': getattr(item, 'num_rows', 0), 'bytes': getattr(item, 'nbytes', 0)}
+                        for key, value in volume.items():
+                            event[key] = (event.get(key) or 0) + value
+                        yield item
+                except GeneratorExit:
+                    # The consumer stopped early.
+                    event['abandoned'] = True
+                    raise
+                except BaseException as e:
+                    event['error'] = type(e).__name__
+                    raise
+                finally:
+                    batches.close()
+                    event['seconds'] = seconds
+                    m.emit(event)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            m = collector or metrics
+            with m.call(type(self).__name__, op) as event:
+                result = func(self, *args, **kwargs)
+                if m.enabled:
+                    for key, value in _volume(result).items():
+                        if event.get(key) is None:
+                            event[key] = value
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,393 @@
+"""
+Streaming market statistics for second-hand listings.
+
+Replaces the per-cut BigQuery queries and the row loops of
+``08.03) Seconds Hand Prices``. Listing batches are folded into per-(period,
+fuel type) counts, min/max/mean and a mergeable quantile sketch, so medians and
+other quantiles come from local state at daily granularity; daily results can
+be rolled up to weeks or months, and partial results built by parallel workers
+merged, without touching the raw listings again.
+
+Example:
+    stats = MarketStats(freq='D')
+    for batch in bq.iter_bq_batches(FIRST_SALES_QUERY):
+        stats.update(batch)
+    monthly = stats.resample('M')
+    df = monthly.shares()           # registrations, prices and proportion per month and fuel type
+    monthly.trends('median_price')  # linear price trend per fuel type
+"""
+# Packages
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules
+
+
+# The fuel type CASE of the 08.03 queries.
+OTHER_FUELS = ['Hydrogen', 'nan', 'Bi Fuel', 'None']
+HYBRID_FUELS = ['Petrol Hybrid', 'Petrol Plug-in Hybrid', 'Diesel Plug-in Hybrid', 'Diesel Hybrid']
+
+# Listings reduced to the first sale of each id, as the notebook's earliest_dos CTE does.
+FIRST_SALES_QUERY = """
+WITH earliest_dos AS (
+    SELECT id, MIN(dos) AS earliest_dos
+    FROM `rugged-baton-283921.second_hand.autotrader`
+    GROUP BY id
+)
+SELECT t.id, t.dos, t.fuelType, t.price, t.mileage
+FROM `rugged-baton-283921.second_hand.autotrader` AS t
+JOIN earliest_dos AS ed ON t.id = ed.id AND t.dos = ed.earliest_dos
+"""
+
+
+def clean_fuel_type(series: pd.Series) -> pd.Series:
+    """
+    Group listing fuel types into Petrol, Diesel, Electric, Hybrid and Other.
+    """
+    ft = series.astype(str)
+    return pd.Series(np.where(ft.isin(OTHER_FUELS) | series.isna(), 'Other',
+                              np.where(ft.isin(HYBRID_FUELS), 'Hybrid', ft)), index=series.index)
+
+
+def first_sales(df: pd.DataFrame, id_col='id', date_col='dos') -> pd.DataFrame:
+    """
+    Keep the rows on the earliest date of each listing id (for data not already reduced by the query).
+    """
+    return df[df[date_col] == df.groupby(id_col)[date_col].transform('min')]
+
+
+def _factorize(values) -> tuple:
+    # pd.factorize, with missing values kept as one more unique value rather than code -1.
+    codes, uniques = pd.factorize(values)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(uniques), codes)
+        uniques = uniques.insert(len(uniques), np.nan)
+    return codes, uniques
+
+
+def _grow(array: np.ndarray, size: int, fill) -> np.ndarray:
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.full(size - len(array), fill, dtype=array.dtype)])
+
+
+class GroupedTDigest:
+    """
+    One t-digest per integer group code, stored as flat arrays sorted by (group, mean).
+
+    Compression is vectorised across groups: points are sorted, each one's quantile within its group
+    is mapped through the arcsine scale function k(q) = delta * (asin(2q - 1) / pi + 1/2), and points
+    falling in the same integer k bucket are merged. Each group therefore keeps at most about delta
+    centroids, small near the tails, and two digests merge by concatenating and compressing.
+    """
+
+    def __init__(self, delta=200):
+
+        self.delta = delta
+        self.groups = np.empty(0, dtype=np.int64)
+        self.means = np.empty(0, dtype=float)
+        self.weights = np.empty(0, dtype=float)
+        self.min = np.empty(0, dtype=float)
+        self.max = np.empty(0, dtype=float)
+        return
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.min)
+
+    def add(self, groups, values, weights=None, mins=None, maxs=None):
+        """
+        Add points (or centroids with weights) for the given group codes.
+        mins/maxs pass on exact extremes when adding another digest's centroids.
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+        if len(values) == 0:
+            return self
+        n = max(self.n_groups, int(groups.max()) + 1, 0 if mins is None else len(mins))
+        self.min = _grow(self.min, n, np.inf)
+        self.max = _grow(self.max, n, -np.inf)
+        if mins is None:
+            np.minimum.at(self.min, groups, values)
+            np.maximum.at(self.max, groups, values)
+        else:
+            self.min[:len(mins)] = np.minimum(self.min[:len(mins)], mins)
+            self.max[:len(maxs)] = np.maximum(self.max[:len(maxs)], maxs)
+        self._compress(np.concatenate([self.groups, groups]),
+                       np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, weights]))
+        return self
+
+    def _compress(self, g, m, w):
+        order = np.lexsort((m, g))
+        g, m, w = g[order], m[order], w[order]
+        total = np.bincount(g, weights=w, minlength=self.n_groups)
+        cum = np.cumsum(w)
+        start = np.r_[True, g[1:] != g[:-1]]
+        offset = np.maximum.accumulate(np.where(start, cum - w, 0))
+        q = (cum - offset - w / 2) / total[g]
+        k = np.floor(self.delta * (np.arcsin(np.clip(2 * q - 1, -1, 1)) / np.pi + .5))
+        new = start | np.r_[True, k[1:] != k[:-1]]
+        ids = np.cumsum(new) - 1
+        weights = np.bincount(ids, weights=w)
+        self.means = np.bincount(ids, weights=w * m) / weights
+        self.weights = weights
+        self.groups = g[new]
+        return
+
+    def merge(self, other, code_map=None):
+        """
+        Merge another digest; code_map[i] is this digest's code for the other's group i.
+        """
+        code_map = np.arange(other.n_groups) if code_map is None else np.asarray(code_map, dtype=np.int64)
+        if other.n_groups == 0:
+            return self
+        n = max(self.n_groups, int(code_map.max()) + 1)
+        mins, maxs = np.full(n, np.inf), np.full(n, -np.inf)
+        np.minimum.at(mins, code_map, other.min)
+        np.maximum.at(maxs, code_map, other.max)
+        return self.add(code_map[other.groups], other.means, other.weights, mins=mins, maxs=maxs)
+
+    def quantile(self, qs) -> np.ndarray:
+        """
+        Quantiles of every group, shape (n_groups, len(qs)); NaN for empty groups.
+        Interpolates linearly between centroid midpoints, and towards the exact min/max at the ends.
+        """
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        n = self.n_groups
+        out = np.full((n, len(qs)), np.nan)
+        if len(self.means) == 0:
+            return out
+        g, m, w = self.groups, self.means, self.weights
+        cum = np.cumsum(w)
+        mid = cum - w / 2
+        first = np.searchsorted(g, np.arange(n), side='left')
+        last = np.searchsorted(g, np.arange(n), side='right')
+        total = np.bincount(g, weights=w, minlength=n)
+        base = np.where(first < len(cum), cum[np.minimum(first, len(cum) - 1)] - w[np.minimum(first, len(w) - 1)], 0)
+        has = last > first
+
+        target = base[:, None] + qs[None, :] * total[:, None]
+        right = np.searchsorted(mid, target, side='right')
+        left = right - 1
+        lo = first[:, None]
+        hi = last[:, None]
+        # Left point: previous centroid midpoint, or (group start, min).
+        use_min = left < lo
+        li = np.clip(left, 0, len(m) - 1)
+        x0 = np.where(use_min, base[:, None], mid[li])
+        y0 = np.where(use_min, self.min[:, None], m[li])
+        # Right point: next centroid midpoint, or (group end, max).
+        use_max = right >= hi
+        ri = np.clip(right, 0, len(m) - 1)
+        x1 = np.where(use_max, (base + total)[:, None], mid[ri])
+        y1 = np.where(use_max, self.max[:, None], m[ri])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frac = np.where(x1 > x0, (target - x0) / (x1 - x0), 0)
+        out[has] = (y0 + frac * (y1 - y0))[has]
+        return out
+
+    def size(self) -> int:
+        return len(self.means)
+
+
+class MarketStats:
+    """
+    Per-(period, fuel type) listing counts, price min/max/mean, quantile sketches and means of
+    other columns (e.g. mileage), folded one batch at a time.
+
+    Args:
+        freq (str): Pandas period frequency of the groups ('D', 'W', 'M', ...).
+        delta (int): Sketch compression; quantile error is roughly 1/delta in the middle and much
+            smaller in the tails.
+        value (str): Price column.
+        date_col (str): Date of sale column.
+        fuel_col (str): Fuel type column (grouped with clean_fuel_type).
+        mean_columns: Other columns whose mean is kept per group.
+    """
+
+    def __init__(self, freq='M', delta=200, value='price', date_col='dos', fuel_col='fuelType', mean_columns=('mileage',)):
+
+        self.freq = freq
+        self.delta = delta
+        self.value = value
+        self.date_col = date_col
+        self.fuel_col = fuel_col
+        self.mean_columns = list(mean_columns)
+        self.keys = []
+        self.codes = {}
+        self.count = np.zeros(0)
+        self.sum = np.zeros(0)
+        self.extra_sum = {c: np.zeros(0) for c in self.mean_columns}
+        self.extra_count = {c: np.zeros(0) for c in self.mean_columns}
+        self.digest = GroupedTDigest(delta)
+        self.rows = 0
+        return
+
+    def _params(self) -> dict:
+        return {'freq': self.freq, 'delta': self.delta, 'value': self.value, 'date_col': self.date_col,
+                'fuel_col': self.fuel_col, 'mean_columns': self.mean_columns}
+
+    def _code_map(self, keys) -> np.ndarray:
+        # Codes of keys, adding the new ones.
+        out = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            code = self.codes.get(key)
+            if code is None:
+                code = self.codes[key] = len(self.keys)
+                self.keys.append(key)
+            out[i] = code
+        n = len(self.keys)
+        self.count = _grow(self.count, n, 0.)
+        self.sum = _grow(self.sum, n, 0.)
+        for c in self.mean_columns:
+            self.extra_sum[c] = _grow(self.extra_sum[c], n, 0.)
+            self.extra_count[c] = _grow(self.extra_count[c], n, 0.)
+        return out
+
+    def _accumulate(self, codes, count, total, extra_sum, extra_count):
+        n = len(self.keys)
+        self.count += np.bincount(codes, weights=count, minlength=n)
+        self.sum += np.bincount(codes, weights=total, minlength=n)
+        for c in self.mean_columns:
+            self.extra_sum[c] += np.bincount(codes, weights=extra_sum[c], minlength=n)
+            self.extra_count[c] += np.bincount(codes, weights=extra_count[c], minlength=n)
+        return
+
+    def update(self, batch):
+        """
+        Fold a batch of listings (DataFrame or Arrow batch) with one row per first sale.
+        """
+        df = batch if isinstance(batch, pd.DataFrame) else batch.to_pandas()
+        df = df[df[self.value].notna()]
+        if df.empty:
+            return self
+        self.rows += len(df)
+        # Periods and fuel types are worked out once per distinct date and raw label, and combined as
+        # integer codes: factorizing (period, fuel type) tuples row by row dominated the time of large batches.
+        date_codes, dates = _factorize(df[self.date_col])
+        period_codes, periods = _factorize(pd.to_datetime(dates).to_period(self.freq).start_time)
+        label_codes, labels = _factorize(df[self.fuel_col])
+        fuel_codes, fuels = _factorize(clean_fuel_type(pd.Series(labels)))
+        pairs, combined = pd.factorize(period_codes[date_codes] * len(fuels) + fuel_codes[label_codes])
+        keys = [(periods[c // len(fuels)], fuels[c % len(fuels)]) for c in combined]
+        codes = self._code_map(keys)[pairs]
+        price = df[self.value].to_numpy(dtype=float)
+        extra = {c: df[c].to_numpy(dtype=float) for c in self.mean_columns if c in df.columns}
+        self._accumulate(codes, None, price,
+                         {c: np.nan_to_num(extra[c]) if c in extra else np.zeros(len(df)) for c in self.mean_columns},
+                         {c: (~np.isnan(extra[c])).astype(float) if c in extra else np.zeros(len(df)) for c in self.mean_columns})
+        self.digest.add(codes, price)
+        return self
+
+    def merge(self, other):
+        """
+        Merge the statistics of another MarketStats (e.g. built by a worker on other batches).
+        """
+        if other.freq != self.freq:
+            raise ValueError(f'Cannot merge freq {other.freq} into {self.freq}; resample first.')
+        self._merge_mapped(other, other.keys)
+        return self
+
+    def _merge_mapped(self, other, keys):
+        code_map = self._code_map(keys)
+        self._accumulate(code_map, other.count, other.sum, other.extra_sum, other.extra_count)
+        self.digest.merge(other.digest, code_map)
+        self.rows += other.rows
+        return
+
+    def resample(self, freq):
+        """
+        The same statistics over coarser periods (e.g. daily -> 'W' or 'M'), from the sketches.
+        """
+        out = MarketStats(**{**self._params(), 'freq': freq})
+        keys = [(pd.Timestamp(date).to_period(freq).start_time, ft) for date, ft in self.keys]
+        out._merge_mapped(self, keys)
+        return out
+
+    def result(self, quantiles=(.5,), per_mile=None) -> pd.DataFrame:
+        """
+        One row per period and fuel type: registrations, min/max/avg price, the requested quantiles
+        (median_price for .5, p<q>_price otherwise) and the means of mean_columns.
+        per_mile: a mean column (e.g. 'mileage') to also express the price statistics per mile of, as the
+        notebook's *_price_per_mile columns.
+        """
+        n = len(self.keys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df = pd.DataFrame({
+                'date': [k[0] for k in self.keys],
+                'ft': [k[1] for k in self.keys],
+                'registrations': self.count.astype(np.int64),
+                'min_price': _grow(self.digest.min, n, np.nan)[:n],
+                'max_price': _grow(self.digest.max, n, np.nan)[:n],
+                'avg_price': self.sum / self.count,
+            })
+            names = ['median_price' if q == .5 else f'p{round(q * 100):g}_price' for q in quantiles]
+            values = self.digest.quantile(quantiles)
+            values = np.vstack([values, np.full((n - len(values), len(names)), np.nan)])[:n]
+            for i, name in enumerate(names):
+                df[name] = values[:, i]
+            for c in self.mean_columns:
+                df[f'avg_{c}'] = self.extra_sum[c] / np.where(self.extra_count[c] > 0, self.extra_count[c], np.nan)
+            if per_mile:
+                for name in ['min_price', 'max_price', 'avg_price'] + names:
+                    df[f'{name}_per_mile'] = df[name] / df[f'avg_{per_mile}']
+        return df.sort_values(['date', 'ft']).reset_index(drop=True)
+
+    def shares(self, **kwargs) -> pd.DataFrame:
+        """
+        result() with each fuel type's registrations as a proportion (%) of its period's total.
+        """
+        df = self.result(**kwargs)
+        df['sum'] = df.groupby('date')['registrations'].transform('sum')
+        df['proportion'] = np.where(df['sum'] != 0, 100 * df['registrations'] / df['sum'].where(df['sum'] != 0, 1), 0)
+        return df
+
+    def trends(self, column='median_price', exclude=('Other',), **kwargs) -> pd.DataFrame:
+        """
+        Least-squares linear trend of a result() column against days since the first period, per fuel type.
+        Returns:
+            pd.DataFrame: ft, n, intercept, slope_per_day, slope_per_year, r2.
+        """
+        df = self.shares(**kwargs)
+        df = df[~df['ft'].isin(exclude) & df[column].notna()]
+        x = (df['date'] - df['date'].min()).dt.days.astype(float)
+        y = df[column].astype(float)
+        sums = pd.DataFrame({'ft': df['ft'], 'x': x, 'y': y, 'xx': x * x, 'xy': x * y, 'yy': y * y}).groupby('ft')
+        s = sums.sum()
+        n = sums.size()
+        sxx = s['xx'] - s['x'] ** 2 / n
+        sxy = s['xy'] - s['x'] * s['y'] / n
+        syy = s['yy'] - s['y'] ** 2 / n
+        slope = sxy / sxx.where(sxx > 0)
+        out = pd.DataFrame({
+            'n': n,
+            'intercept': (s['y'] - slope * s['x']) / n,
+            'slope_per_day': slope,
+            'slope_per_year': slope * 365.25,
+            'r2': sxy ** 2 / (sxx * syy).where((sxx * syy) > 0),
+        })
+        return out.reset_index()
+
+
+def _batch_stats(args):
+    params, batch = args
+    return MarketStats(**params).update(batch)
+
+
+def market_stats(batches, n_workers=None, **params) -> MarketStats:
+    """
+    MarketStats over an iterable of batches, folded in worker processes when n_workers is set
+    (each worker summarises whole batches; the partial results are merged).
+    """
+    stats = MarketStats(**params)
+    if not n_workers:
+        for batch in batches:
+            stats.update(batch)
+        return stats
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for partial in executor.map(_batch_stats, ((stats._params(), batch) for batch in batches)):
+            stats.merge(partial)
+    return stats
@@ -0,0 +1,490 @@
+"""
+Memoised stage graph for the parc -> VMT -> fuel economy -> emissions model.
+
+A Pipeline is a set of named stages. A stage is a function whose arguments are
+either the outputs of other stages (arguments named after a stage) or pipeline
+parameters (any other argument). Each stage's output is cached in memory and on
+disk under a key hashing its code, its parameters, the content of any input
+files and the keys of its upstream stages, so changing one parameter only
+re-executes the stages downstream of it. Stages whose inputs are ready run in
+parallel.
+
+Example:
+    pipe = emissions_pipeline()
+    df = pipe.run('emissions')['emissions']
+    pipe.set(emission_factors=scenarios.EMISSION_FACTORS_2021)
+    df_2021 = pipe.run('emissions')['emissions']  # only the emissions stage runs again
+"""
+# Packages
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sysconfig
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+# Modules
+from .helpers import add_fuel_economy, add_fuel_emissions, add_vmt, prep_mm
+from .scenarios import EMISSION_FACTORS_2022, TOE_PER_TONNE
+from .workbooks import file_hash, read_excel_cached
+
+
+# Beside workbooks.CACHE_DIR rather than inside it, so workbooks.clear_cache() leaves it alone.
+CACHE_DIR = os.path.join('data', '.pipeline')
+
+
+def _hash_value(value) -> str:
+    # Content hash of a parameter value.
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        payload = pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()
+        payload += repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode()
+    elif isinstance(value, np.ndarray):
+        payload = repr((value.dtype.str, value.shape)).encode() + np.ascontiguousarray(value).tobytes()
+    else:
+        payload = json.dumps(value, sort_keys=True, default=repr).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+# _code_hash follows the project's own functions (this package, notebooks, scripts), not installed libraries.
+_LIBRARY_DIRS = tuple({os.path.abspath(path) + os.sep for key, path in sysconfig.get_paths().items()
+                       if key in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+_CONSTANT_TYPES = (bool, int, float, complex, str, bytes, tuple, list, dict, np.ndarray, np.generic)
+
+
+def _own_code(obj) -> bool:
+    # A function or module whose source is not part of the Python installation or site-packages.
+    try:
+        path = inspect.getsourcefile(obj)
+    except TypeError:
+        return False
+    return not path or not os.path.abspath(path).startswith(_LIBRARY_DIRS)
+
+
+def _code_names(code) -> set:
+    # Global and attribute names used by a code object and the lambdas/comprehensions nested in it.
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _code_hash(func, _seen=None) -> str:
+    """
+    Hash of a function's source and of what it uses from this project: the functions it calls (recursively,
+    e.g. helpers.prep_mm) and the constants it reads from module globals or closures (e.g. LITRES_TO_GALLONS).
+    """
+    seen = set() if _seen is None else _seen
+    seen.add(func)
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        code = func.__code__
+        source = repr((code.co_code, code.co_consts, code.co_names))
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    names = _code_names(code)
+    scope = dict(getattr(func, '__globals__', {}))
+    for name, cell in zip(code.co_freevars, func.__closure__ or ()):
+        try:
+            scope[name] = cell.cell_contents
+        except ValueError:
+            pass
+    referenced = {name: scope[name] for name in names if name in scope}
+    for name, value in list(referenced.items()):
+        # module.attribute references, e.g. helpers.prep_df_fc or scenarios.KWH_PER_TOE.
+        if inspect.ismodule(value) and _own_code(value):
+            referenced.update({f'{name}.{attr}': getattr(value, attr) for attr in names if hasattr(value, attr)})
+
+    parts = [source]
+    for name in sorted(referenced):
+        value = referenced[name]
+        if inspect.isfunction(value):
+            if _own_code(value) and value not in seen:
+                parts.append(f'{name}={_code_hash(value, seen)}')
+        elif isinstance(value, _CONSTANT_TYPES):
+            try:
+                parts.append(f'{name}={_hash_value(value)}')
+            except (TypeError, ValueError):
+                parts.append(f'{name}={value!r}')
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+class Stage:
+    """
+    One node of a Pipeline. See Pipeline.stage.
+    """
+
+    def __init__(self, name, func, files=(), returns=None, version=None, cache=True):
+
+        self.name = name
+        self.func = func
+        self.files = tuple(files)
+        self.returns = returns
+        self.version = version
+        self.cache = cache
+        self.signature = inspect.signature(func)
+        self.arguments = list(self.signature.parameters)
+        self.code_hash = _code_hash(func)
+        return
+
+    def __repr__(self):
+        return f'Stage({self.name!r}, arguments={self.arguments})'
+
+
+class Pipeline:
+    """
+    Named stages with content-hash memoisation.
+
+    Args:
+        params (dict): Parameter values, looked up by stage argument name.
+        cache_dir (str): Folder for the on-disk stage cache (None for memory only).
+        workers (int): Threads used to run independent stages concurrently.
+        max_cache_bytes (int): Size of the disk cache above which the least recently used outputs are removed.
+        max_cache_age (float): Days after which an output not used since is removed (None to keep).
+    The disk cache keeps every key of every stage (so switching parameters back and forth reuses earlier
+    outputs) and may be shared by several pipelines.
+    """
+
+    def __init__(self, params=None, cache_dir=CACHE_DIR, workers=4, max_cache_bytes=2 * 2 ** 30, max_cache_age=None):
+
+        self.params = dict(params or {})
+        self.stages = {}
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_cache_bytes = max_cache_bytes
+        self.max_cache_age = max_cache_age
+        self._memory = {}  # stage name -> (key, value)
+        self.timings = {}  # stage name -> (state, seconds) of the last run
+        return
+
+    def stage(self, name=None, files=(), returns=None, version=None, cache=True):
+        """
+        Decorator registering a function as a stage.
+        Args:
+            name (str): Stage name (default the function name).
+            files: Arguments holding file paths; the files' content is part of the cache key.
+            returns (type): Expected output type, checked after the stage runs.
+            version: Bump to invalidate cached outputs without changing the code.
+            cache (bool): Write the output to the disk cache.
+        Arguments annotated with a type are checked against the upstream output or parameter value.
+        """
+        def decorator(func):
+            stage = Stage(name or func.__name__, func, files=files, returns=returns, version=version, cache=cache)
+            if stage.name in self.params:
+                raise ValueError(f'Stage {stage.name} has the same name as a parameter.')
+            self.stages[stage.name] = stage
+            return func
+        return decorator
+
+    def add(self, func, **kwargs):
+        """
+        Register an existing function as a stage (same options as stage()).
+        """
+        return self.stage(**kwargs)(func)
+
+    def set(self, **params):
+        """
+        Update parameters. Returns the stages whose cache key changed and will re-run.
+        """
+        before = self.keys()
+        self.params.update(params)
+        after = self.keys()
+        return [name for name in self.stages if before.get(name) != after.get(name)]
+
+    def inputs(self, name) -> list:
+        """
+        Upstream stages of a stage.
+        """
+        return [arg for arg in self.stages[name].arguments if arg in self.stages]
+
+    def _order(self, targets=None) -> list:
+        # Stages needed for targets, upstream first.
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f'Cycle in pipeline at stage {name}.')
+            if name not in self.stages:
+                raise KeyError(f'Unknown stage {name}.')
+            visiting.add(name)
+            for upstream in self.inputs(name):
+                visit(upstream)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return order
+
+    def keys(self, targets=None) -> dict:
+        """
+        Cache key of every stage (needed for targets), computed without running anything.
+        """
+        keys = {}
+        for name in self._order(targets):
+            stage = self.stages[name]
+            parts = [name, str(stage.version), stage.code_hash]
+            for arg in stage.arguments:
+                if arg in self.stages:
+                    parts.append(f'{arg}={keys[arg]}')
+                elif arg in self.params:
+                    value = self.params[arg]
+                    if arg in stage.files and value is not None:
+                        parts.append(f'{arg}=file:{file_hash(value)}')
+                    else:
+                        parts.append(f'{arg}={_hash_value(value)}')
+                elif stage.signature.parameters[arg].default is inspect.Parameter.empty:
+                    raise KeyError(f'Stage {name} needs {arg}, which is neither a stage nor a parameter.')
+            keys[name] = hashlib.sha256('|'.join(parts).encode()).hexdigest()
+        return keys
+
+    def _cache_path(self, name, key):
+        return os.path.join(self.cache_dir, f'{name}-{key[:20]}.pkl')
+
+    def _load(self, name, key):
+        if name in self._memory and self._memory[name][0] == key:
+            return True, self._memory[name][1], 'memory'
+        if self.cache_dir and self.stages[name].cache:
+            path = self._cache_path(name, key)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                # The modification time records the last use, for pruning.
+                os.utime(path)
+                self._memory[name] = (key, value)
+                return True, value, 'disk'
+        return False, None, None
+
+    def _store(self, name, key, value):
+        self._memory[name] = (key, value)
+        if not self.cache_dir or not self.stages[name].cache:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(name, key)
+        tmp = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._prune(keep=path)
+        return
+
+    def _prune(self, keep=None):
+        # Least recently used first: drop outputs unused for max_cache_age days, then until under max_cache_bytes.
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file)
+            if file.endswith('.pkl') and path != keep:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries) + (os.path.getsize(keep) if keep else 0)
+        now = time.time()
+        for mtime, size, path in entries:
+            expired = self.max_cache_age is not None and now - mtime > self.max_cache_age * 86400
+            if not expired and (self.max_cache_bytes is None or total <= self.max_cache_bytes):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return
+
+    @staticmethod
+    def _check(stage, what, value, expected):
+        if expected is not inspect.Parameter.empty and isinstance(expected, type) and value is not None and not isinstance(value, expected):
+            raise TypeError(f'Stage {stage}: {what} should be {expected.__name__}, got {type(value).__name__}.')
+
+    def _execute(self, name, values):
+        stage = self.stages[name]
+        kwargs = {}
+        for arg in stage.arguments:
+            if arg in self.stages:
+                kwargs[arg] = values[arg]
+            elif arg in self.params:
+                kwargs[arg] = self.params[arg]
+            else:
+                continue
+            self._check(name, f'argument {arg}', kwargs[arg], stage.signature.parameters[arg].annotation)
+        start = time.perf_counter()
+        value = stage.func(**kwargs)
+        seconds = time.perf_counter() - start
+        self._check(name, 'output', value, stage.returns)
+        return value, seconds
+
+    def run(self, targets=None, force=(), workers=None) -> dict:
+        """
+        Bring the target stages (default all) up to date, running only stages whose key has no
+        cached output, concurrently where their inputs allow.
+        Args:
+            targets: Stage name or list of names.
+            force: Stage names to re-run even if cached (e.g. a loader whose source is not a file).
+                Downstream stages keep their cached outputs unless listed too.
+            workers (int): Override the pipeline's thread count (1 runs serially).
+        Returns:
+            dict: {stage name: output} for the targets.
+        """
+        targets = [targets] if isinstance(targets, str) else targets
+        order = self._order(targets)
+        keys = self.keys(targets)
+        values, pending = {}, []
+        for name in order:
+            hit, value, state = (False, None, None) if name in force else self._load(name, keys[name])
+            if hit:
+                values[name] = value
+                self.timings[name] = (state, 0.)
+            else:
+                pending.append(name)
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers or self.workers) as executor:
+            while pending or running:
+                ready = [name for name in pending if all(upstream in values for upstream in self.inputs(name))]
+                for name in ready:
+                    pending.remove(name)
+                    running[executor.submit(self._execute, name, values)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    value, seconds = future.result()
+                    self._store(name, keys[name], value)
+                    values[name] = value
+                    self.timings[name] = ('ran', seconds)
+        return {name: values[name] for name in (targets or order)}
+
+    def __getitem__(self, name):
+        return self.run(name)[name]
+
+    def status(self, targets=None) -> pd.DataFrame:
+        """
+        Per stage: its inputs, whether its current key is cached, and how the last run got it.
+        """
+        keys = self.keys(targets)
+        rows = []
+        for name in self._order(targets):
+            key = keys[name]
+            if name in self._memory and self._memory[name][0] == key:
+                cached = 'memory'
+            elif self.cache_dir and os.path.isfile(self._cache_path(name, key)):
+                cached = 'disk'
+            else:
+                cached = None
+            state, seconds = self.timings.get(name, (None, None))
+            rows.append({'stage': name, 'inputs': self.inputs(name), 'key': key[:12], 'cached': cached,
+                         'last_run': state, 'seconds': seconds})
+        return pd.DataFrame(rows)
+
+    def clear_cache(self):
+
+        self._memory = {}
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for file in os.listdir(self.cache_dir):
+                if file.endswith('.pkl') and file.split('-')[0] in self.stages:
+                    os.remove(os.path.join(self.cache_dir, file))
+        return
+
+
+def emissions_pipeline(parc_path='data/uk_vehicle_parc.csv',
+                       mileage_path='data/cars_average_mileage.csv',
+                       fuel_path='data/uk_yearly_fuel.csv',
+                       naei_path=None,
+                       body_type='Cars',
+                       emission_factors=EMISSION_FACTORS_2022,
+                       toe_per_tonne=TOE_PER_TONNE,
+                       naei_sheet='UK By Source_AR5',
+                       naei_category='1A3bi_Cars',
+                       cache_dir=CACHE_DIR,
+                       workers=4) -> Pipeline:
+    """
+    The car fleet emissions model of helpers.prep_df_fc and the scenario notebooks as a Pipeline:
+    parc, mileage, fuel -> cars -> vmt -> economy -> emissions, plus naei -> comparison when
+    naei_path (the DA GHGI workbook) is given. Fuel factors are ordered diesel, petrol.
+    """
+    pipe = Pipeline(params={
+        'parc_path': parc_path,
+        'mileage_path': mileage_path,
+        'fuel_path': fuel_path,
+        'naei_path': naei_path,
+        'body_type': body_type,
+        'emission_factors': np.asarray(emission_factors, dtype=float),
+        'toe_per_tonne': np.asarray(toe_per_tonne, dtype=float),
+        'naei_sheet': naei_sheet,
+        'naei_category': naei_category,
+    }, cache_dir=cache_dir, workers=workers)
+
+    @pipe.stage(files=['parc_path'], returns=pd.DataFrame)
+    def parc(parc_path):
+        df = pd.read_csv(parc_path, index_col=0)
+        df.index = pd.to_datetime(df.index)
+        return df
+
+    @pipe.stage(files=['mileage_path'], returns=pd.DataFrame)
+    def mileage(mileage_path):
+        df = pd.read_csv(mileage_path)
+        df['fuelType'] = df['fuelType'].replace({'Pure electric': 'Electric'})
+        return prep_mm(df)
+
+    @pipe.stage(files=['fuel_path'], returns=pd.DataFrame)
+    def fuel(fuel_path):
+        df = pd.read_csv(fuel_path, index_col=0, usecols=['year', 'Diesel cars total', 'Petrol cars total'])
+        df.index = pd.to_datetime(df.index)
+        return df.rename(columns={
+            'Diesel cars total': 'car_diesel_consumption',
+            'Petrol cars total': 'car_petrol_consumption'
+        }).resample('Y').last()
+
+    @pipe.stage(returns=pd.DataFrame)
+    def cars(parc: pd.DataFrame, body_type):
+        return parc[parc.BodyType == body_type].pivot(columns='Fuel', values='value').resample('Y').last()
+
+    @pipe.stage(returns=pd.DataFrame)
+    def vmt(cars: pd.DataFrame, mileage: pd.DataFrame):
+        return add_vmt(cars, mileage)
+
+    @pipe.stage(returns=pd.DataFrame)
+    def economy(vmt: pd.DataFrame, fuel: pd.DataFrame, toe_per_tonne):
+        df = vmt.merge(fuel, how='left', left_index=True, right_index=True)
+        return add_fuel_economy(df, toe_per_tonne)
+
+    @pipe.stage(returns=pd.DataFrame)
+    def emissions(economy: pd.DataFrame, emission_factors):
+        df = add_fuel_emissions(economy.copy(), emission_factors)
+        df['total_kgCO2e_calc'] = df['diesel_emissions'] + df['petrol_emissions']
+        return df
+
+    if naei_path is not None:
+
+        @pipe.stage(files=['naei_path'], returns=pd.DataFrame)
+        def naei(naei_path, naei_sheet):
+            em = read_excel_cached(naei_path, sheet_name=naei_sheet, header=16, usecols='B:AC')
+            em['NCFormat'] = em['NCFormat'].ffill()
+            em = em.melt(id_vars=['NCFormat', 'IPCC_name'])
+            em = em[em['variable'] != 'BaseYear']
+            em['variable'] = pd.to_datetime(em['variable'].astype(str), format='%Y')
+            return em[em['NCFormat'] == 'Transport'].pivot(index='variable', columns='IPCC_name', values='value')
+
+        @pipe.stage(returns=pd.DataFrame)
+        def comparison(emissions: pd.DataFrame, naei: pd.DataFrame, naei_category):
+            # NAEI is in ktCO2e, the model in kgCO2e.
+            naei_kt = naei[naei_category].resample('Y').last().rename('naei_ktCO2e')
+            df = emissions[['total_kgCO2e_calc']].assign(calc_ktCO2e=emissions['total_kgCO2e_calc'] / 1e6)
+            df = df.merge(naei_kt, how='left', left_index=True, right_index=True)
+            df['ratio'] = df['calc_ktCO2e'] / df['naei_ktCO2e']
+            return df
+
+    return pipe
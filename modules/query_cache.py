@@ -0,0 +1,175 @@
+"""
+Persistent on-disk cache for query results.
+
+Results are stored as Parquet files keyed on the normalised SQL, any query
+parameters and, for queries using CURRENT_DATE()/CURRENT_TIMESTAMP(), the date
+they resolve to. Entries expire after a TTL and the cache is kept under a size
+budget by evicting the least recently used results.
+"""
+# Packages
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+import pandas as pd
+
+# Modules
+
+
+_INDEX_FILE = 'index.json'
+_COMMENTS = re.compile(r"(--|#)[^\n]*")
+_STRINGS = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+_CURRENT_DATE = re.compile(r"\bCURRENT_(DATE|DATETIME|TIMESTAMP|TIME)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Strip comments, collapse whitespace and drop trailing semicolons, leaving string literals untouched.
+    Args:
+        sql (str): Query text.
+    Returns:
+        str: Normalised query.
+    """
+    parts = _STRINGS.split(sql)
+    for i in range(0, len(parts), 2):
+        code = _COMMENTS.sub(' ', parts[i])
+        parts[i] = re.sub(r'\s+', ' ', code)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+class QueryCache:
+
+    def __init__(self,
+                 cache_dir='./query_cache',
+                 ttl=24 * 3600,
+                 max_bytes=5 * 1024 ** 3,
+                 ):
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index = self._load_index()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_processed_saved = 0
+        return
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, _INDEX_FILE)) as json_file:
+                return json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self):
+        tmp = os.path.join(self.cache_dir, _INDEX_FILE + '.tmp')
+        with open(tmp, 'w') as json_file:
+            json.dump(self.index, json_file)
+        os.replace(tmp, os.path.join(self.cache_dir, _INDEX_FILE))
+
+    def _file(self, key):
+        return os.path.join(self.cache_dir, key + '.parquet')
+
+    def make_key(self, sql, params=None):
+        """
+        Cache key for a query: normalised SQL, parameters and the date CURRENT_DATE() resolves to.
+        """
+        normalized = normalize_sql(sql)
+        resolved = {'params': params or {}}
+        if _CURRENT_DATE.search(normalized):
+            resolved['current_date'] = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        payload = json.dumps({'sql': normalized, **resolved}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, sql, params=None):
+        """
+        Return the cached result for a query, or None on a miss or expired entry.
+        """
+        key = self.make_key(sql, params)
+        entry = self.index.get(key)
+        if entry and time.time() - entry['created'] <= self.ttl and os.path.isfile(self._file(key)):
+            df = pd.read_parquet(self._file(key))
+            entry['last_access'] = time.time()
+            self._save_index()
+            self.hits += 1
+            self.bytes_saved += entry['bytes']
+            self.bytes_processed_saved += entry.get('bytes_processed') or 0
+            return df
+        if entry:
+            self._remove(key)
+            self._save_index()
+        self.misses += 1
+        return None
+
+    def put(self, sql, df, params=None, bytes_processed=None):
+        """
+        Store a query result, evicting least recently used entries to stay under max_bytes.
+        """
+        key = self.make_key(sql, params)
+        tmp = self._file(key) + '.tmp'
+        try:
+            df.to_parquet(tmp, index=False)
+        except Exception as e:
+            print(f'Result not cached, impossible to write Parquet.\nERROR: {e}')
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+            return
+        os.replace(tmp, self._file(key))
+        now = time.time()
+        self.index[key] = {
+            'sql': normalize_sql(sql),
+            'created': now,
+            'last_access': now,
+            'bytes': os.path.getsize(self._file(key)),
+            'bytes_processed': bytes_processed,
+        }
+        self._evict()
+        self._save_index()
+        return
+
+    def _remove(self, key):
+        self.index.pop(key, None)
+        if os.path.isfile(self._file(key)):
+            os.remove(self._file(key))
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, e in self.index.items() if now - e['created'] > self.ttl]:
+            self._remove(key)
+        total = sum(e['bytes'] for e in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]['bytes']
+            self._remove(key)
+
+    def invalidate(self, sql=None, params=None, pattern=None):
+        """
+        Drop cached results: one query, every query whose normalised SQL matches a regex pattern
+        (e.g. a table name), or everything when called without arguments.
+        """
+        if sql is not None:
+            keys = [self.make_key(sql, params)]
+        elif pattern is not None:
+            keys = [k for k, e in self.index.items() if re.search(pattern, e['sql'])]
+        else:
+            keys = list(self.index)
+        for key in keys:
+            self._remove(key)
+        self._save_index()
+        return len(keys)
+
+    def stats(self):
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytes_saved': self.bytes_saved,
+            'bytes_processed_saved': self.bytes_processed_saved,
+            'entries': len(self.index),
+            'cache_bytes': sum(e['bytes'] for e in self.index.values()),
+        }
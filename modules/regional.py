@@ -0,0 +1,249 @@
+"""
+Vehicle-miles, implied fuel economy and emissions for every ONS geography at once.
+
+The scenario notebooks filter the sub-national fuel consumption workbook and
+VEH0105/VEH0142 to one ``lad_code`` and run the model per geography. Here the
+same sources are read whole into a (geography x year x fuel) panel and the model
+is computed with broadcast array operations, giving one tidy table for the UK,
+the nations, regions and all local authorities.
+
+Example:
+    parc = load_parc_panel('data/veh0105.ods', 'data/veh0142.ods')
+    fuel = load_fuel_panel()
+    model = RegionalEmissions.from_panels(parc, fuel, mileage=pd.read_csv('data/cars_average_mileage.csv'))
+    model.save('data/regional_emissions.parquet')
+    model.lookup('W06000015')           # Cardiff, tidy
+    model.wide('S92000003')             # Scotland, in the notebooks' column layout
+"""
+# Packages
+import numpy as np
+import pandas as pd
+
+# Modules
+from .helpers import ft_cleaner_dft_series, prep_mm
+from .scenarios import EMISSION_FACTORS_2022, KWH_PER_TOE, LITRES_TO_GALLONS, TOE_PER_TONNE
+from .workbooks import read_excel_cached
+
+
+FUEL_WORKBOOK = 'data/sub-national-road-transport-fuel-consumption-statistics-2005-2020.ods'
+PANEL_FUELS = ['Diesel', 'Petrol', 'Pure Electric']
+# Fuel workbook columns (ktoe) per body type, diesel then petrol.
+CONSUMPTION_COLUMNS = {
+    'Cars': ['Diesel cars total', 'Petrol cars total'],
+    'Light goods vehicles': ['Diesel LGV total', 'Petrol LGV total'],
+}
+TIDY_COLUMNS = ['ons_code', 'name', 'year', 'fuel', 'parc', 'annual_mileage', 'vmt', 'consumption_ktoe',
+                'consumption_gallons', 'economy_mpg', 'emissions_kgCO2e']
+
+
+def _column(df: pd.DataFrame, prefix: str) -> str:
+    # DfT add and renumber "[note n]" suffixes between releases.
+    for column in df.columns:
+        if str(column).startswith(prefix):
+            return column
+    raise KeyError(f'No column starting with {prefix!r} in {list(df.columns)[:10]}...')
+
+
+def _read_veh_table(path: str, sheet_name: str, scale: float = 1) -> pd.DataFrame:
+    df = read_excel_cached(path, sheet_name=sheet_name, header=4)
+    code, name = _column(df, 'ONS Code'), _column(df, 'ONS Geography')
+    fuel, keepership = _column(df, 'Fuel'), _column(df, 'Keepership')
+    df = df[(df['BodyType'] != 'Total') & (df[fuel] != 'Total') & (df[keepership] != 'Total')]
+    id_vars = [code, name, 'BodyType', fuel]
+    quarters = [c for c in df.columns if c not in id_vars + [keepership] and not str(c).startswith(('ONS Sort', 'Units'))]
+    df = df.melt(id_vars=id_vars, value_vars=quarters, var_name='date')
+    df['value'] = pd.to_numeric(df['value'], errors='coerce') * scale
+    # '2022 Q2' -> 2022-04-01, parsed once per column rather than per row.
+    dates = pd.PeriodIndex([str(q).replace(' ', '-') for q in quarters], freq='Q').to_timestamp()
+    df['date'] = df['date'].map(dict(zip(quarters, dates)))
+    return df.rename(columns={code: 'ons_code', name: 'name', fuel: 'Fuel'})
+
+
+def load_parc_panel(veh0105_path: str, veh0142_path: str = None) -> pd.DataFrame:
+    """
+    Licensed vehicles by geography, quarter, body type and fuel from VEH0105 (thousands) and
+    optionally VEH0142 (plug-ins, units), summed per cleaned fuel type as in the notebooks.
+    Returns:
+        pd.DataFrame: Columns ons_code, name, date, BodyType, Fuel, value (vehicles).
+    """
+    frames = [_read_veh_table(veh0105_path, 'VEH0105', scale=1000)]
+    if veh0142_path:
+        frames.append(_read_veh_table(veh0142_path, 'VEH0142'))
+    df = pd.concat(frames, ignore_index=True)
+    df['Fuel'] = ft_cleaner_dft_series(df['Fuel'])
+    return df.groupby(['ons_code', 'name', 'date', 'BodyType', 'Fuel'], as_index=False, observed=True)['value'].sum()
+
+
+def load_fuel_panel(path: str = FUEL_WORKBOOK, years=range(2005, 2021)) -> pd.DataFrame:
+    """
+    Sub-national road transport fuel consumption (ktoe) for every geography and year.
+    Returns:
+        pd.DataFrame: Columns ons_code, name, year and the workbook's consumption columns.
+    """
+    sheets = read_excel_cached(path, sheet_name=[str(y) for y in years], header=3)
+    frames = []
+    for year, df in sheets.items():
+        df = df.rename(columns={_column(df, 'Local Authority Code'): 'ons_code',
+                                _column(df, 'Local Authority ['): 'name'})
+        df = df[df['ons_code'].notna()]
+        frames.append(df.assign(year=int(year)))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _mileage_array(mileage: pd.DataFrame, years: pd.Index) -> np.ndarray:
+    # (year x fuel) annual miles from the cars/vans average mileage table, as prep_mm prepares it.
+    df = mileage.copy()
+    df['fuelType'] = df['fuelType'].replace({'Pure electric': 'Electric'})
+    df = prep_mm(df)
+    df.index = df.index.year
+    return df.reindex(years)[['Diesel_miles', 'Petrol_miles', 'Electric_miles']].to_numpy(dtype=float)
+
+
+def emissions_panel(parc: pd.DataFrame,
+                    fuel: pd.DataFrame,
+                    mileage: pd.DataFrame,
+                    body_type: str = 'Cars',
+                    consumption_columns=None,
+                    emission_factors=EMISSION_FACTORS_2022,
+                    toe_per_tonne=TOE_PER_TONNE) -> pd.DataFrame:
+    """
+    VMT, implied MPG and emissions for every geography present in both parc and fuel.
+    Args:
+        parc (pd.DataFrame): load_parc_panel output.
+        fuel (pd.DataFrame): load_fuel_panel output.
+        mileage (pd.DataFrame): Annual mileage per fuelType and year (shared by all geographies), or the
+            same with an ons_code column for geography-specific mileage.
+        body_type (str): BodyType in the parc; selects the consumption columns.
+        consumption_columns: Diesel and petrol consumption columns, if body_type is not in CONSUMPTION_COLUMNS.
+        emission_factors: kgCO2e per kWh, diesel and petrol.
+        toe_per_tonne: Diesel and petrol factors used to convert ktoe to litres.
+    Returns:
+        pd.DataFrame: One row per geography, year and fuel (TIDY_COLUMNS). Electric rows have no
+        fuel consumption, economy or emissions.
+    """
+    consumption_columns = consumption_columns or CONSUMPTION_COLUMNS[body_type]
+    stock = parc[(parc['BodyType'] == body_type) & parc['Fuel'].isin(PANEL_FUELS)]
+    # Year-end parc, i.e. the last quarter of each year (resample('Y').last() in the notebooks).
+    stock = stock.assign(year=stock['date'].dt.year).sort_values('date')
+    stock = stock.groupby(['ons_code', 'year', 'Fuel'], observed=True)['value'].last()
+
+    codes = pd.Index(sorted(set(stock.index.get_level_values('ons_code')) & set(fuel['ons_code'])), name='ons_code')
+    years = pd.Index(sorted(set(stock.index.get_level_values('year')) & set(fuel['year'])), name='year')
+    full = pd.MultiIndex.from_product([codes, years, PANEL_FUELS], names=['ons_code', 'year', 'Fuel'])
+    n_geo, n_year, n_fuel = len(codes), len(years), len(PANEL_FUELS)
+    vehicles = stock.reindex(full).to_numpy(dtype=float).reshape(n_geo, n_year, n_fuel)
+
+    if 'ons_code' in mileage.columns:
+        miles = np.stack([_mileage_array(mileage[mileage['ons_code'] == code].drop(columns='ons_code'), years)
+                          for code in codes])
+    else:
+        miles = _mileage_array(mileage, years)[None]  # broadcast over geographies
+    vmt = vehicles * miles
+
+    consumption = (fuel.drop_duplicates(['ons_code', 'year']).set_index(['ons_code', 'year'])[consumption_columns]
+                       .reindex(pd.MultiIndex.from_product([codes, years])).to_numpy(dtype=float)
+                       .reshape(n_geo, n_year, 2))
+    gallons = ((1000*consumption)/np.asarray(toe_per_tonne)) * LITRES_TO_GALLONS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        economy = vmt[..., :2] / gallons
+    emissions = ((1000*consumption)*KWH_PER_TOE)*np.asarray(emission_factors)
+
+    # Electric has no liquid fuel: pad the (diesel, petrol) arrays with NaN on the fuel axis.
+    pad = np.full((n_geo, n_year, 1), np.nan)
+    names = fuel.drop_duplicates('ons_code').set_index('ons_code')['name']
+    return pd.DataFrame({
+        'ons_code': np.repeat(codes, n_year * n_fuel),
+        'name': np.repeat(names.reindex(codes).to_numpy(), n_year * n_fuel),
+        'year': np.tile(np.repeat(years, n_fuel), n_geo),
+        'fuel': np.tile(PANEL_FUELS, n_geo * n_year),
+        'parc': vehicles.ravel(),
+        'annual_mileage': np.broadcast_to(miles, vehicles.shape).ravel(),
+        'vmt': vmt.ravel(),
+        'consumption_ktoe': np.concatenate([consumption, pad], axis=2).ravel(),
+        'consumption_gallons': np.concatenate([gallons, pad], axis=2).ravel(),
+        'economy_mpg': np.concatenate([economy, pad], axis=2).ravel(),
+        'emissions_kgCO2e': np.concatenate([emissions, pad], axis=2).ravel(),
+    }, columns=TIDY_COLUMNS)
+
+
+class RegionalEmissions:
+    """
+    Tidy all-geography model output with lookups by ONS code.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+
+        self.df = df.sort_values(['ons_code', 'year', 'fuel']).reset_index(drop=True)
+        # Row range of each geography, for lookups without scanning the table.
+        bounds = self.df.groupby('ons_code', sort=False).indices
+        self._rows = {code: (rows[0], rows[-1] + 1) for code, rows in bounds.items()}
+        return
+
+    @classmethod
+    def from_panels(cls, parc, fuel, mileage, **kwargs):
+
+        return cls(emissions_panel(parc, fuel, mileage, **kwargs))
+
+    @classmethod
+    def load(cls, path='data/regional_emissions.parquet'):
+
+        return cls(pd.read_parquet(path))
+
+    def save(self, path='data/regional_emissions.parquet'):
+
+        self.df.to_parquet(path, index=False)
+        return path
+
+    def codes(self) -> pd.DataFrame:
+        """
+        ONS codes and names of the geographies in the table.
+        """
+        return self.df.drop_duplicates('ons_code')[['ons_code', 'name']].reset_index(drop=True)
+
+    def find(self, name: str) -> pd.DataFrame:
+        """
+        Geographies whose name contains name (case-insensitive).
+        """
+        codes = self.codes()
+        return codes[codes['name'].str.contains(name, case=False, na=False, regex=False)]
+
+    def lookup(self, ons_code, fuel=None, years=None) -> pd.DataFrame:
+        """
+        Tidy rows for one ONS code or a list of them, optionally restricted to fuels and years.
+        """
+        codes = [ons_code] if isinstance(ons_code, str) else list(ons_code)
+        missing = [code for code in codes if code not in self._rows]
+        if missing:
+            raise KeyError(f'ONS code(s) not in the model: {missing}')
+        df = pd.concat([self.df.iloc[slice(*self._rows[code])] for code in codes])
+        if fuel is not None:
+            df = df[df['fuel'].isin([fuel] if isinstance(fuel, str) else fuel)]
+        if years is not None:
+            df = df[df['year'].isin(years)]
+        return df.reset_index(drop=True)
+
+    def wide(self, ons_code: str) -> pd.DataFrame:
+        """
+        One geography in the layout the scenario notebooks build (diesel_vmt, petrol_economy,
+        diesel_emissions, total_kgCO2e_calc, ...), indexed by year-end date.
+        """
+        df = self.lookup(ons_code)
+        out = df.pivot(index='year', columns='fuel', values='parc')[PANEL_FUELS]
+        prefix = {'Diesel': 'diesel', 'Petrol': 'petrol', 'Pure Electric': 'electric'}
+        for fuel, name in prefix.items():
+            rows = df[df['fuel'] == fuel].set_index('year')
+            out[f'{name}_vmt'] = rows['vmt']
+            if fuel != 'Pure Electric':
+                out[f'{name}_consumption_gallons'] = rows['consumption_gallons']
+                out[f'{name}_economy'] = rows['economy_mpg']
+                out[f'{name}_emissions'] = rows['emissions_kgCO2e']
+        out['total_kgCO2e_calc'] = out['diesel_emissions'] + out['petrol_emissions']
+        out.index = pd.to_datetime(out.index.astype(str), format='%Y') + pd.offsets.YearEnd(0)
+        out.columns.name = None
+        return out
+
+    def totals(self, by=('ons_code', 'name', 'year')) -> pd.DataFrame:
+        """
+        VMT and emissions summed over fuels (or any other grouping of the tidy table).
+        """
+        return self.df.groupby(list(by), as_index=False)[['parc', 'vmt', 'emissions_kgCO2e']].sum(min_count=1)
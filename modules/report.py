@@ -0,0 +1,304 @@
+"""
+Headless, incremental renderer for the tracker charts.
+
+Charts are declared as specs: a plotting function plus its input files (or
+frames), parameters, figure size and output path. render() draws them in worker
+processes on the Agg backend with the design.pkl style and saves them with the
+notebooks' savefig settings. Every chart gets a key hashing its function's code,
+its parameters, the content of its inputs and the style; charts whose key and
+output file are unchanged since the last run are skipped. The keys, outputs and
+timings are written to a manifest.json next to the plots.
+
+Example (05.03 Car Compliance Tracker Visualisations):
+    report = Report()
+
+    @report.chart(inputs={'df': 'ZEV_compliance_tracker.csv'}, read_kwargs={'index_col': 0}, figsize=(20, 9))
+    def how_s1(ax, df):
+        df.plot(x='Make', y='Total Sales', kind='bar', ax=ax)
+        ax.set_ylabel('Total Car Sales')
+
+    @report.chart(output='plots/makes/{make}.png', each={'make': makes}, inputs={'df': 'ZEV_compliance_tracker.csv'})
+    def make_surplus(ax, df, make):
+        ...
+
+    report.render(workers=8)
+
+Plot functions take the axes (or array of axes with subplots=...) as first argument, then the inputs and
+parameters by name. They must be importable or defined before render() is called (workers are forked).
+"""
+# Packages
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+# Modules
+from .pipeline import _code_hash, _hash_value
+from .workbooks import file_hash
+
+
+STYLE_FILE = 'design.pkl'
+PLOTS_DIR = 'plots'
+SAVEFIG_KWARGS = {'transparent': False, 'bbox_inches': 'tight', 'dpi': 300, 'facecolor': 'white'}
+
+
+def _read_input(path, read_kwargs):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return pd.read_parquet(path, **read_kwargs)
+    if ext in ('.pkl', '.pickle'):
+        return pd.read_pickle(path, **read_kwargs)
+    if ext in ('.xlsx', '.xls'):
+        return pd.read_excel(path, **read_kwargs)
+    return pd.read_csv(path, **read_kwargs)
+
+
+class Chart:
+    """
+    One figure of a Report. See Report.chart.
+    """
+
+    def __init__(self, name, func, output, inputs=None, read_kwargs=None, params=None, figsize=(20, 9),
+                 subplots=None, savefig=None):
+
+        self.name = name
+        self.func = func
+        self.output = output
+        self.inputs = dict(inputs or {})
+        self.read_kwargs = dict(read_kwargs or {})
+        self.params = dict(params or {})
+        self.figsize = figsize
+        self.subplots = dict(subplots or {})
+        self.savefig = {**SAVEFIG_KWARGS, **(savefig or {})}
+        self.code_hash = _code_hash(func)
+        return
+
+    def __repr__(self):
+        return f'Chart({self.name!r}, output={self.output!r})'
+
+    def input_hashes(self) -> dict:
+
+        return {name: file_hash(value) if isinstance(value, str) else _hash_value(value)
+                for name, value in self.inputs.items()}
+
+    def key(self, style_hash) -> str:
+
+        return _hash_value({
+            'code': self.code_hash,
+            'inputs': self.input_hashes(),
+            'read_kwargs': self.read_kwargs,
+            'params': {k: _hash_value(v) for k, v in self.params.items()},
+            'figsize': self.figsize,
+            'subplots': self.subplots,
+            'savefig': self.savefig,
+            'style': style_hash,
+        })
+
+
+# Per worker process: the style is applied once, input files are read once per content hash.
+_worker_inputs = {}
+
+
+def _init_worker(style):
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.rcParams.update(style)
+
+
+def _render(chart, hashes):
+
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    data = {}
+    for name, value in chart.inputs.items():
+        if isinstance(value, str):
+            cache_key = (value, hashes[name], json.dumps(chart.read_kwargs, sort_keys=True, default=repr))
+            if cache_key not in _worker_inputs:
+                _worker_inputs[cache_key] = _read_input(value, chart.read_kwargs)
+            # Plot functions may modify their frame; each chart gets its own copy.
+            value = _worker_inputs[cache_key].copy()
+        data[name] = value
+
+    fig, ax = plt.subplots(figsize=chart.figsize, **chart.subplots)
+    try:
+        chart.func(ax, **data, **chart.params)
+        os.makedirs(os.path.dirname(chart.output) or '.', exist_ok=True)
+        fig.savefig(chart.output, **chart.savefig)
+    finally:
+        plt.close(fig)
+    return {'seconds': time.perf_counter() - start, 'bytes': os.path.getsize(chart.output)}
+
+
+class Report:
+    """
+    Set of chart specs rendered incrementally into out_dir, with a manifest.json of what was rendered.
+    """
+
+    def __init__(self, out_dir=PLOTS_DIR, style=STYLE_FILE, manifest=None, workers=4, rc=None):
+        """
+        Args:
+            out_dir (str): Default folder of the outputs ({name}.png).
+            style: Path of the pickled rcParams (design.pkl), a dict of rcParams, or None.
+            manifest (str): Manifest path (default out_dir/manifest.json).
+            workers (int): Worker processes for render().
+            rc (dict): rcParams applied on top of the style.
+        """
+        self.out_dir = out_dir
+        self.manifest_path = manifest or os.path.join(out_dir, 'manifest.json')
+        self.workers = workers
+        self.charts = {}
+        if isinstance(style, str):
+            with open(style, 'rb') as f:
+                self.style = pickle.load(f)
+            self.style_hash = file_hash(style)
+        else:
+            self.style = dict(style or {})
+            self.style_hash = _hash_value({k: repr(v) for k, v in self.style.items()})
+        if rc:
+            self.style.update(rc)
+            self.style_hash = _hash_value([self.style_hash, {k: repr(v) for k, v in rc.items()}])
+        return
+
+    def chart(self, name=None, output=None, each=None, **kwargs):
+        """
+        Decorator registering a plot function as one chart, or one chart per value with each={'param': values}
+        (output and name are then formatted with the value, e.g. output='plots/makes/{make}.png').
+        Other arguments are those of Chart: inputs (name -> file path or DataFrame), read_kwargs, params,
+        figsize, subplots (passed to plt.subplots), savefig (overrides of SAVEFIG_KWARGS).
+        """
+        def decorator(func):
+            base = name or func.__name__
+            if not each:
+                self.add(Chart(base, func, output or os.path.join(self.out_dir, f'{base}.png'), **kwargs))
+                return func
+            (param, values), = each.items()
+            for value in values:
+                fields = {param: value}
+                params = {**kwargs.get('params', {}), param: value}
+                chart_name = f'{base}[{value}]'
+                path = (output or os.path.join(self.out_dir, base, f'{{{param}}}.png')).format(**fields)
+                self.add(Chart(chart_name, func, path, **{**kwargs, 'params': params}))
+            return func
+        return decorator
+
+    def add(self, chart: Chart):
+
+        if chart.name in self.charts:
+            raise ValueError(f'Chart {chart.name} is already defined.')
+        self.charts[chart.name] = chart
+        return chart
+
+    def manifest(self) -> dict:
+
+        if not os.path.isfile(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def plan(self, only=None, force=False) -> dict:
+        """
+        Key of each selected chart and whether it needs rendering ('stale', 'missing', 'new', 'forced' or 'fresh').
+        """
+        previous = self.manifest().get('charts', {})
+        plan = {}
+        for name in only or self.charts:
+            chart = self.charts[name]
+            key = chart.key(self.style_hash)
+            entry = previous.get(name)
+            if force:
+                state = 'forced'
+            elif entry is None:
+                state = 'new'
+            elif not os.path.isfile(chart.output):
+                state = 'missing'
+            elif entry['key'] != key or entry['output'] != chart.output:
+                state = 'stale'
+            else:
+                state = 'fresh'
+            plan[name] = {'key': key, 'state': state}
+        return plan
+
+    def status(self, only=None) -> pd.DataFrame:
+
+        plan = self.plan(only)
+        return pd.DataFrame([{'chart': name, 'output': self.charts[name].output, **p} for name, p in plan.items()])
+
+    def render(self, only=None, force=False, workers=None) -> dict:
+        """
+        Render the charts that changed (all of them with force=True) and update the manifest.
+        Returns the manifest entries of the charts rendered in this run; failures are reported
+        and left out of the manifest so they are retried next time.
+        """
+        plan = self.plan(only, force)
+        todo = [name for name, p in plan.items() if p['state'] != 'fresh']
+        manifest = self.manifest()
+        entries = manifest.get('charts', {})
+        rendered, failed = {}, {}
+        start = time.perf_counter()
+
+        def record(name, result):
+            chart = self.charts[name]
+            rendered[name] = entries[name] = {
+                'output': chart.output,
+                'key': plan[name]['key'],
+                'inputs': {k: v if isinstance(v, str) else '<frame>' for k, v in chart.inputs.items()},
+                'input_hashes': hashes[name],
+                'rendered': datetime.now().isoformat(timespec='seconds'),
+                **result,
+            }
+
+        hashes = {name: self.charts[name].input_hashes() for name in todo}
+        workers = workers or self.workers
+        if workers and workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.style,)) as executor:
+                futures = {executor.submit(_render, self.charts[name], hashes[name]): name for name in todo}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        record(name, future.result())
+                    except Exception as e:
+                        failed[name] = repr(e)
+        else:
+            import matplotlib
+            import matplotlib.pyplot as plt
+            backend = matplotlib.get_backend()
+            plt.switch_backend('Agg')
+            try:
+                with plt.rc_context(self.style):
+                    for name in todo:
+                        try:
+                            record(name, _render(self.charts[name], hashes[name]))
+                        except Exception as e:
+                            failed[name] = repr(e)
+            finally:
+                plt.switch_backend(backend)
+                _worker_inputs.clear()
+
+        for name in failed:
+            entries.pop(name, None)
+        manifest.update({
+            'charts': entries,
+            'style': self.style_hash,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        })
+        self._write_manifest(manifest)
+        print(f'Rendered {len(rendered)} charts, skipped {len(plan) - len(todo)} unchanged, '
+              f'{len(failed)} failed in {time.perf_counter() - start:.1f}s.')
+        for name, error in failed.items():
+            print(f'FAILED {name}: {error}')
+        return rendered
@@ -1,41 +1,157 @@
 import random
+import threading
+import time
 import requests
 from bs4 import BeautifulSoup as bs
+from concurrent.futures import ThreadPoolExecutor
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:80.0) Gecko/20100101 Firefox/80.0'}
+
+
+def parse_proxy_list(content, anonymity='elite proxy'):
+    """
+    Extract ip:port of every proxy with the given anonymity from the free-proxy-list table.
+    """
+    soup = bs(content, 'html.parser')
+    table = soup.find('tbody')
+    proxies = []
+    if table is None:
+        return proxies
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) > 4 and cells[4].text == anonymity:
+            proxies.append(':'.join([cells[0].text, cells[1].text]))
+    return proxies
+
 
 class rotatingIP:
 
-    def __init__(self):
+    def __init__(self,
+                 ip_list_website = 'https://free-proxy-list.net/',
+                 check_website = 'https://ipinfo.io/json'):
+
+        self.ip_list_website = ip_list_website
+        self.check_website = check_website
+        return
+
+    def get_proxy(self):
+
+        r = requests.get(self.ip_list_website)
+        proxies = parse_proxy_list(r.content)
+        return random.choice(proxies)
+
+
+    def check_proxy(self,proxy,timeout=5):
+        # Route both schemes through the proxy: check_website is https, so an 'http'-only mapping bypassed it.
+        url = proxy if '://' in proxy else 'http://' + proxy
+        proxies = {'http':url,'https':url}
+
+        with requests.session() as session:
+            session.proxies.update(proxies)
+            session.headers.update(HEADERS)
+            try:
+                r = session.get(self.check_website,timeout=timeout )
+                return r.ok
+            except:
+                return False
+
+
+class ProxyPool(rotatingIP):
+    """
+    Proxy list parsed once and cached for ttl seconds, candidates health-checked concurrently,
+    and the fastest healthy proxies handed out in rotation.
+
+    pool = ProxyPool()
+    proxy = pool.get_proxy()
+    ...
+    pool.report(proxy, ok=False)  # after a failed request, so it drops down the ranking
+    """
+
+    def __init__(self,
+                 ip_list_website = 'https://free-proxy-list.net/',
+                 check_website = 'https://ipinfo.io/json',
+                 ttl = 600,
+                 check_timeout = 5,
+                 workers = 32,
+                 max_candidates = 100,
+                 top_n = 10):
+
+        super().__init__(ip_list_website=ip_list_website, check_website=check_website)
+        self.ttl = ttl
+        self.check_timeout = check_timeout
+        self.workers = workers
+        self.max_candidates = max_candidates
+        self.top_n = top_n
+        self.candidates = []
+        self.fetched_at = 0
+        self.scores = {}  # proxy -> {'latency': EWMA seconds, 'ok': n, 'fail': n}
+        self.healthy = []
+        self.position = 0
+        self.lock = threading.Lock()
+        return
+
+    def refresh_candidates(self, force=False):
+        """
+        Download and parse the proxy list, unless the cached one is younger than ttl.
+        """
+        if not force and self.candidates and time.time() - self.fetched_at < self.ttl:
+            return self.candidates
+        r = requests.get(self.ip_list_website, headers=HEADERS, timeout=self.check_timeout)
+        self.candidates = parse_proxy_list(r.content)
+        self.fetched_at = time.time()
+        return self.candidates
+
+    def _timed_check(self, proxy):
+        start = time.perf_counter()
+        ok = self.check_proxy(proxy, timeout=self.check_timeout)
+        return proxy, ok, time.perf_counter() - start
+
+    def report(self, proxy, ok, latency=None):
+        """
+        Record the outcome of a request made through a proxy.
+        """
+        with self.lock:
+            score = self.scores.setdefault(proxy, {'latency': None, 'ok': 0, 'fail': 0})
+            score['ok' if ok else 'fail'] += 1
+            if ok and latency is not None:
+                score['latency'] = latency if score['latency'] is None else .7 * score['latency'] + .3 * latency
+            if not ok and proxy in self.healthy:
+                self.healthy.remove(proxy)
+        return
+
+    def success_rate(self, proxy):
+        score = self.scores.get(proxy)
+        if not score or not (score['ok'] + score['fail']):
+            return 0
+        return score['ok'] / (score['ok'] + score['fail'])
 
-        self.ip_list_website = 'https://free-proxy-list.net/'
-        self.check_website = 'https://ipinfo.io/json'
-        return 
+    def check_all(self, proxies=None):
+        """
+        Health-check candidates concurrently and rank the healthy ones by latency and success rate.
+        """
+        proxies = proxies if proxies is not None else self.refresh_candidates()[:self.max_candidates]
+        if not proxies:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(proxies))) as executor:
+            for proxy, ok, latency in executor.map(self._timed_check, proxies):
+                self.report(proxy, ok, latency)
+        ranked = [p for p in dict.fromkeys(proxies) if self.scores[p]['latency'] is not None and self.success_rate(p) >= .5]
+        ranked.sort(key=lambda p: self.scores[p]['latency'] / self.success_rate(p))
+        with self.lock:
+            self.healthy = ranked[:self.top_n]
+            self.position = 0
+        return self.healthy
 
     def get_proxy(self):
-        while(True):
-
-            r = requests.get(self.ip_list_website)
-            soup = bs(r.content, 'html.parser')
-            table = soup.find('tbody')
-            proxies = []
-            for row in table:
-                if row.find_all('td')[4].text =='elite proxy':
-                    proxy = ':'.join([row.find_all('td')[0].text, row.find_all('td')[1].text])
-                    proxies.append(proxy)
-                else:
-                    pass
-            proxy = random.choice(proxies)
-            return proxy
-
-                
-    def check_proxy(self,proxy):
-        proxies = {'http':proxy}
-        headers ={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:80.0) Gecko/20100101 Firefox/80.0'}
-        
-        session = requests.session()
-        session.proxies.update(proxies)
-        session.headers.update(headers)
-        try:
-            r = session.get(self.check_website,timeout=5 )
-            return r.ok
-        except:
-            return False
\ No newline at end of file
+        """
+        Next proxy in rotation among the fastest healthy ones, re-checking when none are left
+        or the proxy list has expired.
+        """
+        if not self.healthy or time.time() - self.fetched_at >= self.ttl:
+            self.check_all()
+        with self.lock:
+            if not self.healthy:
+                raise RuntimeError('No healthy proxy found.')
+            proxy = self.healthy[self.position % len(self.healthy)]
+            self.position += 1
+        return proxy
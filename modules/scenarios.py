@@ -0,0 +1,286 @@
+"""
+Batched fleet stock-flow scenario engine.
+
+Vectorised version of the year-by-year projection in ``02) UK Van Scenarios``:
+new sales are split by the ZEV mandate and the diesel share of ICE sales, every
+registration cohort (historical and projected) is retired according to a
+lifespan distribution, and the parc, VMT, fuel and emissions are computed for
+N parameter sets at once as (scenario x year x cohort x fuel) arrays.
+"""
+# Packages
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules
+
+
+FUELS = ["diesel", "petrol", "electric"]
+
+# Conversion factors used in the scenario notebooks.
+LITRES_TO_GALLONS = 219.969
+TOE_PER_TONNE = np.array([.98, .86])  # diesel, petrol
+KWH_PER_TOE = 11629.9998357937
+EMISSION_FACTORS_2021 = np.array([.23686, .22980])  # kgCO2e per kWh, diesel, petrol
+EMISSION_FACTORS_2022 = np.array([.24115, .22719])
+
+# DfT trajectory from 2023, with no percentage target in the first year.
+ZEV_MANDATE_VANS = [.15, .22, .28, .33, .38, .52, .66, .80, .84, .88, .92, .96, 1]
+
+_PER_SCENARIO = ["mandate", "lifespan_pmf", "base_sales", "growth", "diesel_share_of_ice",
+                 "mileage", "mpg", "emission_factors", "parc0", "hist_registrations"]
+
+
+def lifespan_pmf(lifespan, max_age: int = None) -> np.ndarray:
+    """
+    One-hot lifespan distribution(s) reproducing the notebook's fixed retirement shift.
+    Args:
+        lifespan: Scalar or 1-d array of integer lifespans in years (e.g. car_lifespan = 20).
+        max_age (int): Length of the age axis, defaults to max(lifespan) + 1.
+    Returns:
+        np.ndarray: Array of shape (n_scenarios, max_age) with probability 1 at each lifespan.
+    """
+    lifespan = np.atleast_1d(np.asarray(lifespan, dtype=int))
+    max_age = max_age or int(lifespan.max()) + 1
+    pmf = np.zeros((len(lifespan), max_age))
+    pmf[np.arange(len(lifespan)), lifespan] = 1
+    return pmf
+
+
+def mandate_trajectory(mandate, n_years: int) -> np.ndarray:
+    """
+    Pad (or truncate) mandate trajectories to n_years, holding at 100% after the last value.
+    Args:
+        mandate: 1-d trajectory or 2-d (n_scenarios, n) array of ZEV shares.
+        n_years (int): Number of projected years.
+    Returns:
+        np.ndarray: Array of shape (n_scenarios, n_years).
+    """
+    mandate = np.atleast_2d(np.asarray(mandate, dtype=float))
+    out = np.ones((mandate.shape[0], n_years))
+    n = min(n_years, mandate.shape[1])
+    out[:, :n] = mandate[:, :n]
+    return out
+
+
+def _prepare(n_years: int, **params) -> dict:
+    """
+    Broadcast every parameter to a leading scenario axis so the batch can be sliced.
+    """
+    params["mandate"] = mandate_trajectory(params["mandate"], n_years)
+    pmf = np.asarray(params["lifespan_pmf"], dtype=float)
+    params["lifespan_pmf"] = pmf if pmf.ndim == 2 else lifespan_pmf(pmf)
+    shapes = {
+        "mandate": (n_years,),
+        "lifespan_pmf": (params["lifespan_pmf"].shape[-1],),
+        "base_sales": (),
+        "growth": (),
+        "diesel_share_of_ice": (),
+        "mileage": (len(FUELS),),
+        "mpg": (2,),
+        "emission_factors": (2,),
+        "parc0": (len(FUELS),),
+        "hist_registrations": np.shape(params["hist_registrations"])[-2:],
+    }
+    arrays = {key: np.asarray(params[key], dtype=float) for key in _PER_SCENARIO}
+    n_scenarios = max(a.shape[0] if a.ndim > len(shapes[k]) else 1 for k, a in arrays.items())
+    return {key: np.broadcast_to(a.reshape((-1,) + shapes[key]) if a.ndim > len(shapes[key]) else a, (n_scenarios,) + shapes[key])
+            for key, a in arrays.items()}
+
+
+def _project(round_each_step: bool = True, calibrate=(True, True, False), **batch) -> dict:
+    """
+    Run the stock-flow model on an already prepared batch of scenarios.
+    """
+    mandate = batch["mandate"]
+    n_scenarios, n_years = mandate.shape
+    hist = batch["hist_registrations"]
+    n_hist = hist.shape[1]
+
+    # New registrations (scenario x year x fuel).
+    years = np.arange(1, n_years + 1)
+    total_sales = batch["base_sales"][:, None] * batch["growth"][:, None] ** years
+    new_electric = mandate * total_sales
+    ice = total_sales - new_electric
+    new_diesel = ice * batch["diesel_share_of_ice"][:, None]
+    new = np.stack([new_diesel, ice - new_diesel, new_electric], axis=-1)
+
+    # Retirements: every cohort (historical + projected) against the lifespan distribution.
+    regs = np.concatenate([hist, new], axis=1)
+    pmf = batch["lifespan_pmf"]
+    max_age = pmf.shape[1]
+    age = np.arange(n_years)[:, None] + n_hist - np.arange(n_hist + n_years)[None, :]
+    valid = (age >= 0) & (age < max_age)
+    weights = np.where(valid, pmf[:, np.clip(age, 0, max_age - 1)], 0)
+    retirements = np.einsum("syc,scf->syf", weights, regs)
+
+    # Scale retirements so that everything in the parc (plus new sales) eventually retires,
+    # as the notebook does for petrol and diesel.
+    survival = np.concatenate([pmf[:, ::-1].cumsum(axis=1)[:, ::-1], np.zeros((n_scenarios, 1))], axis=1)
+    cohort_age = np.clip(n_hist - np.arange(n_hist + n_years), 0, max_age)
+    denom = np.einsum("sc,scf->sf", survival[:, cohort_age], regs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = (batch["parc0"] + new.sum(axis=1)) / denom
+    factor = np.where(np.asarray(calibrate) & np.isfinite(factor), factor, 1)
+    retirements = retirements * factor[:, None, :]
+
+    net = retirements - new
+    if round_each_step:
+        stock = np.empty_like(net)
+        level = batch["parc0"].copy()
+        for y in range(n_years):
+            level = np.round(level - net[:, y])
+            stock[:, y] = level
+    else:
+        stock = batch["parc0"][:, None, :] - net.cumsum(axis=1)
+    parc = np.maximum(stock, 0)
+
+    vmt = parc * batch["mileage"][:, None, :]
+    gallons = vmt[..., :2] / batch["mpg"][:, None, :]
+    consumption = ((gallons / LITRES_TO_GALLONS) * TOE_PER_TONNE) / 1000
+    emissions = ((1000 * consumption) * KWH_PER_TOE) * batch["emission_factors"][:, None, :]
+
+    return {
+        "total_sales": total_sales,
+        "new_registrations": new,
+        "retirements": retirements,
+        "parc": parc,
+        "vmt": vmt,
+        "consumption_gallons": gallons,
+        "consumption": consumption,
+        "emissions": emissions,
+        "total_kgCO2e_calc": emissions.sum(axis=-1),
+    }
+
+
+def _project_chunk(args):
+    kwargs, batch = args
+    return _project(**kwargs, **batch)
+
+
+def run_scenarios(mandate,
+                  lifespan,
+                  base_sales,
+                  growth,
+                  diesel_share_of_ice,
+                  mileage,
+                  mpg,
+                  parc0,
+                  hist_registrations,
+                  emission_factors=EMISSION_FACTORS_2021,
+                  n_years: int = 28,
+                  round_each_step: bool = True,
+                  calibrate=(True, True, False),
+                  n_workers: int = None,
+                  chunk_size: int = 2000) -> dict:
+    """
+    Project the fleet for N scenarios at once.
+
+    Every parameter may be given once (shared by all scenarios) or with a leading
+    scenario axis of length N. Fuel axes follow FUELS (diesel, petrol, electric);
+    petrol/diesel-only parameters are ordered diesel, petrol.
+    Args:
+        mandate: ZEV share of new sales per projected year, (n,) or (N, n). Padded with 1.
+        lifespan: Integer lifespan(s) (N,) or a lifespan distribution (N, max_age) over ages.
+        base_sales: Annual sales before growth is applied, e.g. the mean of the last 5 years of ecc.
+        growth: Annual market growth multiplier (1 = flat).
+        diesel_share_of_ice: Diesel share of ICE sales.
+        mileage: Annual miles per vehicle, (3,) or (N, 3).
+        mpg: Miles per gallon, (2,) or (N, 2).
+        parc0: Parc at the start of the projection, (3,) or (N, 3).
+        hist_registrations: Historical registrations per year, (n_hist, 3) or (N, n_hist, 3),
+            ending the year before the projection starts.
+        emission_factors: kgCO2e per kWh for diesel and petrol.
+        n_years (int): Number of projected years (28 covers 2023-2050).
+        round_each_step (bool): Round the parc every year as the notebook does.
+        calibrate: Per fuel, whether to scale retirements so the whole parc eventually retires.
+        n_workers (int): If set and N > chunk_size, chunks are run in a process pool.
+        chunk_size (int): Scenarios per chunk.
+    Returns:
+        dict: Arrays with leading (N, n_years) axes; per-fuel outputs have a trailing fuel axis.
+    """
+    batch = _prepare(
+        n_years,
+        mandate=mandate,
+        lifespan_pmf=lifespan,
+        base_sales=base_sales,
+        growth=growth,
+        diesel_share_of_ice=diesel_share_of_ice,
+        mileage=mileage,
+        mpg=mpg,
+        emission_factors=emission_factors,
+        parc0=parc0,
+        hist_registrations=hist_registrations
+    )
+    kwargs = {"round_each_step": round_each_step, "calibrate": calibrate}
+    n_scenarios = batch["mandate"].shape[0]
+    chunks = [{key: value[i:i + chunk_size] for key, value in batch.items()} for i in range(0, n_scenarios, chunk_size)]
+
+    if n_workers and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_project_chunk, [(kwargs, chunk) for chunk in chunks]))
+    else:
+        results = [_project(**kwargs, **chunk) for chunk in chunks]
+    return {key: np.concatenate([r[key] for r in results], axis=0) for key in results[0]}
+
+
+def scenario_grid(**params) -> dict:
+    """
+    Cartesian product of parameter variants, ready to pass to run_scenarios.
+
+    Pop the 'index' entry before unpacking, e.g.
+    ``grid = scenario_grid(growth=[1, 1.01], lifespan=[15, 20]); index = grid.pop('index')``.
+    Args:
+        **params: Each value is a list of variants for that parameter.
+    Returns:
+        dict: Stacked parameters with a leading scenario axis, plus an 'index' DataFrame
+        recording which variant of each parameter every scenario uses.
+    """
+    keys = list(params)
+    index = pd.MultiIndex.from_product([range(len(params[k])) for k in keys], names=keys).to_frame(index=False)
+    out = {key: _stack_variants(key, [params[key][i] for i in index[key]]) for key in keys}
+    out["index"] = index
+    return out
+
+
+def _stack_variants(key: str, variants: list) -> np.ndarray:
+    """
+    Stack one parameter's variants along a new scenario axis. Mandate trajectories of different lengths
+    are first padded to the longest with mandate_trajectory (holding at 100%), as run_scenarios would.
+    """
+    arrays = [np.asarray(v, dtype=float) for v in variants]
+    if key == "mandate" and len({a.shape for a in arrays}) > 1:
+        n = max(np.atleast_1d(a).shape[-1] for a in arrays)
+        arrays = [mandate_trajectory(a, n)[0] for a in arrays]
+    if len({a.shape for a in arrays}) > 1:
+        raise ValueError(f"Variants of {key} have different shapes {sorted({a.shape for a in arrays})}.")
+    return np.stack(arrays)
+
+
+def to_frame(results: dict, start_year: int = 2023, scenario_index: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Flatten run_scenarios output to a tidy frame in the dfp column naming.
+    Args:
+        results (dict): Output of run_scenarios.
+        start_year (int): First projected year.
+        scenario_index (pd.DataFrame): Optional scenario_grid index to join on.
+    Returns:
+        pd.DataFrame: One row per scenario and year.
+    """
+    n_scenarios, n_years = results["total_sales"].shape
+    out = pd.DataFrame({
+        "scenario": np.repeat(np.arange(n_scenarios), n_years),
+        "year": np.tile(np.arange(start_year, start_year + n_years), n_scenarios),
+    })
+    for i, fuel in enumerate(FUELS):
+        out[f"new_{fuel}"] = results["new_registrations"][..., i].ravel()
+        out[fuel] = results["parc"][..., i].ravel()
+        out[f"{fuel}_vmt"] = results["vmt"][..., i].ravel()
+    for i, fuel in enumerate(FUELS[:2]):
+        out[f"{fuel}_consumption_gallons"] = results["consumption_gallons"][..., i].ravel()
+        out[f"{fuel}_consumption"] = results["consumption"][..., i].ravel()
+        out[f"{fuel}_emissions"] = results["emissions"][..., i].ravel()
+    out["total_kgCO2e_calc"] = results["total_kgCO2e_calc"].ravel()
+    if scenario_index is not None:
+        out = out.merge(scenario_index, how="left", left_on="scenario", right_index=True)
+    return out
@@ -0,0 +1,140 @@
+"""
+Running group-by aggregates over streamed record batches.
+
+Used with ``MyBigQuery.iter_bq_batches`` to aggregate results that do not fit in
+memory: each batch is reduced to per-group partial sums that are merged into
+the running total, so only one batch and the partials are held at a time.
+"""
+# Packages
+import numpy as np
+import pandas as pd
+
+# Modules
+
+
+# Partial statistics each aggregate needs, and how partials are combined.
+_PARTIALS = {
+    'sum': ['sum'],
+    'count': ['count'],
+    'min': ['min'],
+    'max': ['max'],
+    'mean': ['sum', 'count'],
+    'var': ['sum', 'count', 'sumsq'],
+    'std': ['sum', 'count', 'sumsq'],
+}
+_COMBINE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max', 'sumsq': 'sum'}
+
+
+def _to_pandas(batch) -> pd.DataFrame:
+    # Arrow RecordBatch/Table or DataFrame.
+    return batch if isinstance(batch, pd.DataFrame) else batch.to_pandas()
+
+
+class RunningAggregate:
+    """
+    Group-by aggregate folded one batch at a time.
+
+    Example:
+        agg = RunningAggregate(by=['make', 'fuelType'], aggs={'co2Emissions': ['mean', 'count']})
+        for batch in bq.iter_bq_batches(query):
+            agg.update(batch)
+        df = agg.result()
+    """
+
+    def __init__(self, by, aggs, size_col='n_rows'):
+
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.aggs = {col: [funcs] if isinstance(funcs, str) else list(funcs) for col, funcs in aggs.items()}
+        for col, funcs in self.aggs.items():
+            unknown = set(funcs) - set(_PARTIALS)
+            if unknown:
+                raise ValueError(f'Unsupported aggregate(s) {sorted(unknown)} for {col}; use {sorted(_PARTIALS)}.')
+        self.size_col = size_col
+        self.partial = None
+        self.rows = 0
+        return
+
+    def _partials(self, df):
+        out = {}
+        grouped = df.groupby(self.by, dropna=False, observed=True)
+        for col, funcs in self.aggs.items():
+            needed = {p for f in funcs for p in _PARTIALS[f]}
+            for p in sorted(needed):
+                if p == 'sumsq':
+                    out[(col, p)] = (df[col].astype(float) ** 2).groupby([df[b] for b in self.by], dropna=False, observed=True).sum()
+                else:
+                    out[(col, p)] = grouped[col].agg(p)
+        out[(self.size_col, 'count')] = grouped.size()
+        return pd.DataFrame(out)
+
+    def update(self, batch):
+        """
+        Fold one batch (DataFrame or Arrow batch/table) into the running aggregate.
+        """
+        df = _to_pandas(batch)
+        if df.empty:
+            return self
+        self.rows += len(df)
+        part = self._partials(df)
+        if self.partial is None:
+            self.partial = part
+        else:
+            combined = pd.concat([self.partial, part])
+            combine = {c: _COMBINE[c[1]] for c in combined.columns}
+            self.partial = combined.groupby(level=list(range(len(self.by))), dropna=False).agg(combine)
+        return self
+
+    def merge(self, other):
+        """
+        Merge a RunningAggregate built on another slice of the data (e.g. by a parallel worker).
+        """
+        if other.partial is not None:
+            if self.partial is None:
+                self.partial = other.partial.copy()
+            else:
+                combined = pd.concat([self.partial, other.partial])
+                combine = {c: _COMBINE[c[1]] for c in combined.columns}
+                self.partial = combined.groupby(level=list(range(len(self.by))), dropna=False).agg(combine)
+        self.rows += other.rows
+        return self
+
+    def result(self) -> pd.DataFrame:
+        """
+        Final aggregates, one column per '<col>_<agg>' plus the group size.
+        """
+        if self.partial is None:
+            return pd.DataFrame(columns=self.by + [f'{c}_{f}' for c, fs in self.aggs.items() for f in fs] + [self.size_col])
+        p = self.partial
+        out = pd.DataFrame(index=p.index)
+        for col, funcs in self.aggs.items():
+            for f in funcs:
+                if f in ('sum', 'count', 'min', 'max'):
+                    out[f'{col}_{f}'] = p[(col, f)]
+                    continue
+                n = p[(col, 'count')].astype(float)
+                mean = p[(col, 'sum')] / n.replace(0, np.nan)
+                if f == 'mean':
+                    out[f'{col}_{f}'] = mean
+                else:
+                    # Sample variance from the running sums (ddof=1, as pandas).
+                    var = (p[(col, 'sumsq')] - n * mean ** 2) / (n - 1).replace(0, np.nan)
+                    var = var.clip(lower=0)
+                    out[f'{col}_{f}'] = var if f == 'var' else np.sqrt(var)
+        out[self.size_col] = p[(self.size_col, 'count')]
+        return out.reset_index()
+
+
+def fold_batches(batches, by, aggs) -> pd.DataFrame:
+    """
+    Aggregate an iterable of batches in one call.
+    Args:
+        batches: Iterable of DataFrames or Arrow record batches.
+        by: Group-by column(s).
+        aggs (dict): {column: aggregate or list of aggregates} from sum, count, min, max, mean, var, std.
+    Returns:
+        pd.DataFrame: The aggregated result.
+    """
+    agg = RunningAggregate(by=by, aggs=aggs)
+    for batch in batches:
+        agg.update(batch)
+    return agg.result()
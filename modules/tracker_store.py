@@ -0,0 +1,148 @@
+"""
+Incremental store of per-make, per-month compliance partial sums.
+
+The compliance tracker needs rolling 12-month totals per make. Instead of
+rescanning ``VES_dataset.VRN_UK`` for the whole window on every run, this store
+keeps one row of partial sums (totalSales, zevSales, nonzevSales, co2Activity)
+per make and month, fetches only the months it has not seen yet, and derives
+every rolling window locally by adding and subtracting months.
+"""
+# Packages
+import os
+import numpy as np
+import pandas as pd
+
+# Modules
+from .compliance import compliance_tracker
+
+
+CAR_FILTER = "typeApproval = 'M1'"
+VAN_FILTER = "((typeApproval = 'N1') OR (typeApproval = 'N2' AND revenueWeight <= 4250 AND co2Emissions = 0))"
+SUMS = ['totalSales', 'nonzevSales', 'zevSales', 'co2Activity']
+
+_QUERY = """
+SELECT
+    make,
+    DATE_TRUNC(CAST(monthOfFirstRegistration AS DATE), MONTH) AS month,
+    COUNT(*) as totalSales,
+    COUNTIF(co2Emissions > 0) as nonzevSales,
+    COUNTIF(co2Emissions = 0) as zevSales,
+    SUM(co2Emissions) as co2Activity
+FROM VES_dataset.VRN_UK
+WHERE {where}
+AND CAST(monthOfFirstRegistration AS DATE) >= @start
+AND CAST(monthOfFirstRegistration AS DATE) < DATE_TRUNC(CURRENT_DATE(), MONTH)
+GROUP BY make, month
+"""
+
+
+class MonthlyAggregateStore:
+
+    def __init__(self,
+                 path='data/car_monthly_aggregates.parquet',
+                 where=CAR_FILTER,
+                 start='2020-04-01'
+                 ):
+
+        self.path = path
+        self.where = where
+        self.start = pd.Timestamp(start)
+        if(os.path.isfile(path)):
+            self.df = pd.read_parquet(path)
+        else:
+            # Typed columns: an all-object frame keeps the sums object dtype through concat in refresh().
+            self.df = pd.DataFrame({
+                'make': pd.Series(dtype=object),
+                'month': pd.Series(dtype='datetime64[ns]'),
+                **{col: pd.Series(dtype=float) for col in SUMS}
+            })
+        self.df['month'] = pd.to_datetime(self.df['month'])
+        return
+
+    def save(self):
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        self.df.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+        return
+
+    def refresh(self, bq, overlap_months=1):
+        """
+        Fetch only the months not yet in the store (plus the last overlap_months again, to pick up
+        late registrations) and save. Returns the number of rows fetched.
+        """
+        if(self.df.empty):
+            start = self.start
+        else:
+            start = self.df['month'].max() - pd.DateOffset(months=overlap_months - 1) if overlap_months else self.df['month'].max() + pd.DateOffset(months=1)
+        new = bq.from_bq_to_dataframe(
+            query=_QUERY.format(where=self.where),
+            params={'start': start.date()},
+            use_cache=False
+        )
+        new['month'] = pd.to_datetime(new['month'])
+        self.df = pd.concat([self.df[self.df['month'] < start], new], ignore_index=True)
+        self.df[SUMS] = self.df[SUMS].astype(float)
+        self.df = self.df.sort_values(['month', 'make']).reset_index(drop=True)
+        self.save()
+        print(f'Fetched {len(new)} make-month rows from {start:%Y-%m}; store covers {self.df.month.min():%Y-%m} to {self.df.month.max():%Y-%m}.')
+        return len(new)
+
+    def panel(self):
+        """
+        Partial sums as (month x make) arrays over a contiguous monthly range, missing months as 0.
+        Returns (months, makes, {sum name: array}).
+        """
+        months = pd.date_range(self.df['month'].min(), self.df['month'].max(), freq='MS')
+        makes = pd.Index(sorted(self.df['make'].unique()))
+        arrays = {}
+        for col in SUMS:
+            wide = self.df.pivot_table(index='month', columns='make', values=col, aggfunc='sum')
+            arrays[col] = wide.reindex(index=months, columns=makes).fillna(0).to_numpy(dtype=float)
+        return months, makes, arrays
+
+    def rolling(self, window=12, min_sales=2500, volume_filter='latest'):
+        """
+        Rolling window totals for every make and every window end month, from cumulative sums
+        (each window is the cumulative total at its end minus the one just before its start).
+        volume_filter='latest' keeps makes with more than min_sales in the latest window (as the tracker
+        query does); 'window' applies the threshold to each window separately.
+        """
+        months, makes, arrays = self.panel()
+        out = {}
+        for col, a in arrays.items():
+            c = np.vstack([np.zeros((1, a.shape[1])), a.cumsum(axis=0)])
+            out[col] = c[window:] - c[:-window]
+        ends = months[window - 1:]
+        df = pd.DataFrame({
+            'monthOfFirstRegistration': np.repeat(ends, len(makes)),
+            'make': np.tile(makes, len(ends)),
+            **{col: out[col].ravel() for col in SUMS}
+        })
+        df = df[df.totalSales > 0]
+        if(volume_filter == 'latest'):
+            latest = df[df.monthOfFirstRegistration == ends.max()]
+            df = df[df.make.isin(latest[latest.totalSales > min_sales].make)]
+        elif(min_sales):
+            df = df[df.totalSales > min_sales]
+        return df.reset_index(drop=True)
+
+    def targets(self, start='2021-01-01', end='2022-01-01'):
+        """
+        CO2 targets per make (mean co2Emissions of non-ZEV registrations over [start, end)), the
+        car_targets query computed from the stored partial sums.
+        """
+        sel = self.df[(self.df.month >= start) & (self.df.month < end)]
+        sums = sel.groupby('make')[['co2Activity', 'nonzevSales']].sum()
+        sums = sums[sums.nonzevSales > 0]
+        return (sums.co2Activity / sums.nonzevSales).rename('co2Target').reset_index()
+
+    def snapshots(self, window=12, min_sales=2500, volume_filter='latest', targets=None, **policy):
+        """
+        The tracker ledger for every historical window end month in one pass.
+        policy is passed on to compliance.compliance_tracker (mandate, conversion_factor, borrowing_cap).
+        """
+        targets = self.targets() if targets is None else targets
+        return compliance_tracker(self.rolling(window=window, min_sales=min_sales, volume_filter=volume_filter),
+                                  targets, **policy)
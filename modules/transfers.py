@@ -0,0 +1,270 @@
+"""
+Concurrent, checksum-aware transfers between a bucket and the local disk.
+
+Works with a ``google.cloud.storage`` bucket or with ``LocalBucket``, a
+directory-backed stand-in exposing the same blob interface for offline use.
+Downloads go to a ``.part`` file that is resumed if interrupted and only moved
+into place once its checksum matches; files whose MD5/CRC32C already match the
+remote object are skipped.
+"""
+# Packages
+import base64
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import google_crc32c
+import pandas as pd
+
+# Modules
+
+
+_CHUNK = 1 << 20
+
+
+def local_checksums(path: str) -> dict:
+    """
+    Base64 MD5 and CRC32C of a local file, in the format GCS reports them.
+    Args:
+        path (str): Local file.
+    Returns:
+        dict: {'md5_hash': str, 'crc32c': str}
+    """
+    md5 = hashlib.md5()
+    crc = google_crc32c.Checksum()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_CHUNK), b''):
+            md5.update(block)
+            crc.update(block)
+    return {
+        'md5_hash': base64.b64encode(md5.digest()).decode(),
+        'crc32c': base64.b64encode(crc.digest()).decode(),
+    }
+
+
+def matches(blob, path: str) -> bool:
+    """
+    True if the local file has the same content as the blob (MD5, or CRC32C for composite objects).
+    """
+    if not os.path.isfile(path) or (blob.size is not None and os.path.getsize(path) != blob.size):
+        return False
+    local = local_checksums(path)
+    if blob.md5_hash:
+        return local['md5_hash'] == blob.md5_hash
+    if blob.crc32c:
+        return local['crc32c'] == blob.crc32c
+    return False
+
+
+def download_blob(blob, path: str, skip_existing: bool = True) -> str:
+    """
+    Download one blob atomically, resuming a previous partial download if there is one.
+    Returns:
+        str: 'skipped', 'downloaded' or 'resumed'.
+    """
+    if skip_existing and matches(blob, path):
+        return 'skipped'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Named after the blob too, so two blobs can never share a partial file (and a resume finds its own).
+    part = f"{path}.{hashlib.md5(blob.name.encode()).hexdigest()[:8]}.part"
+    offset = os.path.getsize(part) if os.path.isfile(part) else 0
+    if blob.size is not None and offset > blob.size:
+        offset = 0
+    status = 'resumed' if offset else 'downloaded'
+    if blob.size is None or offset < blob.size:
+        with open(part, 'ab' if offset else 'wb') as f:
+            blob.download_to_file(f, start=offset or None)
+
+    if not matches(blob, part) and (blob.md5_hash or blob.crc32c):
+        # A corrupt partial file: start again from scratch once.
+        with open(part, 'wb') as f:
+            blob.download_to_file(f)
+        if not matches(blob, part):
+            os.remove(part)
+            raise IOError(f'Checksum mismatch downloading {blob.name}')
+        status = 'downloaded'
+    os.replace(part, path)
+    return status
+
+
+def download_many(blobs, local_path: str, workers: int = 8, skip_existing: bool = True, flat: bool = True) -> dict:
+    """
+    Download blobs in parallel.
+    Args:
+        blobs: Iterable of blobs.
+        local_path (str): Destination folder.
+        workers (int): Number of threads.
+        skip_existing (bool): Skip files whose checksum already matches.
+        flat (bool): Keep only the file name (as MyBucket.download_files does) instead of the full blob path.
+    Returns:
+        dict: {blob name: status}
+    Raises:
+        ValueError: With flat=True, if two blobs have the same file name.
+    """
+    targets = {}
+    for blob in blobs:
+        path = os.path.join(local_path, blob.name.split('/')[-1] if flat else blob.name)
+        if path in targets and targets[path].name != blob.name:
+            raise ValueError(f'{blob.name} and {targets[path].name} would both be downloaded to {path}; use flat=False.')
+        targets[path] = blob
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_blob, blob, path, skip_existing): blob.name
+            for path, blob in targets.items()
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def upload_file(bucket, path: str, blob_name: str, skip_existing: bool = True) -> str:
+    """
+    Upload one file unless the remote object already has the same content.
+    Returns:
+        str: 'skipped' or 'uploaded'.
+    """
+    if skip_existing:
+        remote = bucket.get_blob(blob_name)
+        if remote is not None and matches(remote, path):
+            return 'skipped'
+    blob = bucket.blob(blob_name)
+    # GCS only publishes the object once the upload completes; send the MD5 so corruption is rejected.
+    blob.md5_hash = local_checksums(path)['md5_hash']
+    blob.upload_from_filename(path)
+    return 'uploaded'
+
+
+def upload_many(bucket, paths, destination: str, workers: int = 8, skip_existing: bool = True) -> dict:
+    """
+    Upload local files in parallel under a destination prefix, each as destination/<file name>.
+    Returns:
+        dict: {blob name: status}
+    Raises:
+        ValueError: If two files have the same file name.
+    """
+    targets = {}
+    for path in paths:
+        blob_name = os.path.join(destination, os.path.basename(path))
+        if blob_name in targets and os.path.abspath(targets[blob_name]) != os.path.abspath(path):
+            raise ValueError(f'{path} and {targets[blob_name]} would both be uploaded to {blob_name}; '
+                             'upload them under different destinations.')
+        targets[blob_name] = path
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(upload_file, bucket, path, blob_name, skip_existing): blob_name
+            for blob_name, path in targets.items()
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def read_csv_stream(blob, chunksize=None, **kwargs):
+    """
+    Read a CSV blob straight from a streaming reader, without buffering the whole object first.
+    With chunksize, returns an iterator of DataFrames.
+    """
+    reader = blob.open('rb')
+    if chunksize:
+        def chunks():
+            with reader:
+                yield from pd.read_csv(reader, chunksize=chunksize, **kwargs)
+        return chunks()
+    with reader:
+        return pd.read_csv(reader, **kwargs)
+
+
+class LocalBlob:
+    """
+    File in a LocalBucket, with the subset of the google.cloud.storage.Blob interface used here.
+    """
+
+    def __init__(self, bucket, name):
+
+        self.bucket = bucket
+        self.name = name
+        self.md5_hash = None
+        self.crc32c = None
+        self.size = None
+        self.reload()
+        return
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, self.name)
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def reload(self):
+        if self.exists():
+            self.size = os.path.getsize(self.path)
+            checksums = local_checksums(self.path)
+            self.md5_hash = checksums['md5_hash']
+            self.crc32c = checksums['crc32c']
+
+    def download_to_file(self, file_obj, start=None, end=None):
+        with open(self.path, 'rb') as f:
+            f.seek(start or 0)
+            remaining = None if end is None else end - (start or 0) + 1
+            while remaining is None or remaining > 0:
+                block = f.read(_CHUNK if remaining is None else min(_CHUNK, remaining))
+                if not block:
+                    break
+                file_obj.write(block)
+                if remaining is not None:
+                    remaining -= len(block)
+
+    def download_to_filename(self, filename):
+        with open(filename, 'wb') as f:
+            self.download_to_file(f)
+
+    def download_as_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    download_as_string = download_as_bytes
+
+    def upload_from_filename(self, filename):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.uploading'
+        shutil.copyfile(filename, tmp)
+        os.replace(tmp, self.path)
+        self.reload()
+
+    def open(self, mode='rb'):
+        return open(self.path, mode)
+
+
+class LocalBucket:
+    """
+    Directory-backed stand-in for a google.cloud.storage.Bucket, e.g. MyBucket(bucket=LocalBucket('tmp/eu_csv')).
+    """
+
+    def __init__(self, root):
+
+        self.root = root
+        self.name = os.path.basename(os.path.normpath(root))
+        os.makedirs(root, exist_ok=True)
+        return
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name):
+        blob = LocalBlob(self, name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix=''):
+        prefix = prefix or ''
+        names = []
+        for folder, _, files in os.walk(self.root):
+            for file_name in files:
+                if file_name.endswith(('.part', '.uploading')):
+                    continue
+                name = os.path.relpath(os.path.join(folder, file_name), self.root).replace(os.sep, '/')
+                if name.startswith(prefix):
+                    names.append(name)
+        return iter([LocalBlob(self, name) for name in sorted(names)])
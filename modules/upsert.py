@@ -0,0 +1,223 @@
+"""
+Server-side upsert through a staging table.
+
+The incoming frame is loaded into a temporary staging table and merged into the
+target on the key columns by the database itself, so the existing keys never
+have to be pulled into pandas. Backends exist for BigQuery (MERGE) and for
+SQLite/DuckDB connections so the same logic can be exercised locally (the
+Google Cloud libraries are only imported by the BigQuery backend).
+"""
+# Packages
+import uuid
+import pandas as pd
+
+# Modules
+from .connector.query import number_literal
+
+
+def _literal(value) -> str:
+    number = number_literal(value)
+    if number is not None:
+        return number
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+        if value.endswith('T00:00:00'):
+            value = value[:-len('T00:00:00')]
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+class SQLBackend:
+    """
+    Generic backend for DB-API style connections (SQLite, DuckDB), using INSERT ... WHERE NOT EXISTS
+    and UPDATE ... FROM in place of MERGE.
+    """
+
+    def __init__(self, con):
+
+        self.con = con
+        return
+
+    def quote(self, name):
+        return '"{}"'.format(name)
+
+    def qualify(self, table):
+        return self.quote(table)
+
+    def key_equal(self, left, right):
+        return f'{left} IS NOT DISTINCT FROM {right}'
+
+    def literal(self, value):
+        # str() of a Timestamp matches how to_sql stores datetimes ('YYYY-MM-DD HH:MM:SS').
+        number = number_literal(value)
+        if number is not None:
+            return number
+        return "'{}'".format(str(value).replace("'", "''"))
+
+    def table_exists(self, table):
+        try:
+            self.execute(f'SELECT * FROM {self.qualify(table)} LIMIT 0')
+            return True
+        except Exception:
+            return False
+
+    def load(self, df, table, partition_column=None, job_config=None, schema_from=None):
+        df.to_sql(table, self.con, if_exists='replace', index=False)
+
+    def execute(self, sql):
+        self.con.execute(sql)
+        if hasattr(self.con, 'commit'):
+            self.con.commit()
+
+    def drop(self, table):
+        self.execute(f'DROP TABLE IF EXISTS {self.qualify(table)}')
+
+    def merge_sql(self, target, staging, keys, columns, update=False, partition_filter=None):
+        """
+        Statements inserting staging rows whose keys are not in target (and, with update=True,
+        overwriting the non-key columns of the rows that are).
+        """
+        t, s = self.qualify(target), self.qualify(staging)
+        match = ' AND '.join(self.key_equal(f'T.{self.quote(k)}', f'S.{self.quote(k)}') for k in keys)
+        if partition_filter:
+            match += f' AND {partition_filter}'
+        cols = ', '.join(self.quote(c) for c in columns)
+        statements = []
+        non_keys = [c for c in columns if c not in keys]
+        if update and non_keys:
+            assignments = ', '.join(f'{self.quote(c)} = S.{self.quote(c)}' for c in non_keys)
+            statements.append(f'UPDATE {t} AS T SET {assignments} FROM {s} AS S WHERE {match}')
+        statements.append(
+            f'INSERT INTO {t} ({cols}) SELECT {cols} FROM {s} AS S '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {t} AS T WHERE {match})'
+        )
+        return statements
+
+
+class SQLiteBackend(SQLBackend):
+
+    def key_equal(self, left, right):
+        return f'{left} IS {right}'
+
+
+class DuckDBBackend(SQLBackend):
+
+    def load(self, df, table, partition_column=None, job_config=None, schema_from=None):
+        name = f'_df_{uuid.uuid4().hex}'
+        self.con.register(name, df)
+        try:
+            self.con.execute(f'CREATE OR REPLACE TABLE {self.qualify(table)} AS SELECT * FROM {name}')
+        finally:
+            self.con.unregister(name)
+
+
+class BigQueryBackend(SQLBackend):
+
+    def __init__(self, bq, dataset_name='mots_uk'):
+
+        self.bq = bq
+        self.dataset_name = dataset_name
+        return
+
+    def quote(self, name):
+        return '`{}`'.format(name)
+
+    def qualify(self, table):
+        return f'`{self.bq.project_id}.{self.dataset_name}.{table}`'
+
+    def literal(self, value):
+        return _literal(value)
+
+    def table_exists(self, table):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bq.bq_client.get_table(f'{self.bq.project_id}.{self.dataset_name}.{table}')
+            return True
+        except NotFound:
+            return False
+
+    def load(self, df, table, partition_column=None, job_config=None, schema_from=None):
+        from google.cloud import bigquery
+
+        job_config = job_config or bigquery.LoadJobConfig()
+        job_config.write_disposition = 'WRITE_TRUNCATE'
+        if schema_from:
+            # Give the staging table the target's column types so the MERGE compares like with like.
+            target = self.bq.bq_client.get_table(f'{self.bq.project_id}.{self.dataset_name}.{schema_from}')
+            job_config.schema = [field for field in target.schema if field.name in df.columns]
+        if partition_column and job_config.time_partitioning is None:
+            job_config.time_partitioning = bigquery.TimePartitioning(field=partition_column)
+        table_ref = self.bq.bq_client.dataset(self.dataset_name).table(table)
+        self.bq.bq_client.load_table_from_dataframe(df, table_ref, job_config=job_config).result()
+
+    def execute(self, sql):
+        self.bq.bq_client.query(sql).result()
+
+    def drop(self, table):
+        self.bq.bq_client.delete_table(f'{self.bq.project_id}.{self.dataset_name}.{table}', not_found_ok=True)
+
+    def merge_sql(self, target, staging, keys, columns, update=False, partition_filter=None):
+        match = ' AND '.join(self.key_equal(f'T.{self.quote(k)}', f'S.{self.quote(k)}') for k in keys)
+        if partition_filter:
+            match += f' AND {partition_filter}'
+        cols = ', '.join(self.quote(c) for c in columns)
+        non_keys = [c for c in columns if c not in keys]
+        sql = f'MERGE {self.qualify(target)} T USING {self.qualify(staging)} S ON {match}\n'
+        if update and non_keys:
+            assignments = ', '.join(f'{self.quote(c)} = S.{self.quote(c)}' for c in non_keys)
+            sql += f'WHEN MATCHED THEN UPDATE SET {assignments}\n'
+        sql += f'WHEN NOT MATCHED THEN INSERT ({cols}) VALUES ({cols})'
+        return [sql]
+
+
+def merge_upsert(backend,
+                 table_name,
+                 df,
+                 unique_fields,
+                 update=False,
+                 batch_size=None,
+                 partition_column=None,
+                 job_config=None):
+    """
+    Upsert a DataFrame into a table on the database side.
+    1. if the table does not exist, it is created from df (partitioned on partition_column if given);
+    2. otherwise df is loaded into a staging table, batch_size rows at a time, and merged on unique_fields:
+       rows with new keys are inserted and, with update=True, existing rows get the incoming values.
+    With partition_column, batches are cut along that column. If partition_column is also one of
+    unique_fields, the merge only scans the target partitions between the batch's min and max values;
+    otherwise a key may already exist in any partition, so the whole target is matched.
+    Returns the number of rows sent.
+    """
+    if not backend.table_exists(table_name):
+        print("Table does not exist")
+        backend.load(df, table_name, partition_column=partition_column, job_config=job_config)
+        return len(df)
+
+    print("Table exixsts. Upserting ...")
+    if partition_column:
+        df = df.sort_values(partition_column, kind='stable')
+    if update:
+        # A target row can only be updated from one source row.
+        df = df.drop_duplicates(subset=unique_fields, keep='last')
+    batch_size = batch_size or max(len(df), 1)
+    columns = list(df.columns)
+
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        staging = f'_staging_{table_name}_{uuid.uuid4().hex[:12]}'
+        partition_filter = None
+        if partition_column in unique_fields:
+            lo, hi = batch[partition_column].min(), batch[partition_column].max()
+            if pd.notna(lo):
+                part = f'T.{backend.quote(partition_column)}'
+                partition_filter = f'{part} BETWEEN {backend.literal(lo)} AND {backend.literal(hi)}'
+                if batch[partition_column].isna().any():
+                    partition_filter = f'({partition_filter} OR {part} IS NULL)'
+        backend.load(batch, staging, schema_from=table_name)
+        try:
+            for sql in backend.merge_sql(table_name, staging, unique_fields, columns, update=update, partition_filter=partition_filter):
+                backend.execute(sql)
+        finally:
+            backend.drop(staging)
+        print(f"Merged rows {start}-{start + len(batch)} of {len(df)}")
+    return len(df)
@@ -0,0 +1,185 @@
+"""
+Content-addressed cache for the DfT/BEIS/NAEI source workbooks.
+
+Parsing ODS/XLSM sheets with ``pd.read_excel`` takes tens of seconds each. The
+first read of a sheet is converted to an Arrow IPC file keyed on the SHA-256 of
+the workbook and the parse options; later reads memory-map that file (a pickle
+is used when pyarrow is not installed or cannot hold the frame). When a new
+workbook is published under the same path its hash changes and the stale cache
+entries are removed.
+"""
+# Packages
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import pandas as pd
+
+# Modules
+
+
+CACHE_DIR = 'data/.cache'
+_INDEX_FILE = 'index.json'
+_CHUNK = 1 << 20
+# Serialises read-modify-write of the hash index between threads (pipeline stages, report workers).
+_INDEX_LOCK = threading.Lock()
+
+
+def _load_index(cache_dir: str) -> dict:
+    try:
+        with open(os.path.join(cache_dir, _INDEX_FILE)) as json_file:
+            return json.load(json_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_index(cache_dir: str, index: dict) -> None:
+    # A unique temporary file, so a concurrent writer (e.g. another process) never replaces a half-written one.
+    fd, tmp = tempfile.mkstemp(prefix=_INDEX_FILE + '.', suffix='.tmp', dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'w') as json_file:
+            json.dump(index, json_file)
+        os.replace(tmp, os.path.join(cache_dir, _INDEX_FILE))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def file_hash(path: str, cache_dir: str = CACHE_DIR) -> str:
+    """
+    SHA-256 of a file, re-hashed only when its size or modification time changes.
+    Args:
+        path (str): Path of the source file.
+        cache_dir (str): Cache folder holding the hash index.
+    Returns:
+        str: Hex digest of the file content.
+    """
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    index = _load_index(cache_dir)
+    entry = index.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_CHUNK), b''):
+            digest.update(block)
+    os.makedirs(cache_dir, exist_ok=True)
+    with _INDEX_LOCK:
+        # Re-read: other threads may have added entries while this file was hashed.
+        index = _load_index(cache_dir)
+        index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        _save_index(cache_dir, index)
+    return digest.hexdigest()
+
+
+def _prefix(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return f'{stem}-{path_hash}'
+
+
+def _cache_path(path: str, sha: str, sheet_name, options: dict, cache_dir: str) -> str:
+    opts = json.dumps({'sheet_name': sheet_name, **options}, sort_keys=True, default=str)
+    opts_hash = hashlib.sha1(opts.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f'{_prefix(path)}__{sha[:16]}__{opts_hash}')
+
+
+def _prune(path: str, sha: str, cache_dir: str) -> None:
+    """
+    Remove cached sheets built from an older version of the workbook.
+    """
+    prefix = _prefix(path) + '__'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and not name.startswith(prefix + sha[:16]):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def _read_cached(cache_file: str):
+    if os.path.isfile(cache_file + '.arrow'):
+        try:
+            import pyarrow.feather as feather
+        except ImportError:
+            feather = None
+        if feather is not None:
+            table = feather.read_table(cache_file + '.arrow', memory_map=True)
+            return table.to_pandas()
+    if os.path.isfile(cache_file + '.pkl'):
+        return pd.read_pickle(cache_file + '.pkl')
+    return None
+
+
+def _write_cached(cache_file: str, df: pd.DataFrame) -> None:
+    # Write to a temporary file first so an interrupted run never leaves a half-written cache.
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        pa = None
+    if pa is not None:
+        tmp = cache_file + '.arrow.tmp'
+        try:
+            feather.write_feather(df, tmp, compression='uncompressed')
+            os.replace(tmp, cache_file + '.arrow')
+            return
+        except (ValueError, TypeError, pa.ArrowException):
+            # Mixed-type columns, non-string headers or a custom index cannot go to Arrow as they are.
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+    df.to_pickle(cache_file + '.pkl.tmp')
+    os.replace(cache_file + '.pkl.tmp', cache_file + '.pkl')
+
+
+def read_excel_cached(path: str,
+                      sheet_name=0,
+                      cache_dir: str = CACHE_DIR,
+                      refresh: bool = False,
+                      **kwargs):
+    """
+    Cached drop-in for pd.read_excel.
+    Args:
+        path (str): Path of the ODS/XLSX/XLSM workbook.
+        sheet_name: Sheet name/index, or a list of them (returns a dict like pd.read_excel).
+        cache_dir (str): Folder where parsed sheets are stored.
+        refresh (bool): Ignore and overwrite existing cache entries.
+        **kwargs: Parse options passed to pd.read_excel (header, usecols, ...); part of the cache key.
+    Returns:
+        pd.DataFrame or dict: The parsed sheet(s).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    sha = file_hash(path, cache_dir=cache_dir)
+    _prune(path, sha, cache_dir)
+
+    sheets = sheet_name if isinstance(sheet_name, list) else [sheet_name]
+    cache_files = {sheet: _cache_path(path, sha, sheet, kwargs, cache_dir) for sheet in sheets}
+    frames = {} if refresh else {sheet: _read_cached(cache_files[sheet]) for sheet in sheets}
+    missing = [sheet for sheet in sheets if frames.get(sheet) is None]
+
+    if missing:
+        # Open the workbook once for every sheet not yet in the cache.
+        parsed = pd.read_excel(path, sheet_name=missing, **kwargs)
+        for sheet in missing:
+            _write_cached(cache_files[sheet], parsed[sheet])
+            frames[sheet] = parsed[sheet]
+
+    if isinstance(sheet_name, list):
+        return {sheet: frames[sheet] for sheet in sheets}
+    return frames[sheet_name]
+
+
+def clear_cache(cache_dir: str = CACHE_DIR, path: str = None) -> None:
+    """
+    Delete cached sheets, for one workbook or for all of them.
+    Args:
+        cache_dir (str): Cache folder.
+        path (str): Only clear entries for this workbook.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    prefix = _prefix(path) + '__' if path else ''
+    for name in os.listdir(cache_dir):
+        # Only cache files: other tools may keep their own folders here.
+        if name.startswith(prefix) and name != _INDEX_FILE and os.path.isfile(os.path.join(cache_dir, name)):
+            os.remove(os.path.join(cache_dir, name))
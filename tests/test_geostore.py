@@ -0,0 +1,31 @@
+import pytest
+
+gpd = pytest.importorskip('geopandas')
+pytest.importorskip('pyarrow')
+from shapely.geometry import box
+
+from modules.geostore import GeometryStore, source_hash
+
+
+def write_shapefile(path, names):
+    gdf = gpd.GeoDataFrame({'PostDist': ['AB1', 'AB2'], 'name': names},
+                           geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs='EPSG:27700')
+    gdf.to_file(path)
+
+
+def test_source_hash_covers_shapefile_attributes(tmp_path):
+    path = str(tmp_path / 'districts.shp')
+    write_shapefile(path, ['one', 'two'])
+    before = source_hash(path)
+    write_shapefile(path, ['one', 'changed'])
+    assert source_hash(path) != before
+
+
+def test_ensure_rebuilds_after_attribute_edit(tmp_path):
+    path = str(tmp_path / 'districts.shp')
+    write_shapefile(path, ['one', 'two'])
+    store = GeometryStore(root=str(tmp_path / 'store'))
+    store.ensure('districts', path, key='PostDist', tolerances=(0,))
+    write_shapefile(path, ['one', 'changed'])
+    store.ensure('districts', path, key='PostDist', tolerances=(0,))
+    assert sorted(store.load('districts')['name']) == ['changed', 'one']
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from modules import helpers, scenarios
+from modules.pipeline import Pipeline, _code_hash
+
+SCALE = 2
+
+
+def scaled(x):
+    return x * SCALE
+
+
+def scaled_kwh(x):
+    return x * scenarios.KWH_PER_TOE
+
+
+def test_code_hash_follows_called_package_functions(monkeypatch):
+    before = _code_hash(helpers.prep_df_fc)
+    monkeypatch.setattr(helpers, 'add_fuel_emissions', helpers.add_fuel_economy)
+    assert _code_hash(helpers.prep_df_fc) != before
+
+
+def test_code_hash_includes_referenced_constants(monkeypatch):
+    before = _code_hash(scaled), _code_hash(scaled_kwh)
+    monkeypatch.setitem(globals(), 'SCALE', 3)
+    monkeypatch.setattr(scenarios, 'KWH_PER_TOE', 1.)
+    after = _code_hash(scaled), _code_hash(scaled_kwh)
+    assert before[0] != after[0] and before[1] != after[1]
+
+
+def test_constant_change_reruns_cached_stage(tmp_path, monkeypatch):
+
+    def build():
+        pipe = Pipeline(params={'x': 1}, cache_dir=str(tmp_path), workers=1)
+        pipe.add(lambda x: pd.Series([scaled(x)]), name='double')
+        return pipe
+
+    assert build()['double'].tolist() == [2]
+    monkeypatch.setitem(globals(), 'SCALE', 3)
+    pipe = build()
+    assert pipe['double'].tolist() == [3]
+    assert pipe.timings['double'][0] == 'ran'
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from modules.scenarios import run_scenarios, scenario_grid
+
+SHORT = [.22, .28, .33]
+LONG = [.22, .28, .33, .38, .52, .66, .80]
+FIXED = {
+    'base_sales': 3.5e5,
+    'diesel_share_of_ice': .3,
+    'mileage': [12000, 9000, 10000],
+    'mpg': [35, 30],
+    'parc0': [4.2e6, 2.5e5, 6e4],
+    'hist_registrations': np.full((22, 3), 1e5),
+}
+
+
+def test_grid_pads_mandates_of_different_lengths():
+    grid = scenario_grid(mandate=[SHORT, LONG], lifespan=[14, 18], growth=[1., 1.01])
+    index = grid.pop('index')
+    assert grid['mandate'].shape == (8, len(LONG))
+    np.testing.assert_array_equal(grid['mandate'][0], SHORT + [1.] * (len(LONG) - len(SHORT)))
+
+    batched = run_scenarios(**grid, **FIXED, n_years=10)
+    for i, row in index.iterrows():
+        single = run_scenarios(mandate=[SHORT, LONG][row['mandate']], lifespan=[14, 18][row['lifespan']],
+                               growth=[1., 1.01][row['growth']], **FIXED, n_years=10)
+        np.testing.assert_allclose(batched['total_kgCO2e_calc'][i], single['total_kgCO2e_calc'][0])
+
+
+def test_grid_rejects_other_shape_mismatches():
+    with pytest.raises(ValueError, match='mpg'):
+        scenario_grid(mpg=[[35, 30], [35]])
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from modules.connector.slack import MyLogger, SlackBot
+
+
+class RateLimited(Exception):
+
+    def __init__(self, retry_after='0'):
+        super().__init__('ratelimited')
+        self.response = SimpleNamespace(status_code=429, headers={'Retry-After': retry_after})
+
+
+class StubClient:
+    """
+    chat_postMessage stub that rate limits the first `limited` calls.
+    """
+
+    def __init__(self, limited=0):
+        self.limited = limited
+        self.messages = []
+
+    def chat_postMessage(self, channel, text):
+        if self.limited:
+            self.limited -= 1
+            raise RateLimited()
+        self.messages.append((channel, text))
+
+
+def test_backoff_retries_rate_limits_with_stub_client():
+    client = StubClient(limited=2)
+    bot = SlackBot(slack_channel='#test', client=client)
+    assert bot.send_with_backoff('hello', base_delay=0)
+    assert client.messages == [('#test', 'hello')]
+
+
+def test_backoff_gives_up_after_max_retries():
+    client = StubClient(limited=10)
+    assert not SlackBot(client=client).send_with_backoff('hello', max_retries=3, base_delay=0)
+    assert client.messages == []
+
+
+def test_logger_posts_batches_through_stub_client(tmp_path):
+    client = StubClient()
+    logger = MyLogger(folder=str(tmp_path), slack_bot=SlackBot(slack_channel='#test', client=client), flush_interval=60)
+    for i in range(3):
+        logger.write_log(f'line {i}')
+    logger.write_log('file only', Slack=False)
+    logger.close()
+
+    assert logger.file.closed
+    assert len(client.messages) == 1
+    assert client.messages[0][1].count('line') == 3
+    with open(logger.file_name) as f:
+        assert f.read().count('\n') == 4
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from modules.tracker_store import SUMS, MonthlyAggregateStore
+
+
+class FakeBigQuery:
+    """
+    Returns the make-month partial sums of two makes for every month from the requested start.
+    """
+
+    def from_bq_to_dataframe(self, query, params=None, use_cache=True):
+        months = pd.date_range(params['start'], '2022-03-01', freq='MS')
+        rows = [(make, month.date(), 3000, 2000, 1000, 2000 * 120) for make in ['MAKE A', 'MAKE B'] for month in months]
+        return pd.DataFrame(rows, columns=['make', 'month'] + SUMS)
+
+
+def test_refresh_then_snapshots_on_new_store(tmp_path):
+    store = MonthlyAggregateStore(path=str(tmp_path / 'aggregates.parquet'))
+    assert store.refresh(FakeBigQuery()) == 48
+    assert all(store.df[col].dtype == float for col in SUMS)
+
+    targets = store.targets()
+    assert targets.set_index('make').co2Target.tolist() == [120.0, 120.0]
+
+    ledger = store.snapshots(min_sales=1000, mandate=.22)
+    assert not ledger.empty
+    assert set(ledger.make) == {'MAKE A', 'MAKE B'}
+
+
+def test_reopened_store_refreshes_incrementally(tmp_path):
+    path = str(tmp_path / 'aggregates.parquet')
+    MonthlyAggregateStore(path=path).refresh(FakeBigQuery())
+    store = MonthlyAggregateStore(path=path)
+    # Only the last stored month is fetched again.
+    assert store.refresh(FakeBigQuery()) == 2
+    assert len(store.df) == 48
+    assert all(store.df[col].dtype == float for col in SUMS)
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('google_crc32c')
+
+from modules.transfers import LocalBucket, download_many, upload_many
+
+
+def make_files(tmp_path, *names):
+    paths = []
+    for name in names:
+        path = tmp_path / 'local' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+        paths.append(str(path))
+    return paths
+
+
+def test_upload_many_rejects_basename_collisions(tmp_path):
+    bucket = LocalBucket(str(tmp_path / 'bucket'))
+    paths = make_files(tmp_path, 'a/data.csv', 'b/data.csv')
+    with pytest.raises(ValueError, match='data.csv'):
+        upload_many(bucket, paths, 'uploads')
+    assert list(bucket.list_blobs()) == []
+
+
+def test_upload_then_download_round_trip(tmp_path):
+    bucket = LocalBucket(str(tmp_path / 'bucket'))
+    paths = make_files(tmp_path, 'a/one.csv', 'b/two.csv')
+    # The same file listed twice is uploaded once.
+    assert upload_many(bucket, paths + paths[:1], 'uploads') == {'uploads/one.csv': 'uploaded', 'uploads/two.csv': 'uploaded'}
+    assert set(upload_many(bucket, paths, 'uploads').values()) == {'skipped'}
+
+    download_many(bucket.list_blobs(prefix='uploads/'), str(tmp_path / 'out'))
+    assert (tmp_path / 'out' / 'two.csv').read_text() == 'b/two.csv'
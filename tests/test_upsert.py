@@ -0,0 +1,46 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.upsert import SQLBackend, _literal, merge_upsert
+
+
+class RecordingBackend(SQLBackend):
+
+    def __init__(self, con):
+        super().__init__(con)
+        self.statements = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+        super().execute(sql)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (np.int64(2019), '2019'),
+    (np.float64(.25), '0.25'),
+    (-3, '-3'),
+    (pd.Timestamp('2020-01-01'), "'2020-01-01'"),
+    ("O'Brien", "'O''Brien'"),
+])
+def test_literal(value, expected):
+    assert _literal(value) == expected
+
+
+def test_literal_rejects_non_finite():
+    with pytest.raises(ValueError):
+        _literal(np.float64('inf'))
+
+
+def test_partition_filter_uses_numeric_bounds():
+    backend = RecordingBackend(sqlite3.connect(':memory:'))
+    df = pd.DataFrame({'year': np.array([2019, 2020], dtype='int64'), 'id': [1, 2], 'value': [1., 2.]})
+    merge_upsert(backend, 'facts', df, unique_fields=['year', 'id'], partition_column='year')
+
+    update = df.assign(value=[10., 20.])
+    merge_upsert(backend, 'facts', update, unique_fields=['year', 'id'], update=True, partition_column='year')
+    assert any('BETWEEN 2019 AND 2020' in sql for sql in backend.statements)
+    result = pd.read_sql('SELECT * FROM facts ORDER BY id', backend.con)
+    assert result['value'].tolist() == [10., 20.]
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pandas as pd
+
+from modules import workbooks
+
+
+def test_cache_falls_back_to_pickle_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.feather', None)
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']})
+    cache_file = str(tmp_path / 'sheet')
+    workbooks._write_cached(cache_file, df)
+    assert os.path.isfile(cache_file + '.pkl')
+    pd.testing.assert_frame_equal(workbooks._read_cached(cache_file), df)
+
+
+def test_clear_cache_skips_directories(tmp_path):
+    source = tmp_path / 'book.ods'
+    source.write_bytes(b'workbook')
+    cache_dir = tmp_path / 'cache'
+    workbooks.file_hash(str(source), cache_dir=str(cache_dir))
+    (cache_dir / 'book-0000__sheet.pkl').write_bytes(b'')
+    (cache_dir / 'pipeline').mkdir()
+
+    workbooks.clear_cache(str(cache_dir))
+    assert sorted(os.listdir(cache_dir)) == ['index.json', 'pipeline']